@@ -2,6 +2,10 @@
 from __future__ import unicode_literals
 
 import base64
+import calendar
+import hashlib
+import inspect
+import itertools
 import re
 import struct
 import time
@@ -16,25 +20,31 @@ import bleach
 import django_filters
 import pytz
 from django.conf import settings
+from django.contrib.postgres.aggregates import StringAgg
 from django.contrib.postgres.search import TrigramSimilarity
 from django.core.cache import caches
 from django.core.exceptions import PermissionDenied
-from django.db.models import Q, QuerySet
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import CharField, Func, ManyToManyField, Max, OuterRef, Prefetch, Q, QuerySet, Subquery
 from django.db.models.functions import Greatest
 from django.db.transaction import atomic
 from django.db.utils import IntegrityError
-from django.http import Http404, HttpResponsePermanentRedirect
+from django.http import Http404, HttpResponsePermanentRedirect, StreamingHttpResponse
 from django.urls import NoReverseMatch
 from django.utils import timezone, translation
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
 from django.utils.encoding import force_text
+from django.utils.http import http_date, quote_etag
 from django.utils.translation import ugettext_lazy as _
 from django_orghierarchy.models import Organization
 from haystack.query import AutoQuery
 from isodate import Duration, duration_isoformat, parse_duration
 from modeltranslation.translator import NotRegistered, translator
+from modeltranslation.utils import build_localized_fieldname
 from munigeo.api import (GeoModelAPIView, GeoModelSerializer,
                          build_bbox_filter, srid_to_srs)
 from munigeo.models import AdministrativeDivision
+from psycopg2 import errorcodes
 from rest_framework import (filters, generics, mixins, permissions, relations,
                             serializers, status, viewsets)
 from rest_framework.exceptions import APIException, ParseError
@@ -46,11 +56,13 @@ from rest_framework.response import Response
 from rest_framework.reverse import reverse
 from rest_framework.routers import APIRootView
 from rest_framework.settings import api_settings
+from rest_framework.utils import model_meta
 from rest_framework.views import get_view_name as original_get_view_name
 from rest_framework_bulk import (BulkListSerializer, BulkModelViewSet,
                                  BulkSerializerMixin)
 
 from events import utils
+from events.utils import bulk_create_tree_roots, bulk_create_with_signals
 from events.api_pagination import LargeResultsSetPagination
 from events.auth import ApiKeyAuth, ApiKeyUser
 from events.custom_elasticsearch_search_backend import \
@@ -61,7 +73,8 @@ from events.models import (PUBLICATION_STATUSES, DataSource, Event, EventLink,
                            Image, Keyword, KeywordSet, Language, License,
                            Offer, OpeningHoursSpecification, Place,
                            PublicationStatus, Video)
-from events.renderers import DOCXRenderer
+from events.renderers import CSVRenderer, DOCXRenderer, ICalendarRenderer, NDJSONRenderer
+from events.renderers.docx import DOCX_LANGUAGES
 from events.translation import EventTranslationOptions, PlaceTranslationOptions
 from helevents.models import User
 
@@ -108,6 +121,12 @@ def generate_id(namespace):
     return '{}:{}'.format(namespace, postfix)
 
 
+def is_duplicate_id_error(error):
+    """Return True if the IntegrityError was raised by an id that already exists"""
+    return (getattr(error.__cause__, 'pgcode', None) == errorcodes.UNIQUE_VIOLATION and
+            'pkey' in str(error))
+
+
 def parse_id_from_uri(uri):
     """
     Parse id part from @id uri like
@@ -234,6 +253,56 @@ def validate_bool(val, param):
         raise ParseError(f'{param} can take the values True or False. You passed {val}.')
 
 
+class RelatedObjectCache(object):
+    """
+    Identity map of related objects referenced by a request payload.
+
+    Bulk payloads tend to reference the same few places and keywords over and over,
+    so all referenced ids are fetched beforehand with one query per queryset and
+    JSONLDRelatedField lookups are then served from memory.
+    """
+
+    def __init__(self):
+        self.objects = {}
+        self.fetched_ids = {}
+
+    @staticmethod
+    def get_key(queryset):
+        # related fields with identical querysets (e.g. keywords and audience) share the objects
+        return queryset.model, str(queryset.query)
+
+    @staticmethod
+    def to_pk(queryset, value):
+        try:
+            return str(queryset.model._meta.pk.to_python(value))
+        except DjangoValidationError:
+            return None
+
+    def prefetch(self, queryset, ids):
+        key = self.get_key(queryset)
+        fetched_ids = self.fetched_ids.setdefault(key, set())
+        objects = self.objects.setdefault(key, {})
+        ids = set(self.to_pk(queryset, value) for value in ids) - fetched_ids - {None}
+        if not ids:
+            return
+        for obj in queryset.filter(pk__in=ids):
+            objects[str(obj.pk)] = obj
+        fetched_ids |= ids
+
+    def get(self, key, queryset, value):
+        """
+        Return the object with the given pk, or None if it has not been prefetched.
+        Raises DoesNotExist if the pk was prefetched but not found.
+        """
+        pk = self.to_pk(queryset, value)
+        if pk is None or pk not in self.fetched_ids.get(key, ()):
+            return None
+        try:
+            return self.objects[key][pk]
+        except KeyError:
+            raise queryset.model.DoesNotExist()
+
+
 class JSONLDRelatedField(relations.HyperlinkedRelatedField):
     """
     Support of showing and saving of expanded JSON nesting or just a resource
@@ -289,6 +358,17 @@ class JSONLDRelatedField(relations.HyperlinkedRelatedField):
 
         return super().to_internal_value(urllib.parse.unquote(url))
 
+    def get_object(self, view_name, view_args, view_kwargs):
+        cache = self.context.get('related_object_cache')
+        if cache is not None and self.lookup_field == 'pk':
+            queryset = self.get_queryset()
+            if not hasattr(self, '_related_object_cache_key'):
+                self._related_object_cache_key = cache.get_key(queryset)
+            obj = cache.get(self._related_object_cache_key, queryset, view_kwargs[self.lookup_url_kwarg])
+            if obj is not None:
+                return obj
+        return super().get_object(view_name, view_args, view_kwargs)
+
     def is_expanded(self):
         return getattr(self, 'expanded', False)
 
@@ -436,9 +516,11 @@ class TranslatedModelSerializer(serializers.ModelSerializer):
         return data
 
     def translated_fields_to_representation(self, obj, ret):
+        # the languages may be restricted with the lang parameter
+        languages = self.context.get('languages') or utils.get_fixed_lang_codes()
         for field_name in self.translated_fields:
             d = {}
-            for lang in utils.get_fixed_lang_codes():
+            for lang in languages:
                 key = "%s_%s" % (field_name, lang)
                 val = getattr(obj, key, None)
                 if val is None:
@@ -536,6 +618,20 @@ class LinkedEventsSerializer(TranslatedModelSerializer, MPTTModelSerializer):
                 if not instance.is_user_editable():
                     raise PermissionDenied()
 
+    def get_output_field_names(self):
+        """Return the names of all the fields in the representation"""
+        return set(self.fields) | set(self.translated_fields) | set(getattr(self, 'geo_fields', ()))
+
+    def restrict_to_fields(self, field_names):
+        """Only serialize the given fields. The id is always serialized, as @id is built from it."""
+        field_names = set(field_names) | {'id'}
+        self.translated_fields = [field for field in self.translated_fields if field in field_names]
+        if hasattr(self, 'geo_fields'):
+            self.geo_fields = [field for field in self.geo_fields if field in field_names]
+        for field in list(self.fields):
+            if field not in field_names:
+                del self.fields[field]
+
     def to_internal_value(self, data):
         for field in self.system_generated_fields:
             if field in data:
@@ -618,12 +714,7 @@ class LinkedEventsSerializer(TranslatedModelSerializer, MPTTModelSerializer):
     def validate_publisher(self, value):
         # a single POST always comes from a single source
         if value and self.method == 'POST':
-            if value not in (set(self.user.get_admin_organizations_and_descendants())
-                             | set(map(lambda x: getattr(x, 'replaced_by'),
-                                   self.user.get_admin_organizations_and_descendants()))
-                             | set(self.user.organization_memberships.all())
-                             | set(map(lambda x: getattr(x, 'replaced_by'),
-                                   self.user.organization_memberships.all()))):
+            if value.id not in self.user.get_permission_context().publisher_org_ids:
                 raise serializers.ValidationError(
                     {'publisher': _(
                         "Setting publisher to %(given)s " +
@@ -687,6 +778,232 @@ def _text_qset_by_translated_field(field, val):
     return qset
 
 
+# number of objects fetched at a time when streaming dumps and feeds
+STREAMING_CHUNK_SIZE = 500
+
+
+def get_requested_languages(request):
+    """
+    Return the language codes given in the lang parameter, e.g. lang=fi,en, or all languages.
+    The codes are in the format used in translated field names, e.g. zh_hans.
+    """
+    languages = utils.get_fixed_lang_codes()
+    val = request.query_params.get('lang')
+    if not val:
+        return languages
+    requested = [lang.strip().replace('-', '_') for lang in val.split(',') if lang.strip()]
+    invalid = [lang for lang in requested if lang not in languages]
+    if invalid:
+        raise ParseError("Invalid language supplied: %s. Supported languages: %s" %
+                         (','.join(invalid), ','.join(languages)))
+    return requested
+
+
+class CSVExportMixin(object):
+    """
+    Streams list views as CSV with format=csv. The rows are read directly from the database
+    with values_list, so serializers are skipped entirely. Fields the serializer skips are not
+    exported, and deleted objects are reduced to csv_deleted_fields like in the serializer.
+
+    Columns are selected with fields=, e.g. fields=id,name,start_time, and translated columns
+    are limited to the languages given with lang=, e.g. lang=fi,sv.
+    """
+    # fields that may be exported; the first ones up to csv_default_field_count are exported by default
+    csv_fields = ()
+    csv_default_field_count = None
+    # if set, only these fields are exported for deleted objects, like in the serializer
+    csv_deleted_fields = None
+
+    def get_csv_fields(self):
+        """Return the fields that may be exported, without the fields the serializer skips"""
+        skip_fields = self.get_serializer_context().get('skip_fields', set())
+        return [field for field in self.csv_fields if field not in skip_fields]
+
+    def get_csv_columns(self, model):
+        try:
+            translated_fields = translator.get_options_for_model(model).fields
+        except NotRegistered:
+            translated_fields = ()
+
+        csv_fields = self.get_csv_fields()
+        val = self.request.query_params.get('fields')
+        if val:
+            fields = [field.strip() for field in val.split(',') if field.strip()]
+            invalid = [field for field in fields if field not in csv_fields]
+            if invalid:
+                raise ParseError("Invalid fields supplied: %s. Supported fields: %s" %
+                                 (','.join(invalid), ','.join(csv_fields)))
+        else:
+            fields = [field for field in self.csv_fields[:self.csv_default_field_count] if field in csv_fields]
+
+        languages = get_requested_languages(self.request)
+        columns = []
+        for field in fields:
+            if field in translated_fields:
+                columns += [(field, lang, build_localized_fieldname(field, lang), None) for lang in languages]
+            else:
+                # foreign keys are exported as ids, and choices with the same names as in JSON
+                model_field = model._meta.get_field(field)
+                columns.append((field, None, model_field.attname, dict(model_field.choices) or None))
+        return columns
+
+    def get_csv_deleted_values(self, columns):
+        """Return the values of deleted objects, with None for the columns that are exported as is"""
+        deleted_name = utils.get_deleted_object_name()
+        values = []
+        for field, lang, lookup, column_choices in columns:
+            if field == 'name':
+                values.append(deleted_name.get(lang, deleted_name['en']) if lang else deleted_name['en'])
+            elif field in self.csv_deleted_fields:
+                values.append(None)
+            else:
+                values.append('')
+        return values
+
+    def get_csv_response(self, queryset):
+        columns = self.get_csv_columns(queryset.model)
+        header = ['%s_%s' % (field, lang) if lang else field for field, lang, _, _ in columns]
+        choices = [column_choices for _, _, _, column_choices in columns]
+        lookups = [lookup for _, _, lookup, _ in columns]
+        deleted_values = None
+        if self.csv_deleted_fields is not None:
+            deleted_values = self.get_csv_deleted_values(columns)
+            lookups = ['deleted'] + lookups
+        # the primary key is always selected, so that distinct querysets keep all their rows
+        rows = queryset.prefetch_related(None).values_list('pk', *lookups).iterator(chunk_size=STREAMING_CHUNK_SIZE)
+
+        def get_values(row):
+            if deleted_values is None:
+                values = row[1:]
+            else:
+                values = row[2:]
+                if row[1]:
+                    values = [value if deleted_value is None else deleted_value
+                              for value, deleted_value in zip(values, deleted_values)]
+            return [value if column_choices is None else column_choices.get(value, value)
+                    for value, column_choices in zip(values, choices)]
+
+        response = StreamingHttpResponse(self.request.accepted_renderer.stream(header, map(get_values, rows)),
+                                         content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = 'attachment; filename=%s.csv' % queryset.model._meta.verbose_name_plural
+        return response
+
+    def list(self, request, *args, **kwargs):
+        if request.accepted_renderer.format == 'csv':
+            return self.get_csv_response(self.filter_queryset(self.get_queryset()))
+        return super().list(request, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        # Prevent rendering errors as CSV files
+        if response.status_code != 200 and getattr(request, 'accepted_renderer', None) and \
+                request.accepted_renderer.format == 'csv':
+            first_renderer = self.renderer_classes[0]()
+            response.accepted_renderer = first_renderer
+            response.accepted_media_type = first_renderer.media_type
+        return response
+
+
+def restrict_queryset_to_fields(queryset, fields=None, languages=None, required_relations=()):
+    """
+    Drop the prefetches and select_related of the relations not in fields, and defer
+    the translated columns not in fields or not in languages. Relations in required_relations
+    are always kept.
+    """
+    if fields is not None:
+        queryset = restrict_queryset_relations(queryset, fields, required_relations)
+
+    try:
+        translated_fields = translator.get_options_for_model(queryset.model).fields
+    except NotRegistered:
+        return queryset
+    lang_codes = utils.get_fixed_lang_codes()
+    deferred = []
+    for field in translated_fields:
+        if fields is not None and field not in fields:
+            deferred.append(field)
+            deferred += ['%s_%s' % (field, lang) for lang in lang_codes]
+        elif languages is not None:
+            # the untranslated column is kept, as it is read for the active language
+            deferred += ['%s_%s' % (field, lang) for lang in lang_codes if lang not in languages]
+    return queryset.defer(*deferred) if deferred else queryset
+
+
+def restrict_queryset_relations(queryset, fields, required_relations=()):
+    def is_needed(lookup):
+        root = lookup.split('__')[0]
+        return root in fields or root in required_relations
+
+    prefetches = [lookup for lookup in queryset._prefetch_related_lookups
+                  if is_needed(lookup.prefetch_to if isinstance(lookup, Prefetch) else lookup)]
+    queryset = queryset.prefetch_related(None).prefetch_related(*prefetches)
+
+    # select_related is True if all the relations are selected; those are left as they are
+    if isinstance(queryset.query.select_related, dict):
+        paths = []
+        pending = [('', queryset.query.select_related)]
+        while pending:
+            prefix, relations = pending.pop()
+            for name, subrelations in relations.items():
+                paths.append(prefix + name)
+                pending.append((prefix + name + '__', subrelations))
+        queryset = queryset.select_related(None)
+        paths = [path for path in paths if is_needed(path)]
+        if paths:
+            queryset = queryset.select_related(*paths)
+    return queryset
+
+
+class SparseFieldsetMixin(object):
+    """
+    Serializes only the fields given with fields=, e.g. fields=id,name,start_time, and the
+    languages given with lang=, e.g. lang=fi,sv. The relations that are not serialized are
+    not prefetched, and the translated columns that are not serialized are not loaded.
+    """
+    # relations used in serializing every object, e.g. in checking the visibility of admin fields
+    sparse_fieldset_required_relations = ('publisher',)
+
+    def is_serialized_request(self):
+        # these formats are rendered without the serializers
+        return self.request.method in SAFE_METHODS and \
+            self.request.accepted_renderer.format not in ('csv', 'docx', 'ics')
+
+    def get_sparse_languages(self):
+        if not self.is_serialized_request() or not self.request.query_params.get('lang'):
+            return None
+        return get_requested_languages(self.request)
+
+    def get_sparse_fields(self):
+        if not self.is_serialized_request():
+            return None
+        val = self.request.query_params.get('fields')
+        if not val:
+            return None
+        return set(field.strip() for field in val.split(',') if field.strip()) | {'id'}
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        fields = self.get_sparse_fields()
+        if fields:
+            child = getattr(serializer, 'child', serializer)
+            supported = child.get_output_field_names()
+            invalid = sorted(fields - supported)
+            if invalid:
+                raise ParseError("Invalid fields supplied: %s. Supported fields: %s" %
+                                 (','.join(invalid), ','.join(sorted(supported))))
+            child.restrict_to_fields(fields)
+        return serializer
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        fields = self.get_sparse_fields()
+        languages = self.get_sparse_languages()
+        if fields or languages:
+            queryset = restrict_queryset_to_fields(queryset, fields=fields, languages=languages,
+                                                   required_relations=self.sparse_fieldset_required_relations)
+        return queryset
+
+
 class JSONAPIViewMixin(object):
     def initial(self, request, *args, **kwargs):
         ret = super().initial(request, *args, **kwargs)
@@ -712,12 +1029,14 @@ class JSONAPIViewMixin(object):
         context['include'] = [x.strip() for x in include.split(',') if x]
         context['srs'] = self.srs
         context.setdefault('skip_fields', set()).add('origin_id')
+        if self.request.query_params.get('lang'):
+            context['languages'] = get_requested_languages(self.request)
         return context
 
 
 class EditableLinkedEventsObjectSerializer(LinkedEventsSerializer):
 
-    def create(self, validated_data):
+    def set_creation_fields(self, validated_data):
         if 'data_source' not in validated_data:
             validated_data['data_source'] = self.data_source
         # data source has already been validated
@@ -729,11 +1048,14 @@ class EditableLinkedEventsObjectSerializer(LinkedEventsSerializer):
 
         if not isinstance(self.user, ApiKeyUser) and not validated_data['data_source'].user_editable:
             raise PermissionDenied()
+        return validated_data
 
+    def create(self, validated_data):
+        validated_data = self.set_creation_fields(validated_data)
         try:
             instance = super().create(validated_data)
         except IntegrityError as error:
-            if 'duplicate' and 'pkey' in str(error):
+            if is_duplicate_id_error(error):
                 raise serializers.ValidationError({'id': _("An object with given id already exists.")})
             else:
                 raise error
@@ -849,13 +1171,19 @@ class KeywordDeprecatedException(APIException):
     default_code = 'gone'
 
 
-class KeywordListViewSet(JSONAPIViewMixin,
+class KeywordListViewSet(CSVExportMixin,
+                         SparseFieldsetMixin,
+                         JSONAPIViewMixin,
                          mixins.ListModelMixin,
                          mixins.CreateModelMixin,
                          viewsets.GenericViewSet):
     queryset = Keyword.objects.all()
     queryset = queryset.select_related('publisher').prefetch_related('alt_labels__name')
     serializer_class = KeywordSerializer
+    renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES + [CSVRenderer]
+    csv_fields = ('id', 'name', 'n_events', 'data_source', 'publisher', 'deprecated', 'replaced_by',
+                  'has_upcoming_events', 'created_time', 'last_modified_time')
+    csv_default_field_count = 5
     filter_backends = (filters.OrderingFilter,)
     ordering_fields = ('n_events', 'id', 'name', 'data_source')
     ordering = ('-data_source', '-n_events', 'name')
@@ -1102,6 +1430,8 @@ class PlaceDeletedException(APIException):
 
 
 class PlaceListViewSet(GeoModelAPIView,
+                       CSVExportMixin,
+                       SparseFieldsetMixin,
                        JSONAPIViewMixin,
                        mixins.ListModelMixin,
                        mixins.CreateModelMixin,
@@ -1109,6 +1439,12 @@ class PlaceListViewSet(GeoModelAPIView,
     queryset = Place.objects.all()
     queryset = queryset.select_related('publisher')
     serializer_class = PlaceSerializer
+    renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES + [CSVRenderer]
+    csv_fields = ('id', 'name', 'street_address', 'postal_code', 'address_locality', 'position', 'n_events',
+                  'data_source', 'publisher', 'description', 'info_url', 'email', 'telephone', 'contact_type',
+                  'address_region', 'post_office_box_num', 'address_country', 'deleted', 'replaced_by',
+                  'has_upcoming_events', 'created_time', 'last_modified_time')
+    csv_default_field_count = 7
     filter_backends = (django_filters.rest_framework.DjangoFilterBackend, filters.OrderingFilter)
     filterset_class = PlaceFilter
     ordering_fields = ('n_events', 'id', 'name', 'data_source', 'street_address', 'postal_code')
@@ -1361,6 +1697,213 @@ class VideoSerializer(serializers.ModelSerializer):
         exclude = ['id', 'event']
 
 
+# one-to-many relations of Event that are written separately from the event itself
+EVENT_RELATED_MODELS = (
+    ('offers', Offer),
+    ('external_links', EventLink),
+    ('videos', Video),
+)
+
+
+def replace_event_related_objects(events_and_related_data, delete_existing=True):
+    """
+    Write offers, external links and videos of several events in one statement per model.
+
+    :param events_and_related_data: (event, related data) pairs, related data as returned by
+                                    EventSerializer.pop_related_data
+    :param delete_existing: whether the existing related objects of the events must be deleted first
+    """
+    for field_name, model in EVENT_RELATED_MODELS:
+        # None means that the relation is not to be changed
+        items_by_event = [(event, related_data[field_name]) for event, related_data in events_and_related_data
+                          if isinstance(related_data[field_name], list)]
+        if not items_by_event:
+            continue
+        if delete_existing:
+            model.objects.filter(event__in=[event for event, items in items_by_event]).delete()
+        bulk_create_with_signals(model, [model(event=event, **item)
+                                         for event, items in items_by_event for item in items])
+
+
+class EventListSerializer(BulkListSerializer):
+    """
+    Bulk POST and PUT of events.
+
+    New events and all their related objects are written with a handful of bulk
+    inserts per batch, instead of saving every event and relation one by one.
+    Updated events get their offers, links and videos replaced for the whole batch at once.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            self.prefetch_related_objects(data)
+        return super().to_internal_value(data)
+
+    def prefetch_related_objects(self, data):
+        """
+        Fetch all the related objects referenced in the payload with one query per queryset,
+        so that validating the items needs no further queries for them.
+        """
+        cache = self.context.setdefault('related_object_cache', RelatedObjectCache())
+        relations_by_name = {}
+        for field_name, field in self.child.fields.items():
+            relation = field.child_relation if isinstance(field, relations.ManyRelatedField) else field
+            if isinstance(relation, JSONLDRelatedField) and not field.read_only:
+                relations_by_name[field_name] = relation
+
+        querysets = {}
+        ids = {}
+        for field_name, relation in relations_by_name.items():
+            queryset = relation.get_queryset()
+            key = cache.get_key(queryset)
+            querysets[key] = queryset
+            key_ids = ids.setdefault(key, set())
+            for item in data:
+                if not isinstance(item, dict):
+                    continue
+                values = item.get(field_name)
+                if not isinstance(values, list):
+                    values = [values]
+                for value in values:
+                    if isinstance(value, dict) and value.get('@id'):
+                        key_ids.add(parse_id_from_uri(urllib.parse.unquote(value['@id'])))
+
+        for key, queryset in querysets.items():
+            cache.prefetch(queryset, ids[key])
+
+    @staticmethod
+    def can_bulk_create(validated_data):
+        # tree and replacement changes need the full Event.save() machinery
+        return not (validated_data.get('super_event') or validated_data.get('sub_events') or
+                    validated_data.get('replaced_by'))
+
+    def generate_ids(self, used_ids):
+        """
+        Yield new event ids that are not in used_ids. Generated ids are based on the millisecond
+        clock, which is too coarse for bulk creation, so the ids of a batch share one generated
+        prefix and are told apart by a counter.
+        """
+        prefix = generate_id(self.child.data_source)
+        for counter in itertools.count():
+            new_id = '{}-{}'.format(prefix, counter)
+            if new_id not in used_ids:
+                yield new_id
+
+    def create(self, validated_data):
+        child = self.child
+        field_info = model_meta.get_field_info(Event)
+        created_events = [None] * len(validated_data)
+        new_events = []
+        new_ids = self.generate_ids(set(data['id'] for data in validated_data if 'id' in data))
+
+        for index, data in enumerate(validated_data):
+            if not self.can_bulk_create(data):
+                continue
+            if 'id' not in data:
+                data['id'] = next(new_ids)
+            related_data = child.pop_related_data(data, default=[])
+            original_validated_data = child.prepare_creation_data(data)
+            data = child.set_creation_fields(data)
+            many_to_many = {field_name: data.pop(field_name) for field_name, relation_info
+                            in field_info.relations.items() if relation_info.to_many and field_name in data}
+            event = Event(**data)
+            event.validate_start_and_end_time()
+            new_events.append((index, event, related_data, many_to_many, original_validated_data))
+
+        if new_events:
+            self.bulk_create_events(new_events)
+            for index, event, related_data, many_to_many, original_validated_data in new_events:
+                created_events[index] = event
+
+        # events in event trees are created one at a time
+        for index, data in enumerate(validated_data):
+            if created_events[index] is None:
+                created_events[index] = child.create(data)
+
+        return created_events
+
+    def bulk_create_events(self, new_events):
+        try:
+            # every new event is the root of a new tree
+            bulk_create_tree_roots(Event, [event for index, event, *rest in new_events])
+        except IntegrityError as error:
+            if is_duplicate_id_error(error):
+                raise serializers.ValidationError({'id': _("An object with given id already exists.")})
+            else:
+                raise error
+        for index, event, *rest in new_events:
+            event.snapshot_tracked_fields()
+
+        # add many-to-many relations with one insert per through table
+        through_rows = {}
+        changed_keyword_ids = set()
+        for index, event, related_data, many_to_many, original_validated_data in new_events:
+            for field_name, related_objects in many_to_many.items():
+                field = Event._meta.get_field(field_name)
+                if not isinstance(field, ManyToManyField):
+                    # reverse relations (sub_events) are only created through the tree path
+                    continue
+                through = field.remote_field.through
+                source_column = '%s_id' % field.m2m_field_name()
+                target_column = '%s_id' % field.m2m_reverse_field_name()
+                for related_object in set(related_objects):
+                    through_rows.setdefault(through, []).append(
+                        through(**{source_column: event.pk, target_column: related_object.pk}))
+                if field_name in ('keywords', 'audience'):
+                    changed_keyword_ids.update(related_object.pk for related_object in related_objects)
+        for through, rows in through_rows.items():
+            through.objects.bulk_create(rows)
+
+        replace_event_related_objects([(event, related_data) for index, event, related_data, *rest in new_events],
+                                      delete_existing=False)
+
+        # update event number caches, as the save() and m2m_changed handlers would
+        if changed_keyword_ids:
+            Keyword.objects.filter(pk__in=changed_keyword_ids).update(n_events_changed=True)
+        location_ids = set(event.location_id for index, event, *rest in new_events if event.location_id)
+        if location_ids:
+            Place.objects.filter(id__in=location_ids).update(n_events_changed=True)
+
+        for index, event, related_data, many_to_many, original_validated_data in new_events:
+            if event.publication_status == PublicationStatus.DRAFT:
+                event.send_draft_posted_notification()
+            self.child.run_post_create_hooks(event, original_validated_data)
+
+    def update(self, queryset, all_validated_data):
+        child = self.child
+        id_attr = getattr(child.Meta, 'update_lookup_field', 'id')
+
+        all_validated_data_by_id = {
+            data.pop(id_attr): data
+            for data in all_validated_data
+        }
+
+        if not all((bool(i) and not inspect.isclass(i)
+                    for i in all_validated_data_by_id.keys())):
+            raise serializers.ValidationError('')
+
+        objects_to_update = list(queryset.filter(**{
+            '{}__in'.format(id_attr): all_validated_data_by_id.keys(),
+        }))
+
+        if len(all_validated_data_by_id) != len(objects_to_update):
+            raise serializers.ValidationError('Could not find all objects to update.')
+
+        updated_objects = []
+        for obj in objects_to_update:
+            obj_validated_data = all_validated_data_by_id.get(getattr(obj, id_attr))
+            related_data = child.pop_related_data(obj_validated_data)
+            original_validated_data = child.update_event(obj, obj_validated_data)
+            updated_objects.append((obj, related_data, original_validated_data))
+
+        replace_event_related_objects([(obj, related_data) for obj, related_data, original in updated_objects])
+
+        for obj, related_data, original_validated_data in updated_objects:
+            child.run_post_update_hooks(obj, original_validated_data)
+
+        return [obj for obj, related_data, original_validated_data in updated_objects]
+
+
 class EventSerializer(BulkSerializerMixin, EditableLinkedEventsObjectSerializer, GeoModelAPIView):
     id = serializers.CharField(required=False)
     location = JSONLDRelatedField(serializer=PlaceSerializer, required=False, allow_null=True,
@@ -1513,15 +2056,22 @@ class EventSerializer(BulkSerializerMixin, EditableLinkedEventsObjectSerializer,
                 data = new_data
         return data
 
-    def create(self, validated_data):
+    def pop_related_data(self, validated_data, default=None):
+        """
+        Pop the one-to-many relations that are written separately from the event itself.
+        None means that the relation is left untouched on update.
+        """
+        return {field_name: validated_data.pop(field_name, default) for field_name, model in EVENT_RELATED_MODELS}
+
+    def prepare_creation_data(self, validated_data):
+        """
+        Complete the validated data of a new event. Returns the original validated data to be
+        passed to the extension hooks, while the extension fields are popped from validated_data.
+        """
         # if id was not provided, we generate it upon creation:
         if 'id' not in validated_data:
             validated_data['id'] = generate_id(self.data_source)
 
-        offers = validated_data.pop('offers', [])
-        links = validated_data.pop('external_links', [])
-        videos = validated_data.pop('videos', [])
-
         validated_data.update({'created_by': self.user,
                                'last_modified_by': self.user,
                                'created_time': Event.now(),  # we must specify creation time as we are setting id
@@ -1533,30 +2083,40 @@ class EventSerializer(BulkSerializerMixin, EditableLinkedEventsObjectSerializer,
         for field_name, field in self.fields.items():
             if field_name.startswith('extension_') and field.source in validated_data:
                 validated_data.pop(field.source)
+        return original_validated_data
 
-        event = super().create(validated_data)
+    def run_post_create_hooks(self, event, original_validated_data):
+        request = self.context['request']
+        extensions = get_extensions_from_request(request)
 
-        # create and add related objects
-        for offer in offers:
-            Offer.objects.create(event=event, **offer)
-        for link in links:
-            EventLink.objects.create(event=event, **link)
-        for video in videos:
-            Video.objects.create(event=event, **video)
+        for ext in extensions:
+            ext.post_create_event(request=request, event=event, data=original_validated_data)
 
+    def run_post_update_hooks(self, event, original_validated_data):
         request = self.context['request']
         extensions = get_extensions_from_request(request)
 
         for ext in extensions:
-            ext.post_create_event(request=request, event=event, data=original_validated_data)
+            ext.post_update_event(request=request, event=event, data=original_validated_data)
 
-        return event
+    def create(self, validated_data):
+        related_data = self.pop_related_data(validated_data, default=[])
+        original_validated_data = self.prepare_creation_data(validated_data)
 
-    def update(self, instance, validated_data):
-        offers = validated_data.pop('offers', None)
-        links = validated_data.pop('external_links', None)
-        videos = validated_data.pop('videos', None)
+        event = super().create(validated_data)
 
+        # create and add related objects
+        replace_event_related_objects([(event, related_data)], delete_existing=False)
+
+        self.run_post_create_hooks(event, original_validated_data)
+
+        return event
+
+    def update_event(self, instance, validated_data):
+        """
+        Update the event fields and many-to-many relations. Returns the original validated data
+        to be passed to the extension hooks.
+        """
         if instance.end_time and instance.end_time < timezone.now() and not self.data_source.edit_past_events:
             raise DRFPermissionDenied(_('Cannot edit a past event.'))
 
@@ -1600,30 +2160,16 @@ class EventSerializer(BulkSerializerMixin, EditableLinkedEventsObjectSerializer,
 
         # update validated fields
         super().update(instance, validated_data)
+        return original_validated_data
 
-        # update offers
-        if isinstance(offers, list):
-            instance.offers.all().delete()
-            for offer in offers:
-                Offer.objects.create(event=instance, **offer)
-
-        # update ext links
-        if isinstance(links, list):
-            instance.external_links.all().delete()
-            for link in links:
-                EventLink.objects.create(event=instance, **link)
+    def update(self, instance, validated_data):
+        related_data = self.pop_related_data(validated_data)
+        original_validated_data = self.update_event(instance, validated_data)
 
-        # update videos
-        if isinstance(videos, list):
-            instance.videos.all().delete()
-            for video in videos:
-                Video.objects.create(event=instance, **video)
+        # update offers, ext links and videos
+        replace_event_related_objects([(instance, related_data)])
 
-        request = self.context['request']
-        extensions = get_extensions_from_request(request)
-
-        for ext in extensions:
-            ext.post_update_event(request=request, event=instance, data=original_validated_data)
+        self.run_post_update_hooks(instance, original_validated_data)
 
         return instance
 
@@ -1642,18 +2188,19 @@ class EventSerializer(BulkSerializerMixin, EditableLinkedEventsObjectSerializer,
             ret['start_time_obj'] = obj.start_time
             ret['location'] = obj.location
 
-        if obj.start_time and not obj.has_start_time:
+        # start_time and end_time may have been left out with the fields parameter
+        if obj.start_time and not obj.has_start_time and 'start_time' in ret:
             # Return only the date part
             ret['start_time'] = obj.start_time.astimezone(LOCAL_TZ).strftime('%Y-%m-%d')
-        if obj.end_time and not obj.has_end_time:
+        if obj.end_time and not obj.has_end_time and 'end_time' in ret:
             # If we're storing only the date part, do not pretend we have the exact time.
             # Timestamp is of the form %Y-%m-%dT00:00:00, so we report the previous date.
             ret['end_time'] = (obj.end_time - timedelta(days=1)).astimezone(LOCAL_TZ).strftime('%Y-%m-%d')
             # Unless the event is short, then no need for end time
             if obj.start_time and obj.end_time - obj.start_time <= timedelta(days=1):
                 ret['end_time'] = None
-        del ret['has_start_time']
-        del ret['has_end_time']
+        ret.pop('has_start_time', None)
+        ret.pop('has_end_time', None)
         if hasattr(obj, 'days_left'):
             ret['days_left'] = int(obj.days_left)
         if self.skip_empties:
@@ -1668,9 +2215,9 @@ class EventSerializer(BulkSerializerMixin, EditableLinkedEventsObjectSerializer,
         request = self.context.get('request')
         if request:
             if not request.user.is_authenticated:
-                del ret['publication_status']
+                ret.pop('publication_status', None)
 
-        if ret['sub_events']:
+        if ret.get('sub_events'):
             sub_events_relation = self.fields['sub_events'].child_relation
             undeleted_sub_events = []
             for sub_event in obj.sub_events.filter(deleted=False):
@@ -1682,7 +2229,7 @@ class EventSerializer(BulkSerializerMixin, EditableLinkedEventsObjectSerializer,
     class Meta:
         model = Event
         exclude = ()
-        list_serializer_class = BulkListSerializer
+        list_serializer_class = EventListSerializer
 
 
 def _format_images_v0_1(data):
@@ -2174,7 +2721,12 @@ class EventDeletedException(APIException):
     default_code = 'gone'
 
 
-class EventViewSet(JSONAPIViewMixin, BulkModelViewSet, viewsets.ReadOnlyModelViewSet):
+# seconds calendar clients and caches may use the feed without revalidating
+ICALENDAR_MAX_AGE = 300
+
+
+class EventViewSet(CSVExportMixin, SparseFieldsetMixin, JSONAPIViewMixin, BulkModelViewSet,
+                   viewsets.ReadOnlyModelViewSet):
     queryset = Event.objects.all()
     # This exclude is, atm, a bit overkill, considering it causes a massive query and no such events exist.
     # queryset = queryset.exclude(super_event_type=Event.SuperEventType.RECURRING, sub_events=None)
@@ -2189,13 +2741,28 @@ class EventViewSet(JSONAPIViewMixin, BulkModelViewSet, viewsets.ReadOnlyModelVie
     filterset_class = EventFilter
     ordering_fields = ('start_time', 'end_time', 'duration', 'last_modified_time', 'name')
     ordering = ('-last_modified_time',)
-    renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES + [DOCXRenderer]
+    renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES + [DOCXRenderer, NDJSONRenderer, ICalendarRenderer,
+                                                                CSVRenderer]
+    csv_fields = ('id', 'name', 'start_time', 'end_time', 'location', 'short_description', 'info_url',
+                  'publisher', 'event_status', 'publication_status', 'data_source', 'description',
+                  'location_extra_info', 'provider', 'provider_contact_info', 'has_start_time', 'has_end_time',
+                  'super_event', 'super_event_type', 'audience_min_age', 'audience_max_age', 'date_published',
+                  'created_time', 'last_modified_time')
+    csv_default_field_count = 7
+    csv_deleted_fields = ('id', 'name', 'last_modified_time', 'deleted', 'replaced_by')
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.data_source = None
         self.organization = None
 
+    def get_csv_fields(self):
+        fields = super().get_csv_fields()
+        if not self.request.user.is_authenticated:
+            # the publication status is only shown to authenticated users, like in the serializer
+            fields = [field for field in fields if field != 'publication_status']
+        return fields
+
     def initial(self, request, *args, **kwargs):
         super().initial(request, *args, **kwargs)
         self.data_source, self.organization = get_authenticated_data_source_and_publisher(request)
@@ -2260,22 +2827,25 @@ class EventViewSet(JSONAPIViewMixin, BulkModelViewSet, viewsets.ReadOnlyModelVie
         original_queryset = super(EventViewSet, self).filter_queryset(queryset)
 
         if self.request.method in SAFE_METHODS:
-            # we cannot use distinct for performance reasons
-            public_queryset = original_queryset.filter(publication_status=PublicationStatus.PUBLIC)
-            editable_queryset = original_queryset.none()
+            # we cannot use distinct for performance reasons, so each listing is a single predicate
+            public_filter = Q(publication_status=PublicationStatus.PUBLIC)
+            editable_filter = None
             if self.request.user.is_authenticated:
-                editable_queryset = self.request.user.get_editable_events(original_queryset)
+                editable_filter = self.request.user.get_editable_events_filter()
             # by default, only public events are shown in the event list
-            queryset = public_queryset
+            queryset = original_queryset.filter(public_filter)
             # however, certain query parameters allow customizing the listing for authenticated users
             show_all = self.request.query_params.get('show_all')
-            if show_all:
+            if show_all and editable_filter is not None:
                 # displays all editable events, including drafts, and public non-editable events
-                queryset = editable_queryset | public_queryset
+                queryset = original_queryset.filter(public_filter | editable_filter)
             admin_user = self.request.query_params.get('admin_user')
             if admin_user:
                 # displays all editable events, including drafts, but no other public events
-                queryset = editable_queryset
+                if editable_filter is None:
+                    queryset = original_queryset.none()
+                else:
+                    queryset = original_queryset.filter(editable_filter)
             created_by = self.request.query_params.get('created_by')
             if created_by:
                 # only displays events by the particular user
@@ -2370,6 +2940,9 @@ class EventViewSet(JSONAPIViewMixin, BulkModelViewSet, viewsets.ReadOnlyModelVie
             return HttpResponsePermanentRedirect(reverse('event-detail',
                                                          kwargs={'pk': event.pk},
                                                          request=request))
+        if request.accepted_renderer.format == 'ics':
+            # the calendar renderer streams events, not serialized data
+            return self.get_icalendar_response(Event.objects.filter(pk=self.get_object().pk))
         return super().retrieve(request, *args, **kwargs)
 
     def list(self, request, *args, **kwargs):
@@ -2379,19 +2952,111 @@ class EventViewSet(JSONAPIViewMixin, BulkModelViewSet, viewsets.ReadOnlyModelVie
                 raise ParseError(
                     {'detail': _('Must specify a location when fetching DOCX file.')})
             queryset = self.filter_queryset(self.get_queryset())
-            if queryset.count() == 0:
+            location_ids = list(queryset.order_by().values_list('location_id', flat=True).distinct()[:2])
+            if not location_ids:
                 raise ParseError({'detail': _('No events.')})
-            if len(set([event.location for event in queryset])) > 1:
+            if len(location_ids) > 1:
                 raise ParseError({'detail': _('Only one location allowed.')})
-            serializer = self.get_serializer(queryset, many=True)
-            return Response(serializer.data)
+            return Response(self.iter_docx_events(queryset, location_ids[0]))
+        if request.accepted_renderer.format == 'ndjson':
+            # full dumps are streamed without pagination
+            queryset = self.filter_queryset(self.get_queryset())
+            return StreamingHttpResponse(self.stream_ndjson(queryset),
+                                         content_type=request.accepted_renderer.media_type)
+        if request.accepted_renderer.format == 'ics':
+            queryset = self.filter_queryset(self.get_queryset())
+            return self.get_icalendar_response(queryset)
         return super().list(request, *args, **kwargs)
 
+    @staticmethod
+    def iter_docx_events(queryset, location_id):
+        """
+        Yield the events in start time order, with only the fields the DOCX renderer needs.
+        """
+        location = Place.objects.filter(id=location_id).first()
+        translated_fields = {
+            field: {lang: build_localized_fieldname(field, lang) for lang in DOCX_LANGUAGES}
+            for field in ('name', 'short_description', 'description')
+        }
+        # the renderer only uses the price of the first offer
+        prices = {
+            'first_offer_price_%s' % lang: Subquery(
+                Offer.objects.filter(event=OuterRef('pk')).order_by('pk').values(
+                    build_localized_fieldname('price', lang))[:1])
+            for lang in DOCX_LANGUAGES
+        }
+        fields = ['start_time', 'end_time'] + list(prices)
+        for localized_fields in translated_fields.values():
+            fields += localized_fields.values()
+        rows = (queryset.select_related(None).prefetch_related(None).order_by('start_time', 'id')
+                .annotate(**prices).values(*fields))
+
+        for row in rows.iterator():
+            raw_event = {
+                field: {lang: row[name] for lang, name in localized_fields.items() if row[name]}
+                for field, localized_fields in translated_fields.items()
+            }
+            raw_event['offers'] = [{'price': {lang: row['first_offer_price_%s' % lang] for lang in DOCX_LANGUAGES}}]
+            raw_event['start_time_obj'] = row['start_time']
+            raw_event['end_time_obj'] = row['end_time']
+            raw_event['location'] = location
+            yield raw_event
+
+    @staticmethod
+    def iter_event_chunks(queryset, chunk_size=STREAMING_CHUNK_SIZE):
+        """
+        Yield the events of the queryset in lists of chunk_size. The ids are read with a server-side cursor,
+        and the events are fetched and prefetched one chunk at a time to keep memory use constant.
+        """
+        ids = queryset.prefetch_related(None).values_list('id', flat=True).iterator(chunk_size=chunk_size)
+        while True:
+            chunk_ids = list(itertools.islice(ids, chunk_size))
+            if not chunk_ids:
+                return
+            events_by_id = {event.id: event for event in queryset.filter(id__in=chunk_ids).order_by()}
+            yield [events_by_id[event_id] for event_id in chunk_ids if event_id in events_by_id]
+
+    def stream_ndjson(self, queryset):
+        """Yield the serialized events one per line."""
+        for events in self.iter_event_chunks(queryset):
+            for data in self.get_serializer(events, many=True).data:
+                yield NDJSONRenderer.render_line(data)
+
+    def get_icalendar_response(self, queryset):
+        # calendar subscriptions poll often, so the feed supports conditional requests and caching.
+        # The feed changes when the events or their locations are modified, or when the set of events
+        # in the filter changes, so the validators are based on the ids and both modification times.
+        stats = queryset.order_by().aggregate(
+            last_modified=Greatest(Max('last_modified_time'), Max('location__last_modified_time')),
+            ids_hash=Func(StringAgg('id', ',', ordering='id'), function='MD5', output_field=CharField()))
+        last_modified = stats['last_modified']
+        last_modified_timestamp = calendar.timegm(last_modified.utctimetuple()) if last_modified else None
+        etag = quote_etag(hashlib.md5(':'.join(str(value) for value in (
+            self.request.get_full_path(), self.request.user.pk, translation.get_language(),
+            stats['ids_hash'], last_modified)).encode('utf-8')).hexdigest())
+
+        response = get_conditional_response(self.request, etag=etag, last_modified=last_modified_timestamp)
+        if response is None:
+            # only the location is needed in addition to the events themselves
+            queryset = queryset.select_related('location').prefetch_related(None)
+            events = itertools.chain.from_iterable(self.iter_event_chunks(queryset))
+            response = StreamingHttpResponse(self.request.accepted_renderer.stream(events),
+                                             content_type='text/calendar; charset=utf-8')
+        response['ETag'] = etag
+        if last_modified_timestamp is not None:
+            response['Last-Modified'] = http_date(last_modified_timestamp)
+        if self.request.user.is_authenticated:
+            patch_cache_control(response, private=True, max_age=ICALENDAR_MAX_AGE)
+        else:
+            patch_cache_control(response, public=True, max_age=ICALENDAR_MAX_AGE)
+        patch_vary_headers(response, ('Accept-Language',))
+        return response
+
     def finalize_response(self, request, response, *args, **kwargs):
         # Switch to normal renderer for docx errors.
         response = super().finalize_response(request, response, *args, **kwargs)
-        # Prevent rendering errors as DOCX files
-        if response.status_code != 200 and request.accepted_renderer.format == 'docx':
+        # Prevent rendering errors as DOCX files or calendars
+        if response.status_code != 200 and request.accepted_renderer.format in ('docx', 'ics'):
             first_renderer = self.renderer_classes[0]()
             response.accepted_renderer = first_renderer
             response.accepted_media_type = first_renderer.media_type
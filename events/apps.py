@@ -1,5 +1,5 @@
 from django.apps import AppConfig
-from django.db.models.signals import post_save
+from django.db.models.signals import m2m_changed, post_delete, post_save
 
 
 class EventsConfig(AppConfig):
@@ -7,7 +7,11 @@ class EventsConfig(AppConfig):
 
     def ready(self):
         from .signals import organization_post_save, user_post_save
+        from .auth import invalidate_api_key_cache
+        from .models import DataSource
+        from .permissions import invalidate_permission_contexts
         from django.contrib.auth import get_user_model
+        from django_orghierarchy.models import Organization
         post_save.connect(
             organization_post_save,
             sender="django_orghierarchy.Organization",
@@ -18,3 +22,36 @@ class EventsConfig(AppConfig):
             sender=get_user_model(),
             dispatch_uid='user_post_save',
         )
+        # memoized permission contexts depend on the organization trees and their users
+        post_save.connect(
+            invalidate_permission_contexts,
+            sender=Organization,
+            dispatch_uid='organization_post_save_permission_contexts',
+        )
+        post_delete.connect(
+            invalidate_permission_contexts,
+            sender=Organization,
+            dispatch_uid='organization_post_delete_permission_contexts',
+        )
+        m2m_changed.connect(
+            invalidate_permission_contexts,
+            sender=Organization.admin_users.through,
+            dispatch_uid='organization_admin_users_changed_permission_contexts',
+        )
+        m2m_changed.connect(
+            invalidate_permission_contexts,
+            sender=Organization.regular_users.through,
+            dispatch_uid='organization_regular_users_changed_permission_contexts',
+        )
+        # cached api key lookups depend on the data sources and the organization trees of their owners
+        for sender in (DataSource, Organization):
+            post_save.connect(
+                invalidate_api_key_cache,
+                sender=sender,
+                dispatch_uid='%s_post_save_api_key_cache' % sender._meta.model_name,
+            )
+            post_delete.connect(
+                invalidate_api_key_cache,
+                sender=sender,
+                dispatch_uid='%s_post_delete_api_key_cache' % sender._meta.model_name,
+            )
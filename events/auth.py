@@ -1,3 +1,6 @@
+import hashlib
+import uuid
+
 from rest_framework import authentication
 from rest_framework import exceptions
 from events.models import DataSource
@@ -5,20 +8,48 @@ from django_orghierarchy.models import Organization
 from django.utils.translation import ugettext_lazy as _
 from django.contrib.gis.db import models
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 
 from .permissions import UserModelPermissionMixin
 
 
+# API keys are used by machine clients sending lots of requests, so the lookups are cached briefly
+API_KEY_CACHE_TIMEOUT = 60
+API_KEY_CACHE_VERSION_KEY = 'api_key_auth_version'
+
+
+def invalidate_api_key_cache(**kwargs):
+    cache.set(API_KEY_CACHE_VERSION_KEY, uuid.uuid4().hex, None)
+
+
 class ApiKeyAuthentication(authentication.BaseAuthentication):
     def authenticate(self, request):
         # django converts 'apikey' to 'HTTP_APIKEY' outside runserver
         api_key = request.META.get('apikey') or request.META.get('HTTP_APIKEY')
         if not api_key:
             return None
-        data_source = self.get_data_source(api_key=api_key)
-        user = ApiKeyUser.objects.get_or_create(data_source=data_source)[0]
+        cache_key = self.get_cache_key(api_key)
+        cached = cache.get(cache_key)
+        if cached:
+            data_source, user, owner_descendant_ids = cached
+        else:
+            data_source = self.get_data_source(api_key=api_key)
+            user = ApiKeyUser.objects.get_or_create(data_source=data_source)[0]
+            owner_descendant_ids = user.get_owner_descendant_ids()
+            cache.set(cache_key, (data_source, user, owner_descendant_ids), API_KEY_CACHE_TIMEOUT)
+        # permission checks read the cached ids instead of querying the organization tree
+        user.__dict__['_owner_descendant_ids'] = owner_descendant_ids
         return user, ApiKeyAuth(data_source)
 
+    @staticmethod
+    def get_cache_key(api_key):
+        # the version changes whenever data sources or organizations change
+        version = cache.get(API_KEY_CACHE_VERSION_KEY)
+        if version is None:
+            cache.add(API_KEY_CACHE_VERSION_KEY, uuid.uuid4().hex, None)
+            version = cache.get(API_KEY_CACHE_VERSION_KEY, '')
+        return 'api_key_auth:%s:%s' % (version, hashlib.sha256(api_key.encode('utf-8')).hexdigest())
+
     def authenticate_header(self, request):
         """
         Return a string to be used as the value of the `WWW-Authenticate`
@@ -51,8 +82,17 @@ class ApiKeyUser(get_user_model(), UserModelPermissionMixin):
     def get_default_organization(self):
         return self.data_source.owner
 
+    def get_owner_descendant_ids(self):
+        ids = self.__dict__.get('_owner_descendant_ids')
+        if ids is None:
+            ids = set()
+            if self.data_source.owner:
+                ids = set(self.data_source.owner.get_descendants(include_self=True).values_list('id', flat=True))
+            self.__dict__['_owner_descendant_ids'] = ids
+        return ids
+
     def is_admin(self, publisher):
-        return publisher in self.data_source.owner.get_descendants(include_self=True)
+        return getattr(publisher, 'id', None) in self.get_owner_descendant_ids()
 
     def is_regular_user(self, publisher):
         return False
@@ -61,19 +61,32 @@ def jsonize(from_dict):
     return json.dumps(from_dict, cls=DjangoJSONEncoder)
 
 
-def generate_icalendar_element(event):
+ICALENDAR_PRODID = '-//events.hel.fi//NONSGML Feeder//EN'
+
+
+def generate_icalendar_event(event, language='en'):
     icalendar_event = CalendarEvent()
     if event.start_time:
         icalendar_event.add('dtstart', event.start_time)
     if event.end_time:
         icalendar_event.add('dtend', event.end_time)
-    if event.name_en:
-        icalendar_event.add('summary', event.name_en)
+    name = getattr(event, 'name_%s' % language.replace('-', '_'), None)
+    if name:
+        icalendar_event.add('summary', name)
+    return icalendar_event
+
 
+def generate_icalendar(icalendar_events=()):
     cal = Calendar()
     cal.add('version', '2.0')
-    cal.add('prodid', '-//events.hel.fi//NONSGML Feeder//EN')
-    cal.add_component(icalendar_event)
+    cal.add('prodid', ICALENDAR_PRODID)
+    for icalendar_event in icalendar_events:
+        cal.add_component(icalendar_event)
+    return cal
+
+
+def generate_icalendar_element(event):
+    cal = generate_icalendar([generate_icalendar_event(event)])
 
     term = None
     if event.start_time and event.end_time:
@@ -4,20 +4,27 @@ import itertools
 import datetime
 import pytz
 from collections import defaultdict, namedtuple
-from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial, reduce
 import operator
 
 from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
 from rest_framework.exceptions import ValidationError
 from django.contrib.gis.geos import Point, Polygon
 from django.contrib.gis.gdal import SpatialReference, CoordTransform
 
+from events.importer.fetch_cache import FetchCache
+from events.importer.http import HTTPClient
+from events.importer.metrics import ImportMetrics, phase, record
 from events.importer.sync import ModelSyncher
 from .util import separate_scripts, clean_text
 
 from modeltranslation.translator import translator
 
-from events.models import Image, Language, Event, Offer, EventLink, Place
+from events import utils
+from events.models import BaseModel, Image, Keyword, Language, Event, Offer, EventLink, Place, PublicationStatus
 
 # Per module logger
 logger = logging.getLogger(__name__)
@@ -26,6 +33,15 @@ EXTENSION_COURSE_FIELDS = ('enrolment_start_time', 'enrolment_end_time', 'maximu
                            'minimum_attendee_capacity', 'remaining_attendee_capacity')
 LOCAL_TZ = pytz.timezone(settings.TIME_ZONE)
 
+# many-to-many fields of events that are imported
+EVENT_M2M_FIELDS = ('keywords', 'audience', 'in_language')
+# number of events saved at a time by save_events
+EVENT_BATCH_SIZE = 500
+# changing these fields needs the full Event.save(), e.g. to maintain event trees and to send notifications
+EVENT_FULL_SAVE_FIELDS = {'super_event', 'replaced_by', 'deleted', 'publication_status'}
+
+ExternalLink = namedtuple('ExternalLink', ['language', 'name', 'url'])
+
 
 # Using a recursive default dictionary
 # allows easy updating of the same data keys
@@ -60,6 +76,11 @@ class Importer(object):
             self.bounding_box = None
         self.gps_to_target_ct = CoordTransform(gps_srs, target_srs)
 
+        self.metrics = ImportMetrics(self.name, profile_dir=options.get('profile'))
+        self.metrics.activate()
+        self.http_client = HTTPClient.from_options(options)
+        self.fetch_cache = FetchCache.from_options(self.http_client, options)
+
         self.setup()
 
         # this has to be run after setup, as it relies on organization and data source being set
@@ -69,6 +90,19 @@ class Importer(object):
     def setup(self):
         pass
 
+    def map_languages(self, func, languages):
+        """
+        Return [func(lang) for lang in languages]. With the workers option, the languages are
+        processed concurrently in a thread pool, so func should only fetch and parse data and
+        must not touch the database or any shared state. Merging and saving the results is
+        left to the caller.
+        """
+        workers = self.options.get('workers') or 1
+        if workers <= 1 or len(languages) <= 1:
+            return [func(lang) for lang in languages]
+        with ThreadPoolExecutor(max_workers=min(workers, len(languages))) as executor:
+            return list(executor.map(func, languages))
+
     @staticmethod
     def _set_multiscript_field(string, event, languages, field):
         """
@@ -286,21 +320,19 @@ class Importer(object):
                 continue
             self._set_field(obj, field_name, info[field_name])
 
-    def save_event(self, info):
-        info = info.copy()
+    @staticmethod
+    def _get_event_id(info):
+        return "%s:%s" % (info['data_source'].id, info['origin_id'])
 
-        args = dict(data_source=info['data_source'], origin_id=info['origin_id'])
-        obj_id = "%s:%s" % (info['data_source'].id, info['origin_id'])
-        try:
-            obj = Event.objects.get(**args)
-            obj._created = False
-            assert obj.id == obj_id
-        except Event.DoesNotExist:
-            obj = Event(**args)
-            obj._created = True
-            obj.id = obj_id
-        obj._changed = False
-        obj._changed_fields = []
+    def _new_event(self, info):
+        obj = Event(data_source=info['data_source'], origin_id=info['origin_id'])
+        obj._created = True
+        obj.id = self._get_event_id(info)
+        return obj
+
+    def _prepare_event_info(self, info):
+        """Fill in the times and location fields of the event data. Returns the data and the location id."""
+        info = info.copy()
 
         location_id = None
         if 'location' in info:
@@ -337,6 +369,12 @@ class Importer(object):
             info['end_time'] = info['end_time'].replace(hour=0, minute=0, second=0)
             info['end_time'] += datetime.timedelta(days=1)
 
+        return info, location_id
+
+    def _update_event_fields(self, obj, info, location_id):
+        obj._changed = False
+        obj._changed_fields = []
+
         skip_fields = ['id', 'location', 'publisher', 'offers', 'keywords', 'images']
         self._update_fields(obj, info, skip_fields)
 
@@ -346,6 +384,133 @@ class Importer(object):
 
         self._set_field(obj, 'deleted', False)
 
+    def _get_event_m2m_ids(self, obj, field_name, info, old_ids):
+        """Return the ids the many-to-many field of the event should have, or None if it is not changed"""
+        new_ids = set(value.id for value in info.get(field_name, []))
+        if new_ids == old_ids:
+            return None
+        obj._changed_fields.append(field_name)
+        if obj.is_user_edited():
+            # this prevents overwriting manually added values
+            if new_ids <= old_ids:
+                return None
+            obj._changed = True
+            return old_ids | new_ids
+        obj._changed = True
+        return new_ids
+
+    def _get_event_offers(self, obj, info, old_offers):
+        """Return the offers the event should have, or None if they are not changed"""
+        offers = []
+        for offer in info.get('offers', []):
+            offer_obj = Offer(event=obj)
+            self._update_fields(offer_obj, offer, skip_fields=['id'])
+            offers.append(offer_obj)
+
+        val = operator.methodcaller('simple_value')
+        new_values = set(map(val, offers))
+        if new_values == set(map(val, old_offers)):
+            return None
+        # this prevents overwriting manually added offers. do not update offers if we have added ones
+        if obj.is_user_edited() and len(new_values) < len(old_offers):
+            return None
+        obj._changed = True
+        obj._changed_fields.append('offers')
+        return offers
+
+    def _get_event_links(self, obj, info, old_links):
+        """Return the external links the event should have, or None if they are not changed"""
+        if not info.get('external_links') or obj.is_user_edited():
+            return None
+
+        new_links = set()
+        for language, links in info['external_links'].items():
+            for link_name, url in links.items():
+                new_links.add(ExternalLink(language, link_name, url))
+        old_links = set(ExternalLink(link.language_id, link.name, link.link) for link in old_links)
+        if new_links == old_links:
+            return None
+
+        links = []
+        for link in new_links:
+            if len(link.url) > 200:
+                logger.error(f'{obj} required external link of length {len(link.url)}, current limit 200')
+                continue
+            links.append(EventLink(event=obj, language_id=link.language, name=link.name, link=link.url))
+        obj._changed = True
+        obj._changed_fields.append('links')
+        return links
+
+    def _save_extension_course(self, obj, info):
+        if 'extension_course' not in settings.INSTALLED_APPS:
+            return
+        extension_data = info.get('extension_course')
+        if extension_data is None:
+            return
+        from extension_course.models import Course
+
+        try:
+            course = obj.extension_course
+            course._changed = False
+            for field in EXTENSION_COURSE_FIELDS:
+                self._set_field(course, field, extension_data.get(field))
+
+            course_changed = course._changed
+            if course_changed:
+                course.save()
+
+        except Course.DoesNotExist:
+            Course.objects.create(
+                event=obj,
+                **{field: extension_data.get(field) for field in EXTENSION_COURSE_FIELDS}
+            )
+            course_changed = True
+
+        if course_changed:
+            obj._changed = True
+            obj._changed_fields.append('extension_course')
+
+    def _update_event_status(self, obj, info):
+        # If event start time changed, it was rescheduled.
+        if 'start_time' in obj._changed_fields:
+            self._set_field(obj, 'event_status', Event.Status.RESCHEDULED)
+
+        # The event may be cancelled
+        status = info.get('event_status', None)
+        if status:
+            self._set_field(obj, 'event_status', status)
+
+    @staticmethod
+    def _record_saved(obj):
+        if obj._created:
+            record('created')
+        elif obj._changed:
+            record('changed')
+        else:
+            record('unchanged')
+
+    @staticmethod
+    def _log_event_saved(obj):
+        if obj._created:
+            verb = "created"
+        else:
+            verb = "changed (fields: %s)" % ', '.join(obj._changed_fields)
+        logger.debug("{} {}".format(obj, verb))
+
+    @phase('save')
+    def save_event(self, info):
+        info, location_id = self._prepare_event_info(info)
+
+        args = dict(data_source=info['data_source'], origin_id=info['origin_id'])
+        try:
+            obj = Event.objects.get(**args)
+            obj._created = False
+            assert obj.id == self._get_event_id(info)
+        except Event.DoesNotExist:
+            obj = self._new_event(info)
+
+        self._update_event_fields(obj, info, location_id)
+
         if obj._created:
             # We have to save new objects here to be able to add related fields.
             # Changed objects will be saved only *after* related fields have been changed.
@@ -361,130 +526,29 @@ class Importer(object):
         if not obj.is_user_edited() and 'images' in info:
             self.set_images(obj, info['images'])
 
-        keywords = info.get('keywords', [])
-        new_keywords = set([kw.id for kw in keywords])
-        old_keywords = set(obj.keywords.values_list('id', flat=True))
-        if new_keywords != old_keywords:
-            if obj.is_user_edited():
-                # this prevents overwriting manually added keywords
-                if not new_keywords <= old_keywords:
-                    obj.keywords.add(*new_keywords)
-                    obj._changed = True
-            else:
-                obj.keywords.set(new_keywords)
-                obj._changed = True
-            obj._changed_fields.append('keywords')
-        audience = info.get('audience', [])
-        new_audience = set([kw.id for kw in audience])
-        old_audience = set(obj.audience.values_list('id', flat=True))
-        if new_audience != old_audience:
-            if obj.is_user_edited():
-                # this prevents overwriting manually added audience
-                if not new_audience <= old_audience:
-                    obj.audience.add(*new_audience)
-                    obj._changed = True
-            else:
-                obj.audience.set(new_audience)
-                obj._changed = True
-            obj._changed_fields.append('audience')
-        in_language = info.get('in_language', [])
-        new_languages = set([lang.id for lang in in_language])
-        old_languages = set(obj.in_language.values_list('id', flat=True))
-        if new_languages != old_languages:
-            if obj.is_user_edited():
-                # this prevents overwriting manually added languages
-                if not new_languages <= old_languages:
-                    obj.in_language.add(*new_languages)
-                    obj._changed = True
-            else:
-                obj.in_language.set(in_language)
-                obj._changed = True
-            obj._changed_fields.append('in_language')
+        for field_name in EVENT_M2M_FIELDS:
+            old_ids = set(getattr(obj, field_name).values_list('id', flat=True))
+            new_ids = self._get_event_m2m_ids(obj, field_name, info, old_ids)
+            if new_ids is not None:
+                getattr(obj, field_name).set(new_ids)
 
         # one-to-many fields with foreign key pointing to event
 
-        offers = []
-        for offer in info.get('offers', []):
-            offer_obj = Offer(event=obj)
-            self._update_fields(offer_obj, offer, skip_fields=['id'])
-            offers.append(offer_obj)
+        offers = self._get_event_offers(obj, info, list(obj.offers.all()))
+        if offers is not None:
+            obj.offers.all().delete()
+            for o in offers:
+                o.save()
 
-        val = operator.methodcaller('simple_value')
-        if set(map(val, offers)) != set(map(val, obj.offers.all())):
-            # this prevents overwriting manually added offers. do not update offers if we have added ones
-            if not obj.is_user_edited() or len(set(map(val, offers))) >= obj.offers.count():
-                obj.offers.all().delete()
-                for o in offers:
-                    o.save()
-                obj._changed = True
-                obj._changed_fields.append('offers')
-
-        if info['external_links']:
-            ExternalLink = namedtuple('ExternalLink', ['language', 'name', 'url'])
-
-            def list_obj_links(obj):
-                links = set()
-                for link in obj.external_links.all():
-                    links.add(ExternalLink(link.language.id, link.name, link.link))
-                return links
-
-            def list_external_links(external_links):
-                links = set()
-                for language in external_links.keys():
-                    for link_name in external_links[language].keys():
-                        links.add(ExternalLink(language, link_name, external_links[language][link_name]))
-                return links
-
-            new_links = list_external_links(info['external_links'])
-            old_links = list_obj_links(obj)
-            if not obj.is_user_edited() and new_links != old_links:
-                obj.external_links.all().delete()
-                for link in new_links:
-                    if len(link.url) > 200:
-                        logger.error(f'{obj} required external link of length {len(link.url)}, current limit 200')
-                        continue
-                    link_obj = EventLink(event=obj,
-                                         language_id=link.language,
-                                         name=link.name,
-                                         link=link.url)
-                    link_obj.save()
-                obj._changed = True
-                obj._changed_fields.append('links')
-
-        if 'extension_course' in settings.INSTALLED_APPS:
-            extension_data = info.get('extension_course')
-            if extension_data is not None:
-                from extension_course.models import Course
-
-                try:
-                    course = obj.extension_course
-                    course._changed = False
-                    for field in EXTENSION_COURSE_FIELDS:
-                        self._set_field(course, field, extension_data.get(field))
-
-                    course_changed = course._changed
-                    if course_changed:
-                        course.save()
-
-                except Course.DoesNotExist:
-                    Course.objects.create(
-                        event=obj,
-                        **{field: extension_data.get(field) for field in EXTENSION_COURSE_FIELDS}
-                    )
-                    course_changed = True
-
-                if course_changed:
-                    obj._changed = True
-                    obj._changed_fields.append('extension_course')
+        links = self._get_event_links(obj, info, list(obj.external_links.all()))
+        if links is not None:
+            obj.external_links.all().delete()
+            for link in links:
+                link.save()
 
-        # If event start time changed, it was rescheduled.
-        if 'start_time' in obj._changed_fields:
-            self._set_field(obj, 'event_status', Event.Status.RESCHEDULED)
+        self._save_extension_course(obj, info)
 
-        # The event may be cancelled
-        status = info.get('event_status', None)
-        if status:
-            self._set_field(obj, 'event_status', status)
+        self._update_event_status(obj, info)
 
         if obj._changed or obj._created:
             # Finally, we must save the whole object, even when only related fields changed.
@@ -494,14 +558,191 @@ class Importer(object):
             except ValidationError as error:
                 print('Event ' + str(obj) + ' could not be saved: ' + str(error))
                 raise
-            if obj._created:
-                verb = "created"
-            else:
-                verb = "changed (fields: %s)" % ', '.join(obj._changed_fields)
-            logger.debug("{} {}".format(obj, verb))
+            self._log_event_saved(obj)
+        self._record_saved(obj)
 
         return obj
 
+    @phase('save')
+    def save_events(self, infos):
+        """
+        Save several events like save_event, but with a few bulk queries per batch of events.
+        Returns the saved events in the same order as the data.
+
+        Existing events and their relations are fetched for the whole batch and compared in memory.
+        New events, changed fields, many-to-many relations, offers and links are then written in bulk.
+        Events that are added to or moved within event trees, replaced, undeleted or published are
+        saved one by one, as they need the full Event.save().
+        """
+        objs = []
+        batch = []
+        batch_ids = set()
+        for info in infos:
+            obj_id = self._get_event_id(info)
+            # the same event may appear several times, and it is then saved again in the next batch
+            if len(batch) >= EVENT_BATCH_SIZE or obj_id in batch_ids:
+                objs += self._save_event_batch(batch)
+                batch = []
+                batch_ids = set()
+            batch.append(info)
+            batch_ids.add(obj_id)
+        if batch:
+            objs += self._save_event_batch(batch)
+        return objs
+
+    @transaction.atomic
+    def _save_event_batch(self, infos):
+        infos = [self._prepare_event_info(info) for info in infos]
+        existing = {obj.id: obj for obj in Event.objects.filter(id__in=[
+            self._get_event_id(info) for info, location_id in infos]).select_related(
+            'data_source', 'last_modified_by').prefetch_related('offers', 'external_links')}
+
+        old_m2m_ids = {}
+        for field_name in EVENT_M2M_FIELDS:
+            field = Event._meta.get_field(field_name)
+            source_column = '%s_id' % field.m2m_field_name()
+            target_column = '%s_id' % field.m2m_reverse_field_name()
+            ids_by_event = old_m2m_ids[field_name] = defaultdict(set)
+            for event_id, value_id in field.remote_field.through.objects.filter(**{
+                    '%s__in' % source_column: list(existing)}).values_list(source_column, target_column):
+                ids_by_event[event_id].add(value_id)
+
+        # compare the data to the existing events
+        objs = []
+        m2m_changes = {field_name: {} for field_name in EVENT_M2M_FIELDS}
+        new_offers = {}
+        new_links = {}
+        for info, location_id in infos:
+            obj = existing.get(self._get_event_id(info))
+            if obj is None:
+                obj = self._new_event(info)
+            else:
+                obj._created = False
+            self._update_event_fields(obj, info, location_id)
+
+            if not obj._created:
+                # if images change and event has been user edited, do not reinstate old image!!!
+                if not obj.is_user_edited() and 'images' in info:
+                    self.set_images(obj, info['images'])
+                self._save_extension_course(obj, info)
+
+            for field_name in EVENT_M2M_FIELDS:
+                old_ids = old_m2m_ids[field_name].get(obj.id, set())
+                new_ids = self._get_event_m2m_ids(obj, field_name, info, old_ids)
+                if new_ids is not None:
+                    m2m_changes[field_name][obj.id] = (old_ids, new_ids)
+
+            old_offers = [] if obj._created else list(obj.offers.all())
+            offers = self._get_event_offers(obj, info, old_offers)
+            if offers is not None:
+                new_offers[obj.id] = offers
+            old_links = [] if obj._created else list(obj.external_links.all())
+            links = self._get_event_links(obj, info, old_links)
+            if links is not None:
+                new_links[obj.id] = links
+
+            self._update_event_status(obj, info)
+            try:
+                obj.validate_start_and_end_time()
+            except ValidationError as error:
+                logger.error('Event {} could not be saved: {}'.format(obj, error))
+                raise
+            objs.append((obj, info))
+
+        # every new event outside event trees is the root of a new tree
+        created = [obj for obj, info in objs if obj._created and not (obj.super_event_id or obj.replaced_by_id)]
+        if created:
+            utils.bulk_create_tree_roots(Event, created)
+            for obj in created:
+                obj.snapshot_tracked_fields()
+        for obj, info in objs:
+            if obj._created and obj._state.adding:
+                obj.save()
+        for obj, info in objs:
+            if obj._created:
+                if 'images' in info:
+                    self.set_images(obj, info['images'])
+                self._save_extension_course(obj, info)
+
+        # many-to-many fields are written directly to the through tables
+        changed_keyword_ids = set()
+        for field_name, changes in m2m_changes.items():
+            if not changes:
+                continue
+            field = Event._meta.get_field(field_name)
+            through = field.remote_field.through
+            source_column = '%s_id' % field.m2m_field_name()
+            target_column = '%s_id' % field.m2m_reverse_field_name()
+            removed = [Q(**{source_column: event_id, '%s__in' % target_column: old_ids - new_ids})
+                       for event_id, (old_ids, new_ids) in changes.items() if old_ids - new_ids]
+            if removed:
+                through.objects.filter(reduce(operator.or_, removed)).delete()
+            through.objects.bulk_create([through(**{source_column: event_id, target_column: value_id})
+                                         for event_id, (old_ids, new_ids) in changes.items()
+                                         for value_id in new_ids - old_ids])
+            if field.related_model is Keyword:
+                for old_ids, new_ids in changes.values():
+                    changed_keyword_ids |= old_ids ^ new_ids
+
+        # one-to-many fields with foreign key pointing to event
+        for model, related_objs_by_event in ((Offer, new_offers), (EventLink, new_links)):
+            if related_objs_by_event:
+                model.objects.filter(event_id__in=list(related_objs_by_event)).delete()
+                utils.bulk_create_with_signals(model, [related_obj for related_objs in related_objs_by_event.values()
+                                                       for related_obj in related_objs])
+
+        # Finally, we must save the changed events, even when only related fields changed.
+        changed = []
+        for obj, info in objs:
+            if obj._created or not obj._changed:
+                continue
+            if set(obj._changed_fields) & EVENT_FULL_SAVE_FIELDS:
+                obj.save()
+            else:
+                changed.append(obj)
+        if changed:
+            # _changed_fields has attnames for foreign keys, e.g. location_id, but bulk_update needs field names
+            concrete_field_names = {}
+            for field in Event._meta.concrete_fields:
+                concrete_field_names[field.name] = field.name
+                concrete_field_names[field.attname] = field.name
+            update_fields = {'last_modified_time'}
+            for obj in changed:
+                update_fields.update(concrete_field_names[field] for field in obj._changed_fields
+                                     if field in concrete_field_names)
+                obj.last_modified_time = BaseModel.now()
+            # the untranslated columns are saved with the translations, like in a full save
+            for field_name, lang_fields in translator.get_options_for_model(Event).fields.items():
+                if update_fields & set(lang_field.name for lang_field in lang_fields):
+                    update_fields.add(field_name)
+            moved_place_ids = set()
+            for obj in changed:
+                old_location_id = obj.get_loaded_values().get('location_id')
+                if old_location_id != obj.location_id:
+                    moved_place_ids |= set(place_id for place_id in (old_location_id, obj.location_id) if place_id)
+            utils.bulk_update_with_signals(Event, changed, sorted(update_fields))
+            for obj in changed:
+                obj.snapshot_tracked_fields()
+            if moved_place_ids:
+                Place.objects.filter(id__in=moved_place_ids).update(n_events_changed=True)
+
+        # update event number caches and send notifications, as save() and the m2m_changed handlers would
+        if changed_keyword_ids:
+            Keyword.objects.filter(pk__in=changed_keyword_ids).update(n_events_changed=True)
+        location_ids = set(obj.location_id for obj in created if obj.location_id)
+        if location_ids:
+            Place.objects.filter(id__in=location_ids).update(n_events_changed=True)
+        for obj in created:
+            if obj.publication_status == PublicationStatus.DRAFT:
+                obj.send_draft_posted_notification()
+
+        for obj, info in objs:
+            if obj._changed or obj._created:
+                self._log_event_saved(obj)
+            self._record_saved(obj)
+        return [obj for obj, info in objs]
+
+    @phase('save')
     def save_place(self, info):
         args = dict(data_source=info['data_source'], origin_id=info['origin_id'])
         obj_id = "%s:%s" % (info['data_source'].id, info['origin_id'])
@@ -554,6 +795,7 @@ class Importer(object):
                 verb = "changed"
             logger.debug("%s %s" % (obj, verb))
             obj.save()
+        self._record_saved(obj)
 
         return obj
 
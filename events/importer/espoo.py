@@ -1,7 +1,6 @@
 # -*- coding: utf-8 -*-
 import re
 import logging
-import time
 from datetime import datetime, timedelta
 
 import requests
@@ -22,15 +21,13 @@ from pytz import timezone
 
 from .base import Importer, recur_dict, register_importer
 from .yso import KEYWORDS_TO_ADD_TO_AUDIENCE
+from .metrics import record
 from .sync import ModelSyncher
 from .util import clean_text, clean_url
 
 # Per module logger
 logger = logging.getLogger(__name__)
 
-# Maximum number of attempts to fetch the event from the API before giving up
-MAX_RETRY = 5
-
 YSO_BASE_URL = 'http://www.yso.fi/onto/yso/'
 YSO_KEYWORD_MAPS = {
     u'koululaiset ja opiskelijat': (u'p16485', u'p16486'),
@@ -176,6 +173,15 @@ ADDRESS_LANGUAGES = ('fi', 'sv')
 LOCAL_TZ = timezone('Europe/Helsinki')
 
 
+# Times are in Helsinki timezone
+def to_utc(dt):
+    return LOCAL_TZ.localize(dt, is_dst=None).astimezone(pytz.utc)
+
+
+def dt_parse(dt_str):
+    return to_utc(dateutil.parser.parse(dt_str))
+
+
 def get_lang(lang_id):
     for code, lid in ESPOO_LANGUAGES.items():
         if lid == lang_id:
@@ -453,13 +459,6 @@ class EspooImporter(Importer):
         return keywords
 
     def _import_event(self, lang, event_el, events):
-        # Times are in Helsinki timezone
-        def to_utc(dt):
-            return LOCAL_TZ.localize(dt, is_dst=None).astimezone(pytz.utc)
-
-        def dt_parse(dt_str):
-            return to_utc(dateutil.parser.parse(dt_str))
-
         start_time = dt_parse(event_el['EventStartDate'])
         end_time = dt_parse(event_el['EventEndDate'])
 
@@ -664,60 +663,52 @@ class EspooImporter(Importer):
         #     event['custom_data'][p_k] = p_v
         return event
 
-    def _recur_fetch_paginated_url(self, url, lang, events):
-        for _ in range(MAX_RETRY):
-            response = requests.get(url)
-            if response.status_code != 200:
-                logger.error("Espoo API reported HTTP %d" % response.status_code)
-                time.sleep(5)
-                if self.cache:
-                    self.cache.delete_url(url)
-                continue
+    @staticmethod
+    def _get_next_page_url(root_doc):
+        if 'odata.nextLink' not in root_doc:
+            return None
+        return '%s/api/opennc/v1/%s%s' % (ESPOO_BASE_URL, root_doc['odata.nextLink'], "&$format=json")
+
+    def _fetch_language(self, lang):
+        """Return the event documents of a language, newest first, up to a month back"""
+        espoo_lang_id = ESPOO_LANGUAGES[lang]
+        url = ESPOO_API_URL.format(lang_code=espoo_lang_id)
+        logger.info("Fetching lang {}".format(lang))
+        logger.info("from URL {}".format(url))
+        documents = []
+        # the next page is fetched while the current one is processed
+        pages = self.http_client.fetch_pages(url, self._get_next_page_url)
+        while True:
             try:
-                root_doc = response.json()
-            except ValueError:
-                logger.error("Espoo API returned invalid JSON for url: {}".format(url))
-                if self.cache:
-                    self.cache.delete_url(url)
-                time.sleep(5)
-                continue
-            break
-        else:
-            logger.error("Espoo API is broken, giving up")
-            raise APIBrokenError()
-
-        documents = root_doc['value']
-        earliest_end_time = None
-        for doc in documents:
-            event = self._import_event(lang, doc, events)
-            if not earliest_end_time or event['end_time'] < earliest_end_time:
-                earliest_end_time = event['end_time']
-
-        now = datetime.now().replace(tzinfo=LOCAL_TZ)
-        # We check 31 days backwards.
-        if earliest_end_time and earliest_end_time < now - timedelta(days=31):
-            return
-
-        if 'odata.nextLink' in root_doc:
-            self._recur_fetch_paginated_url(
-                '%s/api/opennc/v1/%s%s' % (
-                    ESPOO_BASE_URL,
-                    root_doc['odata.nextLink'],
-                    "&$format=json"
-                ), lang, events)
+                root_doc = next(pages, None)
+            except (requests.RequestException, ValueError) as error:
+                logger.error("Espoo API is broken, giving up: {}".format(error))
+                raise APIBrokenError()
+            if root_doc is None:
+                return documents
+
+            documents.extend(root_doc['value'])
+            record('parsed', len(root_doc['value']))
+            end_times = [dt_parse(doc['EventEndDate']) for doc in root_doc['value']]
+
+            now = datetime.now().replace(tzinfo=LOCAL_TZ)
+            # We check 31 days backwards.
+            if end_times and min(end_times) < now - timedelta(days=31):
+                return documents
 
     def import_events(self):
         logger.info("Importing Espoo events")
         events = recur_dict()
-        for lang in self.supported_languages:
-            espoo_lang_id = ESPOO_LANGUAGES[lang]
-            url = ESPOO_API_URL.format(lang_code=espoo_lang_id)
+        try:
+            # with the workers option, the languages are fetched concurrently
+            documents_by_lang = self.map_languages(self._fetch_language, self.supported_languages)
+        except APIBrokenError:
+            return
+        # translations are merged to the Finnish events, so the languages are processed in order
+        for lang, documents in zip(self.supported_languages, documents_by_lang):
             logger.info("Processing lang {}".format(lang))
-            logger.info("from URL {}".format(url))
-            try:
-                self._recur_fetch_paginated_url(url, lang, events)
-            except APIBrokenError:
-                return
+            for doc in documents:
+                self._import_event(lang, doc, events)
 
         event_list = sorted(events.values(), key=lambda x: x['end_time'])
         qs = Event.objects.filter(end_time__gte=datetime.now(),
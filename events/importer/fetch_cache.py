@@ -0,0 +1,131 @@
+import hashlib
+import json
+import logging
+import os
+
+# Per module logger
+logger = logging.getLogger(__name__)
+
+
+def get_content_hash(content):
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    return hashlib.sha1(content).hexdigest()
+
+
+def get_record_hash(record):
+    """
+    Return a hash of a single source record, e.g. a decoded JSON object, a CSV row or a
+    serialized XML element.
+    """
+    if not isinstance(record, (bytes, str)):
+        record = json.dumps(record, sort_keys=True, default=str)
+    return get_content_hash(record)
+
+
+class FetchCache(object):
+    """
+    Conditional and incremental fetching of importer sources.
+
+    The ETag, Last-Modified and content hash of each source are stored in a JSON file per
+    source. When the source returns 304 Not Modified or identical content, fetch returns
+    None and the import may be skipped. Hashes of the individual records may also be stored,
+    so that only the records changed since the last import need to be saved.
+
+    The new state is only stored by save, which importers call once the import has
+    succeeded, so that a failed import is retried in full on the next run. Without a
+    directory, the cache is disabled: every source is fetched and every record is changed.
+    """
+    def __init__(self, http_client, directory=None):
+        self.http_client = http_client
+        self.directory = directory
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._pending = {}
+
+    @classmethod
+    def from_options(cls, http_client, options):
+        return cls(http_client, directory=options.get('fetch_cache'))
+
+    @property
+    def enabled(self):
+        return bool(self.directory)
+
+    def _get_path(self, source):
+        return os.path.join(self.directory, '%s.json' % source)
+
+    def load(self, source):
+        if not self.enabled:
+            return {}
+        try:
+            with open(self._get_path(source)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except ValueError:
+            logger.warning("Ignoring corrupted fetch cache of %s" % source)
+            return {}
+
+    def _get_pending(self, source):
+        if source not in self._pending:
+            self._pending[source] = dict(self.load(source))
+        return self._pending[source]
+
+    def fetch(self, source, url, **kwargs):
+        """
+        Fetch url, the content of source. Return the response, or None if the content has
+        not changed since the last import of source.
+        """
+        state = self.load(source)
+        headers = kwargs.pop('headers', {})
+        if state.get('url') == url:
+            if state.get('etag'):
+                headers['If-None-Match'] = state['etag']
+            if state.get('last_modified'):
+                headers['If-Modified-Since'] = state['last_modified']
+        response = self.http_client.get(url, headers=headers, **kwargs)
+        if response.status_code == 304:
+            logger.info("%s not modified since the last import" % source)
+            return None
+        response.raise_for_status()
+
+        content_hash = get_content_hash(response.content)
+        pending = self._get_pending(source)
+        pending.update(url=url, etag=response.headers.get('ETag'),
+                       last_modified=response.headers.get('Last-Modified'))
+        if self.enabled and state.get('url') == url and state.get('content_hash') == content_hash:
+            logger.info("%s content has not changed since the last import" % source)
+            # the validators may have changed, even if the content has not
+            self.save(source)
+            return None
+        pending['content_hash'] = content_hash
+        return response
+
+    def get_changed_records(self, source, records):
+        """
+        Return the ids of the records that have changed since the last import of source.
+
+        records is a dict of record id -> record; ids must be strings, as they are stored as
+        JSON keys. Records are compared by get_record_hash.
+        """
+        record_hashes = {record_id: get_record_hash(record) for record_id, record in records.items()}
+        old_hashes = self.load(source).get('record_hashes', {})
+        self._get_pending(source)['record_hashes'] = record_hashes
+        changed = set(record_id for record_id, record_hash in record_hashes.items()
+                      if old_hashes.get(record_id) != record_hash)
+        if self.enabled:
+            logger.info("%s: %d of %d records changed since the last import" % (source, len(changed), len(records)))
+        return changed
+
+    def save(self, source):
+        """
+        Store the state fetched for source. Importers call this once the import of source has
+        succeeded.
+        """
+        state = self._pending.pop(source, None)
+        if not self.enabled or state is None:
+            return
+        path = self._get_path(source)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(state, f)
+        os.replace(path + '.tmp', path)
@@ -227,9 +227,7 @@ class HarrastushakuImporter(Importer):
         logger.debug('Fetching locations...')
         try:
             url = '{}location/'.format(HARRASTUSHAKU_API_BASE_URL)
-            response = requests.get(url)
-            response.raise_for_status()
-            return response.json()
+            return self.http_client.get_json(url)
         except requests.RequestException as e:
             logger.error('Cannot fetch locations: {}'.format(e))
         return []
@@ -238,9 +236,7 @@ class HarrastushakuImporter(Importer):
         logger.debug('Fetching courses...')
         try:
             url = '{}activity/'.format(HARRASTUSHAKU_API_BASE_URL)
-            response = requests.get(url)
-            response.raise_for_status()
-            return response.json()['data']
+            return self.http_client.get_json(url)['data']
         except requests.RequestException as e:
             logger.error('Cannot fetch courses: {}'.format(e))
         return []
@@ -448,13 +444,16 @@ class HarrastushakuImporter(Importer):
         sub_event_data = deepcopy(event_data)
         sub_event_data['super_event'] = super_event
 
+        sub_events_data = []
         for sub_event_time_range in sub_event_time_ranges:
-            sub_event_data['start_time'] = sub_event_time_range.start
-            sub_event_data['end_time'] = sub_event_time_range.end
-            sub_event_data['origin_id'] = (
-                    event_data['origin_id'] + self.create_sub_event_origin_id_suffix(sub_event_time_range))
-            sub_event = self.save_event(sub_event_data)
-
+            sub_events_data.append(dict(
+                sub_event_data,
+                start_time=sub_event_time_range.start,
+                end_time=sub_event_time_range.end,
+                origin_id=event_data['origin_id'] + self.create_sub_event_origin_id_suffix(sub_event_time_range),
+            ))
+
+        for sub_event in self.save_events(sub_events_data):
             if sub_event._changed:
                 super_event._changed = True
             sub_event_syncher.mark(sub_event)
@@ -6,7 +6,6 @@ import requests_cache
 import re
 import dateutil.parser
 from datetime import datetime, timedelta
-import time
 from django.utils.html import strip_tags
 from .base import Importer, register_importer, recur_dict
 from .yso import KEYWORDS_TO_ADD_TO_AUDIENCE
@@ -18,6 +17,7 @@ import bleach
 from django.conf import settings
 from .util import clean_text
 
+from .metrics import record
 from .sync import ModelSyncher
 
 # Per module logger
@@ -158,6 +158,14 @@ def get_lang(lang_id):
 LOCAL_TZ = timezone('Europe/Helsinki')
 
 
+def dt_parse(dt_str):
+    """Convert a string to UTC datetime"""
+    # Times are in UTC+02:00 timezone
+    return LOCAL_TZ.localize(
+            dateutil.parser.parse(dt_str),
+            is_dst=None).astimezone(pytz.utc)
+
+
 def mark_deleted(obj):
     if obj.deleted:
         return False
@@ -247,13 +255,6 @@ class HelmetImporter(Importer):
         return ext_props
 
     def _import_event(self, lang, event_el, events):
-        def dt_parse(dt_str):
-            """Convert a string to UTC datetime"""
-            # Times are in UTC+02:00 timezone
-            return LOCAL_TZ.localize(
-                    dateutil.parser.parse(dt_str),
-                    is_dst=None).astimezone(pytz.utc)
-
         start_time = dt_parse(event_el['EventStartDate'])
         end_time = dt_parse(event_el['EventEndDate'])
 
@@ -452,60 +453,51 @@ class HelmetImporter(Importer):
 
         return event
 
-    def _recur_fetch_paginated_url(self, url, lang, events):
-        max_tries = 5
-        for try_number in range(0, max_tries):
-            response = requests.get(url)
-            if response.status_code != 200:
-                logger.warning("HelMet API reported HTTP %d" % response.status_code)
-                time.sleep(2)
-                if self.cache:
-                    self.cache.delete_url(url)
-                continue
+    @staticmethod
+    def _get_next_page_url(root_doc):
+        if 'odata.nextLink' not in root_doc:
+            return None
+        return '%s/api/opennc/v1/%s%s' % (HELMET_BASE_URL, root_doc['odata.nextLink'], "&$format=json")
+
+    def _fetch_language(self, lang):
+        """Return the event documents of a language, newest first, up to a month back"""
+        helmet_lang_id = HELMET_LANGUAGES[lang]
+        url = HELMET_API_URL.format(lang_code=helmet_lang_id, start_date='2016-01-01')
+        logger.info("Fetching lang {} from URL {}".format(lang, url))
+        documents = []
+        # the next page is fetched while the current one is processed
+        pages = self.http_client.fetch_pages(url, self._get_next_page_url)
+        while True:
             try:
-                root_doc = response.json()
-            except ValueError:
-                logger.warning("HelMet API returned invalid JSON (try {} of {})".format(try_number + 1, max_tries))
-                if self.cache:
-                    self.cache.delete_url(url)
-                time.sleep(5)
-                continue
-            break
-        else:
-            logger.error("HelMet API broken again, giving up")
-            raise APIBrokenError()
-
-        documents = root_doc['value']
-        earliest_end_time = None
-        for doc in documents:
-            event = self._import_event(lang, doc, events)
-            if not earliest_end_time or event['end_time'] < earliest_end_time:
-                earliest_end_time = event['end_time']
-
-        now = datetime.now().replace(tzinfo=LOCAL_TZ)
-        # We check 31 days backwards.
-        if earliest_end_time < now - timedelta(days=31):
-            return
-
-        if 'odata.nextLink' in root_doc:
-            self._recur_fetch_paginated_url(
-                '%s/api/opennc/v1/%s%s' % (
-                    HELMET_BASE_URL,
-                    root_doc['odata.nextLink'],
-                    "&$format=json"
-                ), lang, events)
+                root_doc = next(pages, None)
+            except (requests.RequestException, ValueError) as error:
+                logger.error("HelMet API broken again, giving up: {}".format(error))
+                raise APIBrokenError()
+            if root_doc is None:
+                return documents
+
+            documents.extend(root_doc['value'])
+            record('parsed', len(root_doc['value']))
+            end_times = [dt_parse(doc['EventEndDate']) for doc in root_doc['value']]
+
+            now = datetime.now().replace(tzinfo=LOCAL_TZ)
+            # We check 31 days backwards.
+            if end_times and min(end_times) < now - timedelta(days=31):
+                return documents
 
     def import_events(self):
         logger.info("Importing HelMet events")
         events = recur_dict()
-        for lang in self.supported_languages:
-            helmet_lang_id = HELMET_LANGUAGES[lang]
-            url = HELMET_API_URL.format(lang_code=helmet_lang_id, start_date='2016-01-01')
-            logger.info("Processing lang {} from URL {}".format(lang, url))
-            try:
-                self._recur_fetch_paginated_url(url, lang, events)
-            except APIBrokenError:
-                return
+        try:
+            # with the workers option, the languages are fetched concurrently
+            documents_by_lang = self.map_languages(self._fetch_language, self.supported_languages)
+        except APIBrokenError:
+            return
+        # translations are merged to the Finnish events, so the languages are processed in order
+        for lang, documents in zip(self.supported_languages, documents_by_lang):
+            logger.info("Processing lang {}".format(lang))
+            for doc in documents:
+                self._import_event(lang, doc, events)
 
         event_list = sorted(events.values(), key=lambda x: x['end_time'])
         qs = Event.objects.filter(end_time__gte=datetime.now(),
@@ -0,0 +1,172 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from urllib3.util.retry import Retry
+
+from events.importer.metrics import record
+
+# Per module logger
+logger = logging.getLogger(__name__)
+
+# (connect, read) timeouts in seconds; the read timeout applies between received bytes
+DEFAULT_TIMEOUT = (10, 60)
+DEFAULT_RETRIES = 5
+DEFAULT_BACKOFF_FACTOR = 1
+# number of pages fetched concurrently
+DEFAULT_MAX_WORKERS = 4
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class HTTPClient(object):
+    """
+    HTTP client shared by the importers.
+
+    Connections are pooled in a session per thread, every request has a timeout, and
+    connection errors and server errors are retried with exponential backoff. Known page
+    urls may be fetched concurrently with prefetch, and the next page of a paginated
+    resource is fetched while the current one is processed with fetch_pages.
+
+    With record_dir, all responses are also saved to that directory. With replay_dir,
+    responses are read from a directory recorded earlier without any network access, so
+    that imports can be rerun and benchmarked offline.
+    """
+    def __init__(self, timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES, backoff_factor=DEFAULT_BACKOFF_FACTOR,
+                 max_workers=DEFAULT_MAX_WORKERS, record_dir=None, replay_dir=None):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.max_workers = max_workers
+        self.record_dir = record_dir
+        self.replay_dir = replay_dir
+        if record_dir:
+            os.makedirs(record_dir, exist_ok=True)
+        self._local = threading.local()
+        self._executor = None
+
+    @classmethod
+    def from_options(cls, options):
+        return cls(max_workers=options.get('workers') or DEFAULT_MAX_WORKERS,
+                   record_dir=options.get('record'), replay_dir=options.get('replay'))
+
+    @property
+    def session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            retry = Retry(total=self.retries, backoff_factor=self.backoff_factor,
+                          status_forcelist=RETRY_STATUSES, raise_on_status=False)
+            adapter = HTTPAdapter(pool_maxsize=self.max_workers, max_retries=retry)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            self._local.session = session
+        return session
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    @staticmethod
+    def _get_recording_path(directory, url):
+        return os.path.join(directory, hashlib.sha256(url.encode('utf-8')).hexdigest())
+
+    def _record(self, request_url, response):
+        path = self._get_recording_path(self.record_dir, request_url)
+        with open(path + '.json', 'w') as f:
+            json.dump({'url': response.url, 'status_code': response.status_code,
+                       'headers': dict(response.headers), 'encoding': response.encoding}, f)
+        with open(path + '.body', 'wb') as f:
+            f.write(response.content)
+
+    def _replay(self, request_url):
+        path = self._get_recording_path(self.replay_dir, request_url)
+        try:
+            with open(path + '.json') as f:
+                meta = json.load(f)
+            with open(path + '.body', 'rb') as f:
+                content = f.read()
+        except FileNotFoundError:
+            raise requests.ConnectionError("No recorded response for %s" % request_url)
+        response = requests.Response()
+        response.url = meta['url']
+        response.status_code = meta['status_code']
+        response.headers = CaseInsensitiveDict(meta['headers'])
+        response.encoding = meta['encoding']
+        response._content = content
+        return response
+
+    def get(self, url, **kwargs):
+        start = time.perf_counter()
+        # responses are recorded by the requested url, as redirects change the url of the response
+        request_url = requests.Request('GET', url, params=kwargs.get('params')).prepare().url
+        if self.replay_dir:
+            response = self._replay(request_url)
+        else:
+            kwargs.setdefault('timeout', self.timeout)
+            response = self.session.get(url, **kwargs)
+            if self.record_dir:
+                self._record(request_url, response)
+        record('requests')
+        record('fetched_bytes', len(response.content))
+        record('fetch_time', time.perf_counter() - start)
+        return response
+
+    def get_json(self, url, **kwargs):
+        """
+        Return the decoded JSON document at url. Responses that are not valid JSON are retried,
+        as some APIs occasionally return broken documents.
+        """
+        for try_number in range(1, self.retries + 1):
+            response = self.get(url, **kwargs)
+            response.raise_for_status()
+            try:
+                return response.json()
+            except ValueError:
+                if try_number == self.retries or self.replay_dir:
+                    raise
+                logger.warning("{} returned invalid JSON (try {} of {})".format(url, try_number, self.retries))
+                # requests_cache must not return the broken document again
+                if hasattr(self.session, 'cache'):
+                    self.session.cache.delete_url(response.url)
+                time.sleep(self.backoff_factor * 2 ** try_number)
+
+    def prefetch(self, urls, fetch=None):
+        """
+        Yield the responses of the urls in order. At most max_workers urls are fetched
+        concurrently, and at most max_workers responses are held ahead of the caller.
+        """
+        fetch = fetch or self.get
+        pending = deque()
+        for url in urls:
+            if len(pending) >= self.max_workers:
+                yield pending.popleft().result()
+            pending.append(self.executor.submit(fetch, url))
+        while pending:
+            yield pending.popleft().result()
+
+    def fetch_pages(self, url, get_next_url):
+        """
+        Yield the JSON documents of a paginated resource, starting from url. The next page,
+        given by get_next_url(document), is fetched while the caller processes the current one.
+        """
+        future = self.executor.submit(self.get_json, url)
+        while future is not None:
+            document = future.result()
+            next_url = get_next_url(document)
+            future = self.executor.submit(self.get_json, next_url) if next_url else None
+            yield document
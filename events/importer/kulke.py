@@ -15,7 +15,7 @@ from django_orghierarchy.models import Organization
 
 from .base import Importer, register_importer, recur_dict
 from .yso import KEYWORDS_TO_ADD_TO_AUDIENCE
-from .util import unicodetext, clean_url
+from .util import iter_elements, unicodetext, clean_url
 from events.models import DataSource, Event, EventAggregate, EventAggregateMember, Keyword, Place, License
 from events.keywords import KeywordMatcher
 from events.translation_utils import expand_model_fields
@@ -792,8 +792,7 @@ class KulkeImporter(Importer):
         for lang in ['fi', 'sv', 'en']:
             events_file = os.path.join(
                 settings.IMPORT_FILE_PATH, 'kulke', 'events-%s.xml' % lang)
-            root = etree.parse(events_file)
-            for event_el in root.xpath('/eventdata/event'):
+            for event_el in iter_elements(events_file, 'event', 'eventdata'):
                 success = self._import_event(lang, event_el, events, importing_courses)
                 if success:
                     self._gather_recurring_events(lang, event_el, events, recurring_groups)
@@ -4,7 +4,6 @@ import csv
 import pytz
 import re
 import bleach
-import requests
 import logging
 from os.path import commonprefix
 from collections import defaultdict
@@ -15,6 +14,7 @@ from django.utils.html import strip_tags
 from django_orghierarchy.models import Organization
 from events.models import DataSource, Event, Keyword, Place, License
 from .base import Importer, recur_dict, register_importer
+from .metrics import record
 from .sync import ModelSyncher
 from .util import clean_text, clean_url
 
@@ -221,8 +221,10 @@ class LippupisteImporter(Importer):
         self.sub_event_count_by_super_event_source_id = defaultdict(lambda: 0)
 
     def _fetch_event_source_data(self, url):
-        # stream=True allows lazy iteration
-        response = requests.get(url, stream=True)
+        """Return a reader of the source events, or None if they have not changed since the last import"""
+        response = self.fetch_cache.fetch(self.name, url)
+        if response is None:
+            return None
         response_iter = response.iter_lines()
         # CSV reader wants str instead of byte, let's decode
         decoded_response_iter = codecs.iterdecode(response_iter, 'utf-8')
@@ -518,8 +520,7 @@ class LippupisteImporter(Importer):
                                     delete_func=mark_deleted,
                                     check_deleted_func=check_deleted)
 
-        for event in event_list:
-            obj = self.save_event(event)
+        for event, obj in zip(event_list, self.save_events(event_list)):
             if 'super_event_id' in event:
                 obj.super_event_id = event['super_event_id']
                 obj.save()
@@ -532,7 +533,12 @@ class LippupisteImporter(Importer):
             raise ImproperlyConfigured("LIPPUPISTE_EVENT_API_URL must be set in environment or config file")
         logger.info("Importing Lippupiste events")
         events = recur_dict()
-        event_source_data = list(self._fetch_event_source_data(LIPPUPISTE_EVENT_API_URL))
+        reader = self._fetch_event_source_data(LIPPUPISTE_EVENT_API_URL)
+        if reader is None:
+            logger.info("Lippupiste events have not changed since the last import, skipping")
+            return
+        event_source_data = list(reader)
+        record('parsed', len(event_source_data))
         if not event_source_data:
             raise ValidationError("Lippupiste API didn't return data, giving up")
 
@@ -598,5 +604,6 @@ class LippupisteImporter(Importer):
         super_events = Event.objects.filter(data_source=self.data_source, super_event_type__isnull=False)
         for super_event in super_events:
             self._update_superevent_details(super_event)
+        self.fetch_cache.save(self.name)
 
         logger.info("%d events processed" % len(events.values()))
@@ -1,11 +1,11 @@
 # -*- coding: utf-8 -*-
+import io
 import re
 import dateutil.parser
-import requests
 import requests_cache
 import pytz
 import logging
-from collections import OrderedDict
+from collections import OrderedDict, defaultdict
 from django.db.models import Count
 from django_orghierarchy.models import Organization
 
@@ -15,7 +15,7 @@ from events.models import DataSource, Place, Event
 from events.keywords import KeywordMatcher
 
 from .base import Importer, register_importer, recur_dict
-from .util import clean_text, unicodetext, replace_location
+from .util import clean_text, iter_elements, unicodetext, replace_location
 
 # Per module logger
 logger = logging.getLogger(__name__)
@@ -33,6 +33,10 @@ MATKO_URLS = {
     ])
 }
 
+# fetch cache sources of the event feeds and of the events combined from all the feeds
+EVENT_FEED_SOURCE = 'matko_events_%s'
+EVENT_SOURCE = 'matko_events'
+
 LOCATION_TPREK_MAP = {
     'helsingin kaupunginteatteri / lilla teatern': '9353',
     'helsingin kaupunginteatteri / teatteristudio pasila': '9340',
@@ -403,24 +407,65 @@ class MatkoImporter(Importer):
 
         return places
 
-    def items_from_url(self, url):
-        resp = requests.get(url)
+    def items_from_response(self, resp):
         assert resp.status_code == 200
-        root = etree.fromstring(resp.content)
-        return root.xpath('channel/item')
+        # items are parsed one at a time instead of building the tree of the whole feed
+        return iter_elements(io.BytesIO(resp.content), 'item', 'channel')
+
+    def _fetch_event_feeds(self):
+        """
+        Return the responses of the event feeds by language, or None if none of the feeds has
+        changed since the last import.
+        """
+        langs, urls = zip(*MATKO_URLS['events'].items())
+        if self.options['single']:
+            fetch = self.http_client.get
+        else:
+            sources = dict(zip(urls, (EVENT_FEED_SOURCE % lang for lang in langs)))
+
+            def fetch(url):
+                return self.fetch_cache.fetch(sources[url], url)
+        # the feeds of all languages are fetched concurrently
+        responses = list(self.http_client.prefetch(urls, fetch=fetch))
+        if all(resp is None for resp in responses):
+            return None
+        # events combine all the languages, so the feeds that have not changed are needed, too
+        return OrderedDict((lang, resp if resp is not None else self.http_client.get(url))
+                           for lang, url, resp in zip(langs, urls, responses))
 
     def import_events(self):
         logger.info("Importing Matko events")
+        feeds = self._fetch_event_feeds()
+        if feeds is None:
+            logger.info("Matko events have not changed since the last import, skipping")
+            return
         events = recur_dict()
         keyword_matcher = KeywordMatcher()
-        for lang, url in MATKO_URLS['events'].items():
-            items = self.items_from_url(url)
+        items_by_event = defaultdict(bytes)
+        for lang, resp in feeds.items():
+            items = self.items_from_response(resp)
             for item in items:
                 self._import_event_from_feed(lang, item, events, keyword_matcher)
-
-        for event in events.values():
-            self.save_event(event)
-        logger.info("%d events processed" % len(events.values()))
+                items_by_event[str(int(text(item, 'uniqueid')))] += etree.tostring(item)
+
+        up_to_date_ids = set()
+        if not self.options['single']:
+            changed_ids = self.fetch_cache.get_changed_records(EVENT_SOURCE, items_by_event)
+            unchanged_ids = set(items_by_event) - changed_ids
+            if unchanged_ids:
+                up_to_date_ids = set(Event.objects.filter(
+                    data_source=self.data_source, origin_id__in=unchanged_ids, deleted=False
+                ).values_list('origin_id', flat=True))
+
+        for eid, event in events.items():
+            if str(eid) not in up_to_date_ids:
+                self.save_event(event)
+        logger.info("%d events processed, %d of them up to date" % (len(events), len(up_to_date_ids)))
+
+        if not self.options['single']:
+            for lang in feeds:
+                self.fetch_cache.save(EVENT_FEED_SOURCE % lang)
+            self.fetch_cache.save(EVENT_SOURCE)
 
     def _fetch_places(self):
         if hasattr(self, 'places'):
@@ -435,8 +480,10 @@ class MatkoImporter(Importer):
             loc['publisher'] = self.organization
             places[origin_id] = loc
 
-        for lang, url in MATKO_URLS['places'].items():
-            items = self.items_from_url(url)
+        # the feeds of all languages are fetched concurrently
+        langs, urls = zip(*MATKO_URLS['places'].items())
+        for lang, resp in zip(langs, self.http_client.prefetch(urls)):
+            items = self.items_from_response(resp)
             self._parse_places_from_feed(lang, items, places)
 
         self.places = places
@@ -0,0 +1,131 @@
+import cProfile
+import logging
+import os
+import resource
+import threading
+import time
+from contextlib import contextmanager
+
+from django.db import connection
+
+# Per module logger
+logger = logging.getLogger(__name__)
+
+# metrics of the importer run in progress
+_active = None
+
+
+def get_peak_rss():
+    """Return the peak memory usage of the process in megabytes"""
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def record(counter, value=1):
+    """Add value to a counter of the running phases of the active importer run, if any"""
+    if _active is not None:
+        _active.add(counter, value)
+
+
+@contextmanager
+def phase(name):
+    """Measure a phase of the active importer run, if any. May also be used as a decorator."""
+    if _active is None:
+        yield
+        return
+    with _active.phase(name):
+        yield
+
+
+class ImportMetrics(object):
+    """
+    Metrics of an importer run, collected per phase.
+
+    Phases may be nested, and everything that happens during a phase counts towards it,
+    including nested phases. Each phase records the number of times it was run, its duration,
+    the number and duration of database queries, the peak memory usage of the process at its
+    end, and any counters recorded during it, e.g. fetched bytes or created objects.
+
+    With profile_dir, each phase is also profiled with cProfile, excluding its nested phases,
+    and the stats are written to <profile_dir>/<importer>.<phase>.prof by finish.
+    """
+    def __init__(self, name, profile_dir=None):
+        self.name = name
+        self.profile_dir = profile_dir
+        if profile_dir:
+            os.makedirs(profile_dir, exist_ok=True)
+        self.phases = {}
+        self._stack = []
+        self._profiles = {}
+        self._profile_stack = []
+        self._lock = threading.Lock()
+
+    def activate(self):
+        global _active
+        _active = self
+
+    def add(self, counter, value=1):
+        with self._lock:
+            for stats in self._stack:
+                stats[counter] = stats.get(counter, 0) + value
+
+    @staticmethod
+    def _get_query_wrapper(stats):
+        def wrapper(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                stats['queries'] += 1
+                stats['query_time'] += time.perf_counter() - start
+        return wrapper
+
+    def _start_profile(self, name):
+        if self._profile_stack:
+            self._profile_stack[-1].disable()
+        profile = self._profiles.setdefault(name, cProfile.Profile())
+        self._profile_stack.append(profile)
+        profile.enable()
+
+    def _stop_profile(self):
+        self._profile_stack.pop().disable()
+        if self._profile_stack:
+            self._profile_stack[-1].enable()
+
+    @contextmanager
+    def phase(self, name):
+        stats = self.phases.setdefault(name, {'calls': 0, 'duration': 0.0, 'queries': 0, 'query_time': 0.0})
+        if any(running is stats for running in self._stack):
+            # a phase running within itself is measured once
+            yield
+            return
+        stats['calls'] += 1
+        with self._lock:
+            self._stack.append(stats)
+        if self.profile_dir:
+            self._start_profile(name)
+        start = time.perf_counter()
+        try:
+            with connection.execute_wrapper(self._get_query_wrapper(stats)):
+                yield
+        finally:
+            if self.profile_dir:
+                self._stop_profile()
+            stats['duration'] += time.perf_counter() - start
+            stats['peak_rss_mb'] = get_peak_rss()
+            with self._lock:
+                self._stack.remove(stats)
+
+    def finish(self):
+        """Write the profiles, if any, and return the metrics as a dict"""
+        for name, profile in self._profiles.items():
+            path = os.path.join(self.profile_dir, '%s.%s.prof' % (self.name, name))
+            profile.dump_stats(path)
+            logger.info("Profile of %s written to %s" % (name, path))
+        return {
+            'importer': self.name,
+            'peak_rss_mb': round(get_peak_rss(), 1),
+            'phases': {name: {key: round(value, 3) if isinstance(value, float) else value
+                              for key, value in stats.items()}
+                       for name, stats in self.phases.items()},
+        }
@@ -8,6 +8,7 @@ from django.utils.module_loading import import_string
 from django_orghierarchy.models import Organization
 
 from events.models import DataSource, Place
+from events.sql import update_place_divisions
 from .sync import ModelSyncher
 from .base import Importer, register_importer
 
@@ -148,7 +149,10 @@ class OsoiteImporter(Importer):
             else:
                 verb = "changed (fields: %s)" % ', '.join(obj._changed_fields)
             logger.info("%s %s" % (obj, verb))
-            obj.save()
+            # divisions are updated in bulk once all places are saved
+            obj.save(update_divisions=False)
+            if 'position' in obj._changed_fields:
+                self.moved_place_ids.add(obj.id)
 
         syncher.mark(obj)
 
@@ -171,9 +175,13 @@ class OsoiteImporter(Importer):
             logger.info("%s addresses loaded" % len(obj_list))
         syncher = ModelSyncher(queryset, lambda obj: obj.origin_id, delete_func=self.mark_deleted,
                                check_deleted_func=self.check_deleted)
+        self.moved_place_ids = set()
         for idx, obj in enumerate(obj_list):
             if idx and (idx % 1000) == 0:
                 logger.info("%s addresses processed" % idx)
             self._import_address(syncher, obj)
 
+        logger.info("Updating divisions of %s moved addresses" % len(self.moved_place_ids))
+        update_place_divisions(self.moved_place_ids)
+
         syncher.finish(self.options.get('remap', False))
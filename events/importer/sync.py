@@ -1,9 +1,17 @@
 import logging
 
+from events.importer.metrics import phase, record
+
 # Per module logger
 logger = logging.getLogger(__name__)
 
 
+def check_delete_count(delete_count, total_count, force=False):
+    """Refuse to delete a large share of the objects, unless forced"""
+    if delete_count > 5 and delete_count > total_count * 0.2 and not force:
+        raise Exception(f"Attempting to delete {delete_count} out of a total of {total_count} items")
+
+
 class ModelSyncher(object):
     def __init__(self, queryset, generate_obj_id,
                  delete_func=None, check_deleted_func=None, allow_deleting_func=None):
@@ -35,6 +43,7 @@ class ModelSyncher(object):
     def get(self, obj_id):
         return self.obj_dict.get(obj_id, None)
 
+    @phase('delete')
     def finish(self, force=False):
         delete_list = []
         for obj_id, obj in self.obj_dict.items():
@@ -49,8 +58,7 @@ class ModelSyncher(object):
             if self.check_deleted_func is not None and self.check_deleted_func(obj):
                 continue
             delete_list.append(obj)
-        if len(delete_list) > 5 and len(delete_list) > len(self.obj_dict) * 0.2 and not force:
-            raise Exception(f"Attempting to delete {len(delete_list)} out of a total of {len(self.obj_dict)} items")
+        check_delete_count(len(delete_list), len(self.obj_dict), force)
         for obj in delete_list:
             if self.allow_deleting_func:
                 if not self.allow_deleting_func(obj):
@@ -62,3 +70,4 @@ class ModelSyncher(object):
                 deleted = True
             if deleted:
                 logger.info("Deleting object %s" % obj)
+                record('deleted')
@@ -1,6 +1,5 @@
 # -*- coding: utf-8 -*-
 import logging
-import requests
 import requests_cache
 
 from django import db
@@ -11,6 +10,8 @@ from django_orghierarchy.models import Organization
 
 from events.importer.util import replace_location
 from events.models import DataSource, Place
+from events.sql import update_place_divisions
+from .metrics import record
 from .sync import ModelSyncher
 from .base import Importer, register_importer
 
@@ -18,6 +19,8 @@ from .base import Importer, register_importer
 logger = logging.getLogger(__name__)
 
 URL_BASE = 'http://www.hel.fi/palvelukarttaws/rest/v4/'
+# fetch cache source of the unit list
+UNIT_SOURCE = 'tprek_units'
 GK25_SRID = 3879
 
 
@@ -49,8 +52,18 @@ class TprekImporter(Importer):
         if res_id is not None:
             url = "%s%s/" % (url, res_id)
         logger.info("Fetching URL %s" % url)
-        resp = requests.get(url)
-        assert resp.status_code == 200
+        return self.http_client.get_json(url)
+
+    def fetch_units(self):
+        """Return the unit list, or None if it has not changed since the last import"""
+        if self.options.get('remap', None):
+            # remapping must process all the units
+            return self.pk_get('unit')
+        url = "%sunit/" % URL_BASE
+        logger.info("Fetching URL %s" % url)
+        resp = self.fetch_cache.fetch(UNIT_SOURCE, url)
+        if resp is None:
+            return None
         return resp.json()
 
     def delete_and_replace(self, obj):
@@ -165,7 +178,10 @@ class TprekImporter(Importer):
             else:
                 verb = "changed (fields: %s)" % ', '.join(obj._changed_fields)
             logger.info("%s %s" % (obj, verb))
-            obj.save()
+            # divisions are updated in bulk once all places are saved
+            obj.save(update_divisions=False)
+            if 'position' in obj._changed_fields:
+                self.moved_place_ids.add(obj.id)
 
         syncher.mark(obj)
 
@@ -174,19 +190,41 @@ class TprekImporter(Importer):
             requests_cache.install_cache('tprek')
 
         queryset = Place.objects.filter(data_source=self.data_source)
-        if self.options.get('single', None):
-            obj_id = self.options['single']
-            obj_list = [self.pk_get('unit', obj_id)]
-            queryset = queryset.filter(id=obj_id)
+        single = self.options.get('single', None)
+        if single:
+            obj_list = [self.pk_get('unit', single)]
+            queryset = queryset.filter(id=single)
+            changed_ids = None
         else:
             logger.info("Loading units...")
-            obj_list = self.pk_get('unit')
+            obj_list = self.fetch_units()
+            if obj_list is None:
+                logger.info("Units have not changed since the last import, skipping")
+                return
             logger.info("%s units loaded" % len(obj_list))
+            record('parsed', len(obj_list))
+            changed_ids = self.fetch_cache.get_changed_records(
+                UNIT_SOURCE, {str(info['id']): info for info in obj_list})
+            if self.options.get('remap', None):
+                # remapping must process all the units, the record hashes are only stored for the next import
+                changed_ids = None
         syncher = ModelSyncher(queryset, lambda obj: obj.origin_id, delete_func=self.mark_deleted,
                                check_deleted_func=self.check_deleted)
+        self.moved_place_ids = set()
         for idx, info in enumerate(obj_list):
             if idx and (idx % 1000) == 0:
                 logger.info("%s units processed" % idx)
+            if changed_ids is not None and str(info['id']) not in changed_ids:
+                # the unit is identical to the last import, so the place is up to date unless it is missing
+                obj = syncher.get(str(info['id']))
+                if obj and not obj.deleted:
+                    syncher.mark(obj)
+                    continue
             self._import_unit(syncher, info)
 
+        logger.info("Updating divisions of %s moved units" % len(self.moved_place_ids))
+        update_place_divisions(self.moved_place_ids)
+
         syncher.finish(self.options.get('remap', False))
+        if not single:
+            self.fetch_cache.save(UNIT_SOURCE)
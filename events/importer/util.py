@@ -3,11 +3,13 @@
 import re
 import logging
 from bs4 import BeautifulSoup
+from lxml import etree
 from langdetect import detect
 from langdetect.lang_detect_exception import LangDetectException
 from django.utils.translation.trans_real import activate, deactivate
 from django.core.validators import URLValidator, ValidationError
 
+from events.importer.metrics import record
 from events.models import Place
 
 # Per module logger
@@ -106,6 +108,24 @@ def unicodetext(item):
     return clean_text(item.text, strip_newlines=True)
 
 
+def iter_elements(source, tag, parent_tag):
+    """
+    Yield the tag elements that are children of parent_tag elements in an XML file or file-like
+    object, one at a time. Each element is cleared once the caller has processed it, so the whole
+    document is never held in memory. Callers must not keep references to the elements.
+    """
+    for _, element in etree.iterparse(source, events=('end',), tag=tag):
+        parent = element.getparent()
+        if parent is None or parent.tag != parent_tag:
+            continue
+        record('parsed')
+        yield element
+        element.clear()
+        # the cleared elements themselves are removed from the tree, too
+        while element.getprevious() is not None:
+            del parent[0]
+
+
 def reduced_text(text):
     return re.sub(r'\W', '', text, flags=re.U).lower()
 
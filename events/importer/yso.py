@@ -1,17 +1,23 @@
 # -*- coding: utf-8 -*-
-import requests
+import glob
+import gzip
+import json
 import logging
+import os
 
 import rdflib
 from django.core.exceptions import ObjectDoesNotExist, ValidationError
 from django_orghierarchy.models import Organization
+from modeltranslation.translator import translator
 from rdflib import RDF
 from rdflib.namespace import DCTERMS, OWL, SKOS
 
 from events.models import Keyword, KeywordLabel, DataSource, BaseModel, Language
 
+from .fetch_cache import get_content_hash
+from .metrics import phase, record
 from .util import active_language
-from .sync import ModelSyncher
+from .sync import ModelSyncher, check_delete_count
 from .base import Importer, register_importer
 
 # Per module logger
@@ -19,6 +25,10 @@ logger = logging.getLogger(__name__)
 
 yso = rdflib.Namespace('http://www.yso.fi/onto/yso/')
 URL = 'http://finto.fi/rest/v1/yso/data'
+# number of rows written at a time when syncing keywords and labels
+BATCH_SIZE = 1000
+
+KeywordAltLabels = Keyword.alt_labels.through
 
 YSO_DEPRECATED_MAPS = {
     'yso:p12262': 'yso:p4354',  # lapset (kooste) -> lapset (ikään liittyvä rooli), missing YSO replacement
@@ -66,16 +76,78 @@ def is_aggregate_concept(graph, subject):
     return (subject, SKOS.inScheme, rdflib.term.URIRef(yso + 'aggregateconceptscheme')) in graph
 
 
-def get_replacement(graph, subject):
-    for subject, verb, object in graph.triples((subject, DCTERMS.isReplacedBy, None)):
-        return object
+class YsoSnapshot(object):
+    """
+    The facts about YSO concepts needed by the importer, extracted from the parsed graph.
+
+    Parsing the YSO dump takes minutes and gigabytes of memory, so snapshots are stored on disk
+    keyed by the hash of the dump, and the dump is only parsed again when it has changed.
+    """
+    def __init__(self, concepts, replacements):
+        # yso id -> {'labels': [[language, label]], 'alt_labels': [[label, language]],
+        #            'deprecated': bool, 'aggregate': bool}
+        self.concepts = concepts
+        # yso id -> subject replacing it
+        self.replacements = replacements
+
+    @classmethod
+    def from_graph(cls, graph):
+        concepts = {}
+        for subject in graph.subjects(RDF.type, SKOS.Concept):
+            try:
+                yid = get_yso_id(subject)
+            except ValidationError as e:
+                logger.error(e)
+                continue
+            concepts[yid] = {
+                'labels': [[literal.language, str(literal)] for _, literal in graph.preferredLabel(subject)],
+                'alt_labels': [[str(label), label.language] for label in graph.objects(subject, SKOS.altLabel)],
+                'deprecated': is_deprecated(graph, subject),
+                'aggregate': is_aggregate_concept(graph, subject),
+            }
+        replacements = {}
+        for subject, replacement in graph.subject_objects(DCTERMS.isReplacedBy):
+            try:
+                replacements.setdefault(get_yso_id(subject), str(replacement))
+            except ValidationError:
+                continue
+        return cls(concepts, replacements)
+
+    @staticmethod
+    def get_path(directory, content_hash):
+        return os.path.join(directory, 'yso-%s.json.gz' % content_hash)
+
+    @classmethod
+    def load(cls, directory, content_hash):
+        """Return the snapshot of the dump with content_hash, or None if there is none"""
+        if not directory or not content_hash:
+            return None
+        try:
+            with gzip.open(cls.get_path(directory, content_hash), 'rt', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        return cls(data['concepts'], data['replacements'])
+
+    def save(self, directory, content_hash):
+        path = self.get_path(directory, content_hash)
+        with gzip.open(path + '.tmp', 'wt', encoding='utf-8') as f:
+            json.dump({'concepts': self.concepts, 'replacements': self.replacements}, f)
+        os.replace(path + '.tmp', path)
+        # snapshots of older dumps are not needed anymore
+        for old_path in glob.glob(self.get_path(directory, '*')):
+            if old_path != path:
+                os.remove(old_path)
+
+    def get_replacement(self, yid):
+        return self.replacements.get(yid)
 
 
-def deprecate_and_replace(graph, keyword):
+def deprecate_and_replace(snapshot, keyword):
     if keyword.id in YSO_DEPRECATED_MAPS:
         # these ones need no further processing
         return keyword.deprecate()
-    replacement_subject = get_replacement(graph, get_subject(keyword.id))
+    replacement_subject = snapshot.get_replacement(keyword.id)
     new_keyword = None
     if replacement_subject:
         try:
@@ -116,182 +188,178 @@ class YsoImporter(Importer):
 
     def import_keywords(self):
         logger.info("Importing YSO keywords")
-        graph = self.load_graph_into_memory(URL)
-        self.save_keywords(graph)
-
-    def load_graph_into_memory(self, url):
+        snapshot = self.load_snapshot(URL)
+        self.save_keywords(snapshot)
+        self.fetch_cache.save(self.name)
+
+    def load_snapshot(self, url):
+        """
+        Return the snapshot of the YSO dump at url. The dump is only parsed if there is no
+        snapshot of it stored in the fetch cache directory.
+        """
+        directory = self.fetch_cache.directory
         logger.debug("Fetching %s" % url)
-        resp = requests.get(url)
-        assert resp.status_code == 200
+        resp = self.fetch_cache.fetch(self.name, url)
+        if resp is None:
+            snapshot = YsoSnapshot.load(directory, self.fetch_cache.load(self.name).get('content_hash'))
+            if snapshot is not None:
+                logger.info("YSO has not changed since the last import, using the stored snapshot")
+                return snapshot
+            resp = self.http_client.get(url)
+            resp.raise_for_status()
+        content_hash = get_content_hash(resp.content)
+        snapshot = YsoSnapshot.load(directory, content_hash)
+        if snapshot is None:
+            with phase('parse'):
+                snapshot = YsoSnapshot.from_graph(self.load_graph_into_memory(resp))
+            if directory:
+                snapshot.save(directory, content_hash)
+        return snapshot
+
+    def load_graph_into_memory(self, resp):
         resp.encoding = 'UTF-8'
         graph = rdflib.Graph()
         logger.debug("Parsing RDF")
         graph.parse(data=resp.text, format='turtle')
         return graph
 
-    def save_keywords(self, graph):
+    def save_keywords(self, snapshot):
+        """
+        Sync the keywords and their alt labels with the snapshot. The existing keywords, labels
+        and alt label relations are loaded into memory and compared with the snapshot, so that
+        only the differences are written, in batches.
+        """
         logger.debug("Saving data")
-
-        bulk_mode = False
-        if bulk_mode:
-            assert not Keyword.objects.filter(data_source=self.data_source).exists()
-        if not bulk_mode:
-            queryset = KeywordLabel.objects.all()
-            label_syncher = ModelSyncher(
-                queryset, lambda obj: (obj.name, obj.language_id), delete_func=lambda obj: obj.delete())
-
-        keyword_labels = {}
-        labels_to_create = set()
-        for subject, label in graph.subject_objects(SKOS.altLabel):
-            if (subject, RDF.type, SKOS.Concept) in graph:
-                try:
-                    yid = get_yso_id(subject)
-                    if bulk_mode:
-                        if label.language is not None:
-                            language = label.language
-                            if label.language == 'se':
-                                # YSO doesn't contain se, assume an error.
-                                language = 'sv'
-                            labels_to_create.add((str(label), language))
-                            keyword_labels.setdefault(yid, []).append(label)
-                    else:
-                        label = self.save_alt_label(label_syncher, graph, label)
-                        if label:
-                            keyword_labels.setdefault(yid, []).append(label)
-                except ValidationError as e:
-                    logger.error(e)
-
-        if bulk_mode:
-            KeywordLabel.objects.bulk_create([
-                KeywordLabel(
-                    name=name,
-                    language_id=language
-                ) for name, language in labels_to_create])
-        else:
-            label_syncher.finish(force=self.options['force'])
-
-        if bulk_mode:
-            self.save_keywords_in_bulk(graph)
-            self.save_keyword_label_relationships_in_bulk(keyword_labels)
-
-        if not bulk_mode:
-            # manually add new keywords to deprecated ones
-            for old_id, new_id in YSO_DEPRECATED_MAPS.items():
-                try:
-                    old_keyword = Keyword.objects.get(id=old_id)
-                    new_keyword = Keyword.objects.get(id=new_id)
-                except ObjectDoesNotExist:
+        with phase('load_existing'):
+            keywords = {keyword.id: keyword for keyword in Keyword.objects.filter(data_source=self.data_source)}
+            label_ids = {(name, language_id): label_id for label_id, name, language_id
+                         in KeywordLabel.objects.values_list('id', 'name', 'language_id')}
+            alt_label_ids = {(keyword_id, label_id): row_id for row_id, keyword_id, label_id
+                             in KeywordAltLabels.objects.filter(keyword__data_source=self.data_source)
+                             .values_list('id', 'keyword_id', 'keywordlabel_id')}
+            language_ids = set(Language.objects.values_list('id', flat=True))
+
+        concepts = {yid: concept for yid, concept in snapshot.concepts.items() if not concept['deprecated']}
+        record('parsed', len(snapshot.concepts))
+        # deprecated concepts are parsed too, as deprecated keywords keep their alt labels
+        alt_labels = {}
+        for yid, concept in snapshot.concepts.items():
+            alt_labels[yid] = set()
+            for label, language in concept['alt_labels']:
+                if language is None:
+                    logger.error('Error: {} has no language'.format(label))
+                    continue
+                if language == 'se':
+                    # YSO doesn't contain se, assume an error.
+                    language = 'sv'
+                if language not in language_ids:
+                    logger.error('Error: {} has unknown language {}'.format(label, language))
                     continue
-                logger.info('Manually mapping events with %s to %s' % (str(old_keyword), str(new_keyword)))
-                new_keyword.events.add(*old_keyword.events.all())
-                new_keyword.audience_events.add(*old_keyword.audience_events.all())
-
-            queryset = Keyword.objects.filter(data_source=self.data_source, deprecated=False)
-            syncher = ModelSyncher(
-                queryset, lambda keyword: keyword.id,
-                delete_func=lambda obj: deprecate_and_replace(graph, obj),
-                check_deleted_func=lambda obj: obj.deprecated)
-            save_set = set()
-            for subject in graph.subjects(RDF.type, SKOS.Concept):
-                try:
-                    self.save_keyword(syncher, graph, subject, keyword_labels, save_set)
-                except ValidationError as e:
-                    logger.error(e)
-            syncher.finish(force=self.options['force'])
-
-    def save_keyword_label_relationships_in_bulk(self, keyword_labels):
-        yids = Keyword.objects.all().values_list('id', flat=True)
-        labels = KeywordLabel.objects.all().values('id', 'name', 'language')
-        label_id_from_name_and_language = {
-            (l['name'], l['language']): l['id'] for l in labels
-        }
-        KeywordAltLabels = Keyword.alt_labels.through
-        relations_to_create = []
-        for yid, url_labels in keyword_labels.items():
-            if yid not in yids:
+                alt_labels[yid].add((label, language))
+
+        with phase('sync_labels'):
+            # labels still used by keywords whose alt labels are not synced are kept, too
+            used_label_ids = set(label_id for keyword_id, label_id in alt_label_ids if keyword_id not in concepts)
+            label_ids = self.sync_labels(label_ids, set.union(set(), *alt_labels.values()), used_label_ids)
+
+        # manually add new keywords to deprecated ones
+        for old_id, new_id in YSO_DEPRECATED_MAPS.items():
+            try:
+                old_keyword = Keyword.objects.get(id=old_id)
+                new_keyword = Keyword.objects.get(id=new_id)
+            except ObjectDoesNotExist:
                 continue
-            for label in url_labels:
-                params = dict(
-                    keyword_id=yid,
-                    keywordlabel_id=(
-                        label_id_from_name_and_language.get(
-                            (str(label), label.language))))
-                if params['keyword_id'] and params['keywordlabel_id']:
-                    relations_to_create.append(
-                        KeywordAltLabels(**params))
-        KeywordAltLabels.objects.bulk_create(relations_to_create)
-
-    def create_keyword(self, graph, subject):
-        if is_deprecated(graph, subject):
-            return
-        keyword = Keyword(data_source=self.data_source)
-        keyword._created = True
-        keyword.id = get_yso_id(subject)
+            logger.info('Manually mapping events with %s to %s' % (str(old_keyword), str(new_keyword)))
+            new_keyword.events.add(*old_keyword.events.all())
+            new_keyword.audience_events.add(*old_keyword.audience_events.all())
+
+        with phase('sync_keywords'):
+            self.sync_keywords(snapshot, concepts, keywords)
+
+        with phase('sync_alt_labels'):
+            # deprecated keywords keep their alt labels
+            wanted = set((yid, label_ids[label]) for yid, labels in alt_labels.items() if yid in concepts
+                         for label in labels)
+            self.sync_alt_labels(alt_label_ids, wanted, set(concepts))
+
+    def sync_labels(self, label_ids, wanted, used_label_ids=()):
+        """
+        Create and delete labels, return the ids of all the wanted labels by (name, language).
+        Labels in used_label_ids are not deleted even if they are not wanted.
+        """
+        deleted_ids = [label_id for label, label_id in label_ids.items()
+                       if label not in wanted and label_id not in used_label_ids]
+        check_delete_count(len(deleted_ids), len(label_ids), self.options['force'])
+        for start in range(0, len(deleted_ids), BATCH_SIZE):
+            KeywordLabel.objects.filter(id__in=deleted_ids[start:start + BATCH_SIZE]).delete()
+
+        new_labels = [KeywordLabel(name=name, language_id=language_id)
+                      for name, language_id in wanted if (name, language_id) not in label_ids]
+        KeywordLabel.objects.bulk_create(new_labels, batch_size=BATCH_SIZE, ignore_conflicts=True)
+        logger.info("%d labels created, %d deleted" % (len(new_labels), len(deleted_ids)))
+        if new_labels:
+            # the ids of the labels are not returned when ignoring conflicts
+            label_ids = {(name, language_id): label_id for label_id, name, language_id
+                         in KeywordLabel.objects.values_list('id', 'name', 'language_id')}
+        return label_ids
+
+    def sync_keywords(self, snapshot, concepts, keywords):
+        """Create, update and deprecate keywords"""
+        syncher = ModelSyncher(
+            [keyword for keyword in keywords.values() if not keyword.deprecated], lambda keyword: keyword.id,
+            delete_func=lambda obj: deprecate_and_replace(snapshot, obj),
+            check_deleted_func=lambda obj: obj.deprecated)
+        new_keywords = []
+        changed_keywords = []
+        for yid, concept in concepts.items():
+            keyword = keywords.get(yid)
+            if keyword is None:
+                new_keywords.append(self.create_keyword(yid, concept))
+                continue
+            if keyword.deprecated:
+                # keywords deprecated by the importer or manually stay deprecated
+                continue
+            self.update_keyword(keyword, concept)
+            if keyword.publisher_id != self.organization.id:
+                keyword.publisher = self.organization
+                keyword.last_modified_time = BaseModel.now()
+                keyword._changed = True
+            if keyword._changed:
+                changed_keywords.append(keyword)
+            syncher.mark(keyword)
+
+        Keyword.objects.bulk_create(new_keywords, batch_size=BATCH_SIZE, ignore_conflicts=True)
+        # the untranslated column is saved with the translations, like in a full save
+        name_fields = ['name'] + [field.name for field in translator.get_options_for_model(Keyword).fields['name']]
+        Keyword.objects.bulk_update(changed_keywords, name_fields + ['publisher', 'last_modified_time'],
+                                    batch_size=BATCH_SIZE)
+        logger.info("%d keywords created, %d updated" % (len(new_keywords), len(changed_keywords)))
+        syncher.finish(force=self.options['force'])
+
+    def sync_alt_labels(self, alt_label_ids, wanted, keyword_ids):
+        """Create and delete the alt label relations of the given keywords"""
+        deleted_ids = [row_id for (keyword_id, label_id), row_id in alt_label_ids.items()
+                       if keyword_id in keyword_ids and (keyword_id, label_id) not in wanted]
+        for start in range(0, len(deleted_ids), BATCH_SIZE):
+            KeywordAltLabels.objects.filter(id__in=deleted_ids[start:start + BATCH_SIZE]).delete()
+        new_rows = [KeywordAltLabels(keyword_id=keyword_id, keywordlabel_id=label_id)
+                    for keyword_id, label_id in wanted if (keyword_id, label_id) not in alt_label_ids]
+        KeywordAltLabels.objects.bulk_create(new_rows, batch_size=BATCH_SIZE, ignore_conflicts=True)
+        logger.info("%d alt labels added, %d removed" % (len(new_rows), len(deleted_ids)))
+
+    def create_keyword(self, yid, concept):
+        keyword = Keyword(data_source=self.data_source, publisher=self.organization)
+        keyword.id = yid
         keyword.created_time = BaseModel.now()
-        keyword.aggregate = is_aggregate_concept(graph, subject)
-        self.update_keyword(keyword, graph, subject)
+        keyword.aggregate = concept['aggregate']
+        self.update_keyword(keyword, concept)
         return keyword
 
-    def update_keyword(self, keyword, graph, subject):
-        for _, literal in graph.preferredLabel(subject):
-            with active_language(literal.language):
-                if keyword.name != str(literal):
-                    logger.debug('(re)naming keyword ' + keyword.name + ' to ' + str(literal))
-                    keyword.name = str(literal)
+    def update_keyword(self, keyword, concept):
+        for language, label in concept['labels']:
+            with active_language(language):
+                if keyword.name != label:
+                    logger.debug('(re)naming keyword ' + keyword.name + ' to ' + label)
+                    keyword.name = label
                     keyword._changed = True
                     keyword.last_modified_time = BaseModel.now()
-
-    def save_keywords_in_bulk(self, graph):
-        keywords = []
-        for subject in graph.subjects(RDF.type, SKOS.Concept):
-            keyword = self.create_keyword(graph, subject)
-            if keyword:
-                keywords.append(keyword)
-        Keyword.objects.bulk_create(keywords, batch_size=1000)
-
-    def save_alt_label(self, syncher, graph, label):
-        label_text = str(label)
-        if label.language is None:
-            logger.error('Error: {} has no language'.format(label))
-            return None
-        label_object = syncher.get((label_text, str(label.language)))
-        if label_object is None:
-            language = Language.objects.get(id=label.language)
-            label_object = KeywordLabel(
-                name=label_text, language=language)
-            label_object._changed = True
-            label_object._created = True
-        else:
-            label_object._created = False
-        if label_object._created:
-            # Since there are duplicates, only save & mark them once.
-            label_object.save()
-
-        if not getattr(label_object, '_found', False):
-            syncher.mark(label_object)
-        return label_object
-
-    def save_keyword(self, syncher, graph, subject, keyword_labels, save_set):
-        if is_deprecated(graph, subject):
-            return
-        keyword = syncher.get(get_yso_id(subject))
-        if not keyword:
-            keyword = self.create_keyword(graph, subject)
-            if not keyword:
-                return
-        else:
-            keyword._created = False
-            self.update_keyword(keyword, graph, subject)
-
-        if keyword.publisher_id != self.organization.id:
-            keyword.publisher = self.organization
-            keyword._changed = True
-        if keyword._changed:
-            keyword.save()
-
-        alt_labels = keyword_labels.get(get_yso_id(subject), [])
-        keyword.alt_labels.add(*alt_labels)
-
-        if not getattr(keyword, '_found', False):
-            syncher.mark(keyword)
-        return keyword
@@ -1,11 +1,27 @@
 import re
+from bisect import bisect_left
 from events.models import Keyword, KeywordLabel, DataSource
 from difflib import get_close_matches
 
 ENDING_PARENTHESIS_PATTERN = r' \([^)]+\)$'
+WORD_SPLIT_PATTERN = re.compile(r'\s+')
+
+# search words that are matched as other words
+SYNONYMS = {
+    'kokous': 'kokoukset',
+    'kuntoilu': 'kuntoliikunta',
+    'samba': 'sambat',
+}
 
 
 class KeywordMatcher(object):
+    """
+    Match search words to keywords by their Finnish names and alt labels.
+
+    The lowercased labels are kept in a dict for exact lookups and in a sorted list, so that
+    the labels starting with a prefix are found by bisection. Matches and keywords are cached,
+    as importers match the same words over and over again.
+    """
     def __init__(self):
         label_to_keyword_ids = {}
         self.name_to_keyword_ids = {}
@@ -15,6 +31,8 @@ class KeywordMatcher(object):
         for label_id, name in KeywordLabel.objects.filter(language_id='fi').values_list(
                 'id', 'name'):
             self.name_to_keyword_ids[name.lower()] = label_to_keyword_ids.get(label_id, set())
+        self._keywords = {}
+        self._matches = {}
         try:
             yso_source = DataSource.objects.get(pk='yso')
             self.skip = False
@@ -30,65 +48,55 @@ class KeywordMatcher(object):
                 without_parenthesis = re.sub(ENDING_PARENTHESIS_PATTERN, '', text)
                 if without_parenthesis != text:
                     self.name_to_keyword_ids.setdefault(without_parenthesis, set()).add(kid)
-        self.labels = self.name_to_keyword_ids.keys()
+        self.labels = sorted(self.name_to_keyword_ids)
         print('Initialized', len(self.labels), 'keyword keys')
 
-    def match(self, text):
-        if self.skip:
-            return None
-        wordsplit = re.compile(r'\s+')
-        # labels = KeywordLabel.objects
-        # match = labels.filter(name__iexact=text)
-
-        text = text.lower()
-        if text == 'kokous':
-            text = 'kokoukset'
-        elif text == 'kuntoilu':
-            text = 'kuntoliikunta'
-        elif text == 'samba':
-            text = 'sambat'
-
+    def _labels_starting_with(self, prefix):
         labels = self.labels
-        matches = [l for l in labels if l.lower() == text]
+        matches = []
+        for i in range(bisect_left(labels, prefix), len(labels)):
+            if not labels[i].startswith(prefix):
+                break
+            matches.append(labels[i])
+        return matches
+
+    def _find_labels(self, text):
+        """Return the labels matching text and the type of the match"""
+        if text in self.name_to_keyword_ids:
+            return [text], 'exact'
+        words = WORD_SPLIT_PATTERN.split(text)
+        if len(words) > 1:
+            matches = [word for word in words if word in self.name_to_keyword_ids]
+            if matches:
+                return matches, 'subword'
+        matches = self._labels_starting_with(text)
         if matches:
-            match_type = 'exact'
-        if not matches:
-            words = wordsplit.split(text)
-            if len(words) > 1:
-                for word in words:
-                    matches.extend([l for l in labels if l.lower() == word])
-                    match_type = 'subword'  # Later attempts will override, if this wasn't a match
-        if not matches:
-            matches = [l for l in labels if l.lower().startswith(text)]
-            match_type = 'prefix'
-        if not matches:
-            matches = [l for l in labels if l.lower() == text + 't']
-            match_type = 'simple-plural'
-        if not matches:
-            matches = [l for l in labels if l.lower().startswith(text[0:-2])]
-            match_type = 'cut-two-letters'
-        if not matches:
-            if len(text) > 10:
-                matches = [l for l in labels if l.lower().startswith(text[0:-5])]
-                match_type = 'prefix'
-        if not matches:
-            for i in range(1, 10):
-                matches = [l for l in labels if l.lower() == text[i:]]
-                if matches:
-                    match_type = 'suffix'
-                    break
+            return matches, 'prefix'
+        if text + 't' in self.name_to_keyword_ids:
+            return [text + 't'], 'simple-plural'
+        matches = self._labels_starting_with(text[0:-2])
+        if matches:
+            return matches, 'cut-two-letters'
+        if len(text) > 10:
+            matches = self._labels_starting_with(text[0:-5])
+            if matches:
+                return matches, 'prefix'
+        for i in range(1, 10):
+            if text[i:] in self.name_to_keyword_ids:
+                return [text[i:]], 'suffix'
+        return [], None
 
+    def _match_keyword_ids(self, text):
+        matches, match_type = self._find_labels(text)
         if not matches:
             print('no match', text)
             return None
 
         keyword_ids = set()
         if match_type not in ['exact', 'subword']:
-            cmatch = get_close_matches(
-                text, [m.lower() for m in matches], n=1)
+            cmatch = get_close_matches(text, matches, n=1)
             if len(cmatch) == 1:
                 keyword_ids = self.name_to_keyword_ids.get(cmatch[0])
-
         else:
             for m in matches:
                 keyword_ids.update(self.name_to_keyword_ids[m])
@@ -96,17 +104,54 @@ class KeywordMatcher(object):
         if len(keyword_ids) < 1:
             print('no matches for', text)
             return None
+        return keyword_ids
 
-        objects = Keyword.objects.filter(id__in=keyword_ids, deprecated=False)
+    def _load_keywords(self, keyword_ids):
+        missing_ids = set(keyword_ids) - set(self._keywords)
+        if missing_ids:
+            for keyword in Keyword.objects.filter(id__in=missing_ids):
+                self._keywords[keyword.id] = keyword
+            for keyword_id in missing_ids:
+                self._keywords.setdefault(keyword_id, None)
+
+    def _get_keywords(self, keyword_ids):
+        objects = sorted((self._keywords[keyword_id] for keyword_id in keyword_ids
+                          if self._keywords[keyword_id] and not self._keywords[keyword_id].deprecated),
+                         key=lambda keyword: keyword.id)
         if len(keyword_ids) > 1:
-            try:
-                aggregate_keyword = objects.get(aggregate=True)
-                aggregate_name = re.sub(ENDING_PARENTHESIS_PATTERN, '', aggregate_keyword.name_fi)
+            aggregate_keywords = [o for o in objects if o.aggregate]
+            if len(aggregate_keywords) > 1:
+                raise Keyword.MultipleObjectsReturned('Keywords %s are all aggregates' % aggregate_keywords)
+            if aggregate_keywords:
+                aggregate_keyword = aggregate_keywords[0]
+                aggregate_name = re.sub(ENDING_PARENTHESIS_PATTERN, '', aggregate_keyword.name_fi).upper()
                 result = [aggregate_keyword]
-                for o in objects.exclude(name_fi__istartswith=aggregate_name):
-                    result.append(o)
+                for o in objects:
+                    if o.name_fi is None or not o.name_fi.upper().startswith(aggregate_name):
+                        result.append(o)
                 return result
-            except Keyword.DoesNotExist:
-                pass
-            return objects
         return objects
+
+    def _normalize(self, text):
+        text = text.lower()
+        return SYNONYMS.get(text, text)
+
+    def match(self, text):
+        """Return the keywords matching text, or None if there are none"""
+        if self.skip:
+            return None
+        return self.match_many([text])[text]
+
+    def match_many(self, texts):
+        """Return a dict of the keywords matching each of texts, loading all the keywords at once"""
+        if self.skip:
+            return {text: None for text in texts}
+        normalized = {text: self._normalize(text) for text in texts}
+        for text in set(normalized.values()) - set(self._matches):
+            self._matches[text] = self._match_keyword_ids(text)
+        self._load_keywords(set().union(*(self._matches[text] or () for text in normalized.values())))
+        results = {}
+        for text, normalized_text in normalized.items():
+            keyword_ids = self._matches[normalized_text]
+            results[text] = self._get_keywords(keyword_ids) if keyword_ids else None
+        return results
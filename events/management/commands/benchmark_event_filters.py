@@ -0,0 +1,87 @@
+import operator
+import re
+from functools import reduce
+
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand, CommandError
+from django.db.models import Count, Q
+from django_orghierarchy.models import Organization
+
+from events.models import Event, PublicationStatus
+
+EXECUTION_TIME_PATTERN = re.compile(r'Execution Time: ([\d.]+) ms', re.IGNORECASE)
+SUBQUERY_NODES = ('SubPlan', 'InitPlan')
+
+
+def get_subquery_editable_filter(user):
+    """The editable event filter as it was before the organization ids were inlined"""
+    admin_orgs = []
+    for admin_org in user.admin_organizations.all():
+        admin_orgs.append(admin_org.get_descendants(include_self=True))
+        if admin_org.replaced_by:
+            admin_orgs.append(admin_org.replaced_by.get_descendants(include_self=True))
+    admin_orgs = reduce(operator.or_, admin_orgs).distinct() if admin_orgs else Organization.objects.none()
+    member_orgs = user.organization_memberships.all()
+    return Q(publisher__in=admin_orgs) | Q(publication_status=PublicationStatus.DRAFT, publisher__in=member_orgs)
+
+
+class Command(BaseCommand):
+    help = "Benchmark the editable event listings of admin users in the current database with EXPLAIN ANALYZE"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', action='append', dest='usernames',
+                            help='Username of a user to benchmark, may be given multiple times')
+        parser.add_argument('--count', type=int, default=5,
+                            help='Number of users with the most admin organizations benchmarked by default')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Number of times each query is run, the best time is reported')
+
+    def get_users(self, usernames, count):
+        users = get_user_model().objects.annotate(n_admin_orgs=Count('admin_organizations'))
+        if usernames:
+            users = users.filter(username__in=usernames)
+        else:
+            users = users.filter(n_admin_orgs__gt=0).order_by('-n_admin_orgs')[:count]
+        return list(users)
+
+    def explain(self, queryset, repeat):
+        """Return the best execution time of the queryset in milliseconds and its query plan"""
+        times = []
+        for i in range(repeat):
+            plan = queryset.explain(analyze=True)
+            match = EXECUTION_TIME_PATTERN.search(plan)
+            if not match:
+                raise CommandError('No execution time in the query plan:\n%s' % plan)
+            times.append(float(match.group(1)))
+        return min(times), plan
+
+    def handle(self, usernames=None, count=5, repeat=5, **options):
+        users = self.get_users(usernames, count)
+        if not users:
+            raise CommandError('No admin users found')
+        public_filter = Q(publication_status=PublicationStatus.PUBLIC)
+
+        self.stdout.write('%-30s %-10s %8s %12s %12s %10s' % (
+            'user', 'listing', 'orgs', 'subquery ms', 'inlined ms', 'events'))
+        for user in users:
+            context = user.get_permission_context()
+            inlined_filter = user.get_editable_events_filter() or Q(pk__in=[])
+            subquery_filter = get_subquery_editable_filter(user)
+            listings = (
+                ('show_all', public_filter | subquery_filter, public_filter | inlined_filter),
+                ('admin_user', subquery_filter, inlined_filter),
+            )
+            for listing, old_filter, new_filter in listings:
+                old_queryset = Event.objects.filter(old_filter)
+                new_queryset = Event.objects.filter(new_filter)
+                old_time, old_plan = self.explain(old_queryset, repeat)
+                new_time, new_plan = self.explain(new_queryset, repeat)
+                n_events = new_queryset.count()
+                if old_queryset.count() != n_events:
+                    self.stderr.write('%s %s: the inlined filter returns different events' % (user, listing))
+                if any(node in new_plan for node in SUBQUERY_NODES):
+                    self.stderr.write('%s %s: the inlined filter is planned with subqueries:\n%s' % (
+                        user, listing, new_plan))
+                self.stdout.write('%-30s %-10s %8d %12.1f %12.1f %10d' % (
+                    user.username, listing, len(context.admin_org_ids | context.member_org_ids),
+                    old_time, new_time, n_events))
@@ -0,0 +1,57 @@
+import io
+import json
+import timeit
+
+from django.core.management import BaseCommand
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from events.parsers import CamelCaseJSONParser, rename_fields
+
+# a typical event in a bulk POST
+SAMPLE_EVENT = {
+    'name': {'fi': 'Tapahtuma', 'sv': 'Evenemang', 'en': 'Event'},
+    'shortDescription': {'fi': 'Lyhyt kuvaus ' * 5, 'en': 'Short description ' * 5},
+    'description': {'fi': '<p>%s</p>' % ('Kuvaus ' * 100), 'en': '<p>%s</p>' % ('Description ' * 100)},
+    'startTime': '2021-01-01T12:00:00Z',
+    'endTime': '2021-01-01T14:00:00Z',
+    'location': {'@id': 'https://api.hel.fi/linkedevents/v1/place/tprek:15417/'},
+    'keywords': [{'@id': 'https://api.hel.fi/linkedevents/v1/keyword/yso:p%d/' % i} for i in range(5)],
+    'audience': [],
+    'inLanguage': [{'@id': 'https://api.hel.fi/linkedevents/v1/language/fi/'}],
+    'offers': [{'isFree': False, 'price': {'fi': '5 €'}, 'infoUrl': {'fi': 'https://example.com/'},
+                'description': None}],
+    'externalLinks': [{'name': 'extlink_facebook', 'link': 'https://example.com/', 'language': 'fi'}],
+    'publicationStatus': 'public',
+    'superEventType': None,
+    'customData': {'ticketType': 'free', 'organizerId': '1'},
+}
+
+
+class Command(BaseCommand):
+    help = "Benchmark parsing a bulk POST of camelCase events"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=float, default=5,
+                            help='Size of the payload in megabytes')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Number of times the payload is parsed, the best time is reported')
+
+    def handle(self, size=5, repeat=5, **options):
+        event_size = len(json.dumps(SAMPLE_EVENT))
+        payload = json.dumps([SAMPLE_EVENT] * int(size * 1000000 / event_size)).encode('utf-8')
+        parser = CamelCaseJSONParser()
+        parser_context = {'request': Request(APIRequestFactory().post('/v1/event/'))}
+
+        def parse():
+            return parser.parse(io.BytesIO(payload), parser_context=parser_context)
+
+        def parse_and_rename():
+            return rename_fields(json.loads(payload.decode('utf-8')))
+
+        if parse() != parse_and_rename():
+            self.stderr.write('The parsed data differs from renaming the fields after decoding')
+        self.stdout.write('payload: %d bytes' % len(payload))
+        for name, func in (('json.loads + rename_fields', parse_and_rename), ('CamelCaseJSONParser', parse)):
+            best = min(timeit.repeat(func, number=1, repeat=repeat))
+            self.stdout.write('%-30s %10.1f ms' % (name, best * 1000))
@@ -0,0 +1,60 @@
+import gzip
+import timeit
+
+import brotli
+from django.core.management import BaseCommand, CommandError
+from rest_framework import renderers
+from rest_framework.test import APIRequestFactory
+
+from events.api import EventViewSet
+from events.middleware import BROTLI_QUALITY
+from events.renderers import JSONRenderer
+
+DEFAULT_QUERIES = (
+    'page_size=20',
+    'page_size=100',
+    'page_size=100&include=location,keywords',
+)
+
+
+class Command(BaseCommand):
+    help = "Benchmark rendering and compressing typical event list pages from the current database"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--query', action='append', dest='queries',
+                            help='Query string of an event list page, may be given multiple times')
+        parser.add_argument('--repeat', type=int, default=10,
+                            help='Number of times each page is rendered, the best time is reported')
+        parser.add_argument('--host', default='localhost',
+                            help='Host name used in the generated urls, must be in ALLOWED_HOSTS')
+
+    def time(self, func, repeat):
+        return min(timeit.repeat(func, number=1, repeat=repeat)) * 1000
+
+    def handle(self, queries=None, repeat=10, host='localhost', **options):
+        view = EventViewSet.as_view({'get': 'list'})
+        factory = APIRequestFactory()
+        drf_renderer = renderers.JSONRenderer()
+        renderer = JSONRenderer()
+
+        self.stdout.write('%-45s %10s %10s %10s %10s %10s %10s' % (
+            'query', 'drf ms', 'orjson ms', 'bytes', 'gzip', 'br', 'br ms'))
+        for query in queries or DEFAULT_QUERIES:
+            request = factory.get('/v1/event/?%s' % query, SERVER_NAME=host)
+            response = view(request, version='v1')
+            if response.status_code != 200:
+                raise CommandError('%s returned status %s' % (query, response.status_code))
+            data = response.data
+
+            content = renderer.render(data)
+            if content != drf_renderer.render(data):
+                self.stderr.write('%s: output differs from the DRF renderer' % query)
+            self.stdout.write('%-45s %10.1f %10.1f %10d %10d %10d %10.1f' % (
+                query,
+                self.time(lambda: drf_renderer.render(data), repeat),
+                self.time(lambda: renderer.render(data), repeat),
+                len(content),
+                len(gzip.compress(content, compresslevel=6)),
+                len(brotli.compress(content, quality=BROTLI_QUALITY)),
+                self.time(lambda: brotli.compress(content, quality=BROTLI_QUALITY), repeat),
+            ))
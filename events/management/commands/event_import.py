@@ -1,3 +1,4 @@
+import json
 import os
 from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
@@ -29,6 +30,18 @@ class Command(BaseCommand):
                             help='Remap all deleted entities to new ones')
         parser.add_argument('--force', action='store_true', dest='force',
                             help='Allow deleting any number of entities if necessary')
+        parser.add_argument('--record', action='store', dest='record', metavar='DIR',
+                            help='Save all fetched responses to a directory')
+        parser.add_argument('--replay', action='store', dest='replay', metavar='DIR',
+                            help='Read responses from a directory saved with --record instead of fetching them')
+        parser.add_argument('--workers', action='store', dest='workers', type=int, metavar='N',
+                            help='Number of languages and pages fetched concurrently')
+        parser.add_argument('--profile', action='store', dest='profile', metavar='DIR',
+                            help='Write cProfile stats of each import phase to a directory')
+        parser.add_argument('--fetch-cache', action='store', dest='fetch_cache', metavar='DIR',
+                            default=getattr(settings, 'IMPORTER_FETCH_CACHE_DIR', None),
+                            help='Skip sources and records that have not changed since the last import, '
+                                 'storing their state in a directory')
 
         for imp in self.importer_types:
             parser.add_argument('--%s' % imp, dest=imp, action='store_true', help='import %s' % imp)
@@ -48,7 +61,12 @@ class Command(BaseCommand):
                               'cached': options['cached'],
                               'single': options['single'],
                               'remap': options['remap'],
-                              'force': options['force']})
+                              'force': options['force'],
+                              'record': options['record'],
+                              'replay': options['replay'],
+                              'fetch_cache': options['fetch_cache'],
+                              'workers': options['workers'],
+                              'profile': options['profile']})
 
         # Activate the default language for the duration of the import
         # to make sure translated fields are populated correctly.
@@ -68,6 +86,12 @@ class Command(BaseCommand):
                     continue
 
             if method:
-                method()
+                with importer.metrics.phase(imp_type):
+                    method()
 
+        importer.http_client.close()
         activate(old_lang)
+
+        metrics = importer.metrics.finish()
+        if options['verbosity'] >= 1:
+            self.stdout.write(json.dumps(metrics, indent=2))
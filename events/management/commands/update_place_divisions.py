@@ -0,0 +1,25 @@
+from django.core.management import BaseCommand
+
+from events.models import Place
+from events.sql import update_place_divisions
+
+
+class Command(BaseCommand):
+    help = "Update the administrative divisions of places based on their position"
+
+    def add_arguments(self, parser):
+        parser.add_argument('place_ids', nargs='*', help='Update only the given places')
+        parser.add_argument('--data-source',
+                            dest='data_source',
+                            help='Update only the places of the given data source')
+
+    def handle(self, place_ids=(), data_source=None, **kwargs):
+        if data_source:
+            place_ids = list(place_ids) + list(
+                Place.objects.filter(data_source=data_source).values_list('id', flat=True))
+            if not place_ids:
+                print("No places found for data source %s." % data_source)
+                return
+        n_divisions = update_place_divisions(place_ids, all=not place_ids)
+        print("Updated divisions of %s places." % (len(set(place_ids)) if place_ids else 'all'))
+        print("A total of %s place divisions set." % n_divisions)
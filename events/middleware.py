@@ -0,0 +1,94 @@
+import re
+
+import brotli
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.text import compress_sequence, compress_string
+
+# Brotli at its highest qualities is too slow for dynamic content
+BROTLI_QUALITY = 5
+
+# Images and documents are compressed already
+re_compressible_content_type = re.compile(r'^(text/|application/(json|ld\+json|x-ndjson|javascript|xml))')
+
+
+def get_accepted_encoding(accept_encoding):
+    """
+    Return the preferred encoding of br and gzip in the Accept-Encoding header, or None.
+    """
+    qualities = {}
+    for item in accept_encoding.split(','):
+        encoding, _, params = item.strip().partition(';')
+        quality = 1.0
+        match = re.search(r'q=([0-9.]+)', params)
+        if match:
+            try:
+                quality = float(match.group(1))
+            except ValueError:
+                quality = 0.0
+        qualities[encoding.strip().lower()] = quality
+    wildcard = qualities.get('*', 0.0)
+    # br is preferred over gzip if both are equally acceptable
+    best = max(('br', 'gzip'), key=lambda encoding: qualities.get(encoding, wildcard))
+    if qualities.get(best, wildcard) <= 0:
+        return None
+    return best
+
+
+def brotli_compress_sequence(sequence):
+    compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+    for item in sequence:
+        data = compressor.process(item)
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Compress textual responses with brotli or gzip, as negotiated with Accept-Encoding.
+    Like GZipMiddleware, but adds brotli and skips responses below a size threshold and
+    responses that are compressed already.
+    """
+    def process_response(self, request, response):
+        # It's not worth attempting to compress short responses.
+        min_size = getattr(settings, 'RESPONSE_COMPRESSION_MIN_SIZE', 1024)
+        if not response.streaming and len(response.content) < min_size:
+            return response
+
+        if response.has_header('Content-Encoding') or \
+                not re_compressible_content_type.match(response.get('Content-Type', '')):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        encoding = get_accepted_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            # We won't know the compressed size until we stream it.
+            if encoding == 'br':
+                response.streaming_content = brotli_compress_sequence(response.streaming_content)
+            else:
+                response.streaming_content = compress_sequence(response.streaming_content)
+            del response['Content-Length']
+        else:
+            if encoding == 'br':
+                compressed_content = brotli.compress(response.content, quality=BROTLI_QUALITY)
+            else:
+                compressed_content = compress_string(response.content)
+            # Return the compressed content only if it's actually shorter.
+            if len(compressed_content) >= len(response.content):
+                return response
+            response.content = compressed_content
+            response['Content-Length'] = str(len(response.content))
+
+        # A strong ETag is made weak, as the compressed content differs from the original
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoding
+
+        return response
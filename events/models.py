@@ -26,6 +26,7 @@ from django.conf import settings
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.gis.db import models
+from django.contrib.gis.geos import GEOSGeometry
 from django.contrib.postgres.fields import HStoreField
 from django.contrib.sites.models import Site
 from django.core.mail import send_mail
@@ -42,6 +43,7 @@ from rest_framework.exceptions import ValidationError
 from reversion import revisions as reversion
 
 from events import translation_utils
+from events.sql import count_events_for_keywords, replace_keyword_in_relations, update_place_divisions
 from notifications.models import (NotificationTemplateException,
                                   NotificationType,
                                   render_notification_template)
@@ -138,6 +140,65 @@ class ReplacedByMixin():
         return replacement
 
 
+class DirtyFieldsMixin(object):
+    """
+    Keeps a snapshot of the tracked field values as they were loaded from the database,
+    so that save() can find out what changed without reloading the object.
+
+    tracked_fields contains field attnames, e.g. 'location_id' for foreign keys.
+    """
+    tracked_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.snapshot_tracked_fields()
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using=using, fields=fields)
+        self.snapshot_tracked_fields(fields)
+
+    def snapshot_tracked_fields(self, fields=None):
+        """Store the current values of the given (or all) tracked fields as the database values."""
+        loaded_values = self.__dict__.setdefault('_loaded_values', {})
+        deferred_fields = self.get_deferred_fields()
+        for attname in self.tracked_fields:
+            if attname in deferred_fields:
+                continue
+            if fields is not None and attname not in fields and self._meta.get_field(attname).name not in fields:
+                continue
+            value = getattr(self, attname)
+            # geometries are mutable, so they need to be copied
+            loaded_values[attname] = value.clone() if isinstance(value, GEOSGeometry) else value
+
+    def get_loaded_values(self):
+        """
+        Return the tracked field values as they are in the database. Values that were not
+        loaded with the object are fetched with a single query, as are all the values of objects
+        created in memory with the id of an existing row. Objects that are not in the database
+        have no values.
+        """
+        if self._state.adding:
+            if self.pk is None:
+                return {}
+            loaded_values = {}
+        else:
+            loaded_values = self.__dict__.get('_loaded_values', {})
+        missing = [attname for attname in self.tracked_fields if attname not in loaded_values]
+        if missing:
+            db_values = type(self)._base_manager.filter(pk=self.pk).values(*missing).first()
+            if db_values is None:
+                return {}
+            loaded_values = dict(loaded_values, **db_values)
+        return loaded_values
+
+    @staticmethod
+    def fields_in_update(update_fields, *field_names):
+        """Check whether a save with the given update_fields may change any of the given fields."""
+        return update_fields is None or bool(set(update_fields) & set(field_names))
+
+
 class License(models.Model):
     id = models.CharField(max_length=50, primary_key=True)
     name = models.CharField(verbose_name=_('Name'), max_length=255)
@@ -291,7 +352,7 @@ class UpcomingEventsUpdater(models.Manager):
         qs.exclude(events__end_time__gte=now).update(has_upcoming_events=False)
 
 
-class Keyword(BaseModel, ImageMixin, ReplacedByMixin):
+class Keyword(DirtyFieldsMixin, BaseModel, ImageMixin, ReplacedByMixin):
     publisher = models.ForeignKey(
         'django_orghierarchy.Organization', on_delete=models.CASCADE, verbose_name=_('Publisher'),
         db_index=True, null=True, blank=True,
@@ -315,6 +376,8 @@ class Keyword(BaseModel, ImageMixin, ReplacedByMixin):
 
     objects = UpcomingEventsUpdater()
 
+    tracked_fields = ('replaced_by_id',)
+
     def __str__(self):
         return self.name
 
@@ -336,42 +399,40 @@ class Keyword(BaseModel, ImageMixin, ReplacedByMixin):
 
     @transaction.atomic
     def save(self, *args, **kwargs):
-        if self._has_circular_replacement():
+        update_fields = kwargs.get('update_fields')
+        replacement_may_change = self.fields_in_update(update_fields, 'replaced_by', 'replaced_by_id')
+
+        if replacement_may_change and self._has_circular_replacement():
             raise ValidationError(_("Trying to replace this keyword with a keyword that is replaced by this keyword. "
                                     "Please refrain from creating circular replacements and"
                                     "remove one of the replacements."))
 
-        if self.replaced_by and not self.deprecated:
+        if self.replaced_by_id and not self.deprecated:
             self.deprecated = True
             logger.warning("Keyword replaced without deprecating. Deprecating automatically", extra={'keyword': self})
 
-        old_replaced_by = None
-        if self.id:
-            try:
-                old_replaced_by = Keyword.objects.get(id=self.id).replaced_by
-            except Keyword.DoesNotExist:
-                pass
+        if not replacement_may_change:
+            # e.g. n_events or deprecated updates cannot change the replacement
+            super().save(*args, **kwargs)
+            self.snapshot_tracked_fields(update_fields)
+            return
 
-        super().save(*args, **kwargs)
+        old_replaced_by_id = self.get_loaded_values().get('replaced_by_id')
 
-        if not old_replaced_by == self.replaced_by:
-            # Remap keyword sets
-            qs = KeywordSet.objects.filter(keywords__id__exact=self.id)
-            for kw_set in qs:
-                kw_set.keywords.remove(self)
-                kw_set.keywords.add(self.replaced_by)
-                kw_set.save()
-
-            # Remap events
-            qs = Event.objects.filter(keywords__id__exact=self.id) \
-                | Event.objects.filter(audience__id__exact=self.id)
-            for event in qs:
-                if self in event.keywords.all():
-                    event.keywords.remove(self)
-                    event.keywords.add(self.replaced_by)
-                if self in event.audience.all():
-                    event.audience.remove(self)
-                    event.audience.add(self.replaced_by)
+        super().save(*args, **kwargs)
+        self.snapshot_tracked_fields()
+
+        if self.replaced_by_id and not old_replaced_by_id == self.replaced_by_id:
+            # Remap keyword sets and events. The through tables are updated directly, so the
+            # m2m_changed handlers do not run and the event numbers are updated here instead.
+            remapped = replace_keyword_in_relations(self.id, self.replaced_by_id)
+            KeywordSet.objects.filter(id__in=remapped['events_keywordset_keywords']).update(
+                last_modified_time=BaseModel.now())
+            n_events = count_events_for_keywords([self.replaced_by_id]).get(self.replaced_by_id, 0)
+            Keyword.objects.filter(id=self.replaced_by_id).update(n_events=n_events, n_events_changed=False)
+            Keyword.objects.filter(id=self.id).update(n_events=0, n_events_changed=False)
+            self.n_events = 0
+            self.n_events_changed = False
 
     def can_be_edited_by(self, user):
         """Check if current place can be edited by the given user"""
@@ -410,7 +471,7 @@ class KeywordSet(BaseModel, ImageMixin):
         super().save(*args, **kwargs)
 
 
-class Place(MPTTModel, BaseModel, SchemalessFieldMixin, ImageMixin, ReplacedByMixin):
+class Place(DirtyFieldsMixin, MPTTModel, BaseModel, SchemalessFieldMixin, ImageMixin, ReplacedByMixin):
     objects = BaseTreeQuerySet.as_manager()
     upcoming_events = UpcomingEventsUpdater()
 
@@ -451,6 +512,9 @@ class Place(MPTTModel, BaseModel, SchemalessFieldMixin, ImageMixin, ReplacedByMi
     )
     n_events_changed = models.BooleanField(default=False, db_index=True)
 
+    # needed to remap events and to update divisions
+    tracked_fields = ('replaced_by_id', 'position')
+
     class Meta:
         verbose_name = _('place')
         verbose_name_plural = _('places')
@@ -463,40 +527,45 @@ class Place(MPTTModel, BaseModel, SchemalessFieldMixin, ImageMixin, ReplacedByMi
         return u', '.join(values)
 
     @transaction.atomic
-    def save(self, *args, **kwargs):
-        if self._has_circular_replacement():
+    def save(self, *args, update_divisions=True, **kwargs):
+        """
+        Divisions are only recomputed if the position changes. Importers saving lots of places may pass
+        update_divisions=False and set the divisions of all moved places with update_place_divisions.
+        """
+        update_fields = kwargs.get('update_fields')
+        replacement_may_change = self.fields_in_update(update_fields, 'replaced_by', 'replaced_by_id')
+
+        if replacement_may_change and self._has_circular_replacement():
             raise ValidationError(_("Trying to replace this place with a place that is replaced by this place. "
                                     "Please refrain from creating circular replacements and remove one of the "
                                     "replacements. We don't want homeless events."))
 
-        if self.replaced_by and not self.deleted:
+        if self.replaced_by_id and not self.deleted:
             self.deleted = True
             logger.warning("Place replaced without soft deleting. Soft deleting automatically", extra={'place': self})
 
-        # needed to remap events to replaced location
-        old_replaced_by = None
-        if self.id:
-            try:
-                old_replaced_by = Place.objects.get(id=self.id).replaced_by
-            except Place.DoesNotExist:
-                pass
+        # needed to remap events to replaced location and to update divisions
+        old_replaced_by_id = None
+        position_changed = False
+        if replacement_may_change or self.fields_in_update(update_fields, 'position'):
+            loaded_values = self.get_loaded_values()
+            old_replaced_by_id = loaded_values.get('replaced_by_id')
+            position_changed = self.fields_in_update(update_fields, 'position') and (
+                loaded_values.get('position') != self.position)
 
         super().save(*args, **kwargs)
+        self.snapshot_tracked_fields(update_fields)
 
         # needed to remap events to replaced location
-        if not old_replaced_by == self.replaced_by:
-            Event.objects.filter(location=self).update(location=self.replaced_by)
+        if replacement_may_change and not old_replaced_by_id == self.replaced_by_id:
+            Event.objects.filter(location=self).update(location=self.replaced_by_id)
             # Update doesn't call save so we update event numbers manually.
             # Not all of the below are necessarily present.
-            ids_to_update = [event.id for event in (self, self.replaced_by, old_replaced_by) if event]
+            ids_to_update = [place_id for place_id in (self.id, self.replaced_by_id, old_replaced_by_id) if place_id]
             Place.objects.filter(id__in=ids_to_update).update(n_events_changed=True)
 
-        if self.position:
-            self.divisions.set(AdministrativeDivision.objects.filter(
-                type__type__in=('district', 'sub_district', 'neighborhood', 'muni'),
-                geometry__boundary__contains=self.position))
-        else:
-            self.divisions.clear()
+        if position_changed and update_divisions:
+            update_place_divisions([self.id])
 
     def is_admin(self, user):
         if user.is_superuser:
@@ -543,7 +612,7 @@ class OpeningHoursSpecification(models.Model):
         verbose_name_plural = _('opening hour specifications')
 
 
-class Event(MPTTModel, BaseModel, SchemalessFieldMixin, ReplacedByMixin):
+class Event(DirtyFieldsMixin, MPTTModel, BaseModel, SchemalessFieldMixin, ReplacedByMixin):
     jsonld_type = "Event/LinkedEvent"
     objects = BaseTreeQuerySet.as_manager()
 
@@ -639,6 +708,9 @@ class Event(MPTTModel, BaseModel, SchemalessFieldMixin, ReplacedByMixin):
     keywords = models.ManyToManyField(Keyword, related_name='events')
     audience = models.ManyToManyField(Keyword, related_name='audience_events', blank=True)
 
+    # needed to cache location event numbers and to send notifications
+    tracked_fields = ('location_id', 'publication_status', 'deleted')
+
     class Meta:
         verbose_name = _('event')
         verbose_name_plural = _('events')
@@ -647,57 +719,52 @@ class Event(MPTTModel, BaseModel, SchemalessFieldMixin, ReplacedByMixin):
         parent_attr = 'super_event'
 
     def save(self, *args, **kwargs):
-        if self._has_circular_replacement():
+        update_fields = kwargs.get('update_fields')
+
+        if self.fields_in_update(update_fields, 'replaced_by', 'replaced_by_id') and self._has_circular_replacement():
             raise ValidationError(_("Trying to replace this event with an event that is replaced by this event. "
                                     "Please refrain from creating circular replacements and "
                                     "remove one of the replacements."))
 
-        if self.replaced_by and not self.deleted:
+        if self.replaced_by_id and not self.deleted:
             self.deleted = True
             logger.warning("Event replaced without soft deleting. Soft deleting automatically", extra={'event': self})
 
-        # needed to cache location event numbers
-        old_location = None
-
-        # needed for notifications
-        old_publication_status = None
-        old_deleted = None
-        created = True
-
-        if self.id:
-            try:
-                event = Event.objects.get(id=self.id)
-                created = False
-                old_location = event.location
-                old_publication_status = event.publication_status
-                old_deleted = event.deleted
-            except Event.DoesNotExist:
-                pass
-
-        # drafts may not have times set, so check that first
-        start = getattr(self, 'start_time', None)
-        end = getattr(self, 'end_time', None)
-        if start and end:
-            if start > end:
-                raise ValidationError({'end_time': _('The event end time cannot be earlier than the start time.')})
-
-        if (self.keywords.filter(deprecated=True) or self.audience.filter(deprecated=True)) and (
-                not self.deleted):
-            raise ValidationError({'keywords': _("Trying to save event with deprecated keywords " +
-                                                 str(self.keywords.filter(deprecated=True).values('id')) + " or " +
-                                                 str(self.audience.filter(deprecated=True).values('id')) +
-                                                 ". Please use up-to-date keywords.")})
+        # needed to cache location event numbers and for notifications
+        created = False
+        if self.fields_in_update(update_fields, 'location', 'location_id', 'publication_status', 'deleted'):
+            loaded_values = self.get_loaded_values()
+            # an event created in memory with the id of an existing event is not a new event
+            created = not loaded_values
+        else:
+            # the tracked fields are not saved, so they will not change
+            loaded_values = {attname: getattr(self, attname) for attname in self.tracked_fields}
+        old_location_id = loaded_values.get('location_id')
+        old_publication_status = loaded_values.get('publication_status')
+        old_deleted = loaded_values.get('deleted')
+
+        self.validate_start_and_end_time()
+
+        # new events cannot have keywords yet, and only undeleting may make deprecated keywords matter again
+        if not created and not self.deleted and self.fields_in_update(update_fields, 'deleted'):
+            deprecated_keywords = Keyword.objects.filter(models.Q(events=self) | models.Q(audience_events=self),
+                                                         deprecated=True)
+            if deprecated_keywords.exists():
+                raise ValidationError({'keywords': _("Trying to save event with deprecated keywords " +
+                                                     str(self.keywords.filter(deprecated=True).values('id')) +
+                                                     " or " +
+                                                     str(self.audience.filter(deprecated=True).values('id')) +
+                                                     ". Please use up-to-date keywords.")})
 
         super(Event, self).save(*args, **kwargs)
+        self.snapshot_tracked_fields(update_fields)
 
         # needed to cache location event numbers
-        if not old_location and self.location:
-            Place.objects.filter(id=self.location.id).update(n_events_changed=True)
-        if old_location and not self.location:
+        if old_location_id != self.location_id:
             # drafts (or imported events) may not always have location set
-            Place.objects.filter(id=old_location.id).update(n_events_changed=True)
-        if old_location and self.location and old_location != self.location:
-            Place.objects.filter(id__in=(old_location.id, self.location.id)).update(n_events_changed=True)
+            place_ids = [place_id for place_id in (old_location_id, self.location_id) if place_id]
+            if place_ids:
+                Place.objects.filter(id__in=place_ids).update(n_events_changed=True)
 
         # send notifications
         if old_publication_status == PublicationStatus.DRAFT and self.publication_status == PublicationStatus.PUBLIC:
@@ -707,6 +774,14 @@ class Event(MPTTModel, BaseModel, SchemalessFieldMixin, ReplacedByMixin):
         if created and self.publication_status == PublicationStatus.DRAFT:
             self.send_draft_posted_notification()
 
+    def validate_start_and_end_time(self):
+        # drafts may not have times set, so check that first
+        start = getattr(self, 'start_time', None)
+        end = getattr(self, 'end_time', None)
+        if start and end:
+            if start > end:
+                raise ValidationError({'end_time': _('The event end time cannot be earlier than the start time.')})
+
     def __str__(self):
         name = ''
         languages = [lang[0] for lang in settings.LANGUAGES]
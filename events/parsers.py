@@ -1,4 +1,6 @@
 import json
+from functools import lru_cache
+
 from events import renderers
 from rest_framework.parsers import JSONParser, ParseError
 from events import utils
@@ -6,6 +8,21 @@ from django.conf import settings
 from django.utils import six
 
 
+# Bounds the memory used by arbitrary keys, e.g. in custom_data
+KEY_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=KEY_CACHE_SIZE)
+def convert_key(key):
+    return utils.convert_from_camelcase(key)
+
+
+def camelcase_object_pairs_hook(pairs):
+    """Build a dict with snake_case keys from the decoded key-value pairs of a JSON object"""
+    # keys without any upper case letters, e.g. snake_case keys, need no conversion
+    return {key if key.islower() else convert_key(key): value for key, value in pairs}
+
+
 def rename_fields(dataz):
     if isinstance(dataz, dict):
         new_data = dict()
@@ -30,13 +47,14 @@ class CamelCaseJSONParser(JSONParser):
     def parse(self, stream, media_type=None, parser_context=None):
         parser_context = parser_context or {}
         if 'disable_camelcase' in parser_context['request'].query_params:
-            return super(CamelCaseJSONParser, self).parse(media_type,
+            return super(CamelCaseJSONParser, self).parse(stream, media_type,
                                                           parser_context)
         else:
             encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
             try:
                 data = stream.read().decode(encoding)
-                return rename_fields(json.loads(data))
+                # the keys are renamed while decoding, so the data is traversed only once
+                return json.loads(data, object_pairs_hook=camelcase_object_pairs_hook)
             except ValueError as exc:
                 raise ParseError('JSON parse error - %s' % six.text_type(exc))
 
@@ -1,8 +1,67 @@
+import operator
 from functools import reduce
+
+from django.db.models import Q
 from .models import PublicationStatus
 from django_orghierarchy.models import Organization
 
 
+# incremented whenever organizations or their users change, so that memoized permission contexts are
+# never used after a change in the same process
+_organization_tree_version = 0
+
+
+def invalidate_permission_contexts(**kwargs):
+    global _organization_tree_version
+    _organization_tree_version += 1
+
+
+class PermissionContext:
+    """Organization ids a user has rights to
+
+    The organization trees of the user are loaded once into Python sets,
+    so that permission checks do not need any further queries.
+    """
+    def __init__(self, user):
+        self.version = _organization_tree_version
+
+        # normal admin organizations and their replacements give admin rights to their whole tree
+        admin_orgs = list(user.admin_organizations.values(
+            'id', 'tree_id', 'lft', 'rght', 'internal_type',
+            'replaced_by__tree_id', 'replaced_by__lft', 'replaced_by__rght'))
+        self.admin_tree_ids = set()
+        tree_filters = []
+        for org in admin_orgs:
+            tree_filters.append(Q(tree_id=org['tree_id'], lft__gte=org['lft'], rght__lte=org['rght']))
+            if org['internal_type'] == Organization.NORMAL:
+                self.admin_tree_ids.add(org['tree_id'])
+            if org['replaced_by__tree_id'] is not None:
+                # admins of replaced organizations have these rights, too!
+                tree_filters.append(Q(tree_id=org['replaced_by__tree_id'], lft__gte=org['replaced_by__lft'],
+                                      rght__lte=org['replaced_by__rght']))
+                if org['internal_type'] == Organization.NORMAL:
+                    self.admin_tree_ids.add(org['replaced_by__tree_id'])
+
+        # regular admins have rights to all organizations below their level
+        admin_org_replacements = []
+        if tree_filters:
+            admin_org_replacements = list(Organization.objects.filter(
+                reduce(operator.or_, tree_filters)).values_list('id', 'replaced_by_id'))
+        self.admin_org_ids = set(org_id for org_id, _ in admin_org_replacements)
+
+        member_org_replacements = list(user.organization_memberships.values_list('id', 'replaced_by_id'))
+        self.member_org_ids = set(org_id for org_id, _ in member_org_replacements)
+
+        # users may also publish as the replacements of their organizations
+        self.publisher_org_ids = self.admin_org_ids | self.member_org_ids | set(
+            replaced_by_id for _, replaced_by_id in admin_org_replacements + member_org_replacements
+            if replaced_by_id)
+
+    @property
+    def is_valid(self):
+        return self.version == _organization_tree_version
+
+
 class UserModelPermissionMixin:
     """Permission mixin for user models
 
@@ -25,6 +84,14 @@ class UserModelPermissionMixin:
     def organization_memberships(self):
         raise NotImplementedError()
 
+    def get_permission_context(self):
+        """Get the organization ids the current user has rights to, memoized on the user instance"""
+        context = self.__dict__.get('_permission_context')
+        if context is None or not context.is_valid:
+            context = PermissionContext(self)
+            self.__dict__['_permission_context'] = context
+        return context
+
     def can_edit_event(self, publisher, publication_status):
         """Check if current user can edit (create, change, modify)
         event with the given publisher and publication_status"""
@@ -34,33 +101,37 @@ class UserModelPermissionMixin:
             return True
         return False
 
+    def get_editable_events_filter(self):
+        """Get a filter for the events current user can edit, or None if there are none
+
+        The organization ids are inlined in the filter, so that it can be
+        combined with other predicates without any subqueries.
+        """
+        context = self.get_permission_context()
+        filters = []
+        if context.admin_org_ids:
+            filters.append(Q(publisher__in=sorted(context.admin_org_ids)))
+        if context.member_org_ids:
+            filters.append(Q(publication_status=PublicationStatus.DRAFT, publisher__in=sorted(context.member_org_ids)))
+        if not filters:
+            return None
+        # distinct is not needed here, as admin_orgs and memberships should not overlap
+        return reduce(operator.or_, filters)
+
     def get_editable_events(self, queryset):
         """Get editable events queryset from given queryset for current user"""
-        # distinct is not needed here, as admin_orgs and memberships should not overlap
-        return queryset.filter(
-            publisher__in=self.get_admin_organizations_and_descendants()
-        ) | queryset.filter(
-            publication_status=PublicationStatus.DRAFT, publisher__in=self.organization_memberships.all()
-        )
+        editable_filter = self.get_editable_events_filter()
+        if editable_filter is None:
+            return queryset.none()
+        return queryset.filter(editable_filter)
 
     def get_admin_tree_ids(self):
         # returns tree ids for all normal admin organizations and their replacements
-        admin_queryset = self.admin_organizations.filter(internal_type='normal').select_related('replaced_by')
-        admin_tree_ids = admin_queryset.values('tree_id')
-        admin_replaced_tree_ids = admin_queryset.filter(replaced_by__isnull=False).values('replaced_by__tree_id')
-        return (set(value['tree_id'] for value in admin_tree_ids) |
-                set(value['replaced_by__tree_id'] for value in admin_replaced_tree_ids))
+        return set(self.get_permission_context().admin_tree_ids)
 
     def get_admin_organizations_and_descendants(self):
         # returns admin organizations and their descendants
-        if not self.admin_organizations.all():
+        admin_org_ids = self.get_permission_context().admin_org_ids
+        if not admin_org_ids:
             return Organization.objects.none()
-        # regular admins have rights to all organizations below their level
-        admin_orgs = []
-        for admin_org in self.admin_organizations.all():
-            admin_orgs.append(admin_org.get_descendants(include_self=True))
-            if admin_org.replaced_by:
-                # admins of replaced organizations have these rights, too!
-                admin_orgs.append(admin_org.replaced_by.get_descendants(include_self=True))
-        # for multiple admin_orgs, we have to combine the querysets and filter distinct
-        return reduce(lambda a, b: a | b, admin_orgs).distinct()
+        return Organization.objects.filter(id__in=admin_org_ids)
@@ -1,3 +1,6 @@
 # These are imported for package level imports elsewhere
 from events.renderers.json import JSONRenderer, JSONLDRenderer  # noqa
 from events.renderers.docx import DOCXRenderer  # noqa
+from events.renderers.ndjson import NDJSONRenderer  # noqa
+from events.renderers.ics import ICalendarRenderer  # noqa
+from events.renderers.csv import CSVRenderer  # noqa
@@ -0,0 +1,52 @@
+import csv
+import datetime
+import json
+
+from django.contrib.gis.geos import GEOSGeometry
+from rest_framework import renderers
+from rest_framework.utils import encoders
+
+
+class Echo:
+    """File-like object that returns what is written, so that csv.writer can be used for streaming"""
+    def write(self, value):
+        return value
+
+
+def format_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, GEOSGeometry):
+        return value.wkt
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, cls=encoders.JSONEncoder, ensure_ascii=False)
+    return value
+
+
+class CSVRenderer(renderers.BaseRenderer):
+    """
+    Renders rows as comma separated values.
+
+    Object lists are streamed by the view using stream, with rows read
+    directly from the database instead of serializing the objects.
+    """
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    @staticmethod
+    def stream(header, rows):
+        writer = csv.writer(Echo())
+        yield writer.writerow(header).encode('utf-8')
+        for row in rows:
+            yield writer.writerow([format_value(value) for value in row]).encode('utf-8')
+
+    def render(self, data, media_type=None, renderer_context=None):
+        if not data:
+            return b''
+        if isinstance(data, dict):
+            data = [data]
+        header = list(data[0].keys())
+        return b''.join(self.stream(header, ([item.get(key) for key in header] for item in data)))
@@ -1,6 +1,7 @@
 import collections
 import datetime
 import io
+import itertools
 
 from django.utils.html import strip_tags
 from django.utils.text import slugify
@@ -11,10 +12,13 @@ from rest_framework.utils.serializer_helpers import ReturnDict
 from events.utils import parse_time
 
 
+# Default order for when a language isn't found. Only these languages are needed for the document.
+DOCX_LANGUAGES = ('fi', 'sv', 'en')
+
+
 def get_any_language(dictionary, default='fi', language_codes=None):
     if not language_codes:
-        # Default order for when a language isn't found.
-        language_codes = [default, 'fi', 'sv', 'en']
+        language_codes = (default,) + DOCX_LANGUAGES
 
     for language_code in language_codes:
         content = dictionary.get(language_code)
@@ -77,16 +81,6 @@ class EventParser:
         }
 
 
-def group_by_location(events):
-    # We want to put events in the same location under the same headline,
-    # so we create a dictionary where the places are the keys and the events
-    # are the values.
-    events_by_location = collections.defaultdict(list)
-    for event in events:
-        events_by_location[event['location']].append(event)
-    return events_by_location
-
-
 class DateRange:
     # Getting these by changing localization doesn't seem to work,
     # ideally you would use start.strftime(short_date + ' %A') instead.
@@ -143,13 +137,10 @@ class DateRange:
         return hash(str(self.start) + str(self.end))
 
 
-def group_by_date(events):
-    # We want events on the same date to be under the same day headline,
-    # and events that span multiple dates to be under their own headlines.
-    events = sorted(events, key=lambda e: e['start_time'])
-
-    dates = collections.defaultdict(list)
-
+def group_sorted_by_date(events):
+    # Same as group_by_date for events already sorted by start time. Date ranges are yielded
+    # as soon as the start date changes, so only the events of a single day are kept in memory.
+    dates = collections.OrderedDict()
     previous_daterange = None
     for event in events:
         date_range = DateRange(
@@ -159,11 +150,18 @@ def group_by_date(events):
         )
         previous_daterange = date_range
 
-        dates[date_range].append(event)
+        if dates and date_range.start != next(iter(dates)).start:
+            yield from dates.items()
+            dates = collections.OrderedDict()
+        dates.setdefault(date_range, []).append(event)
+    yield from dates.items()
 
-    dates = collections.OrderedDict(sorted(dates.items()))
 
-    return dates
+def group_by_date(events):
+    # We want events on the same date to be under the same day headline,
+    # and events that span multiple dates to be under their own headlines.
+    events = sorted(events, key=lambda e: e['start_time'])
+    return collections.OrderedDict(group_sorted_by_date(events))
 
 
 class DOCXRenderer(renderers.BaseRenderer):
@@ -182,8 +180,11 @@ class DOCXRenderer(renderers.BaseRenderer):
         return Document()
 
     def render(self, data, media_type=None, renderer_context=None):
+        """
+        Render the events into a document while iterating over them. The events must be
+        ordered by location and start time, which allows streaming them from the database.
+        """
         document = self.get_document()
-        parsed_events = []
 
         query_params = renderer_context['request'].query_params
 
@@ -191,41 +192,21 @@ class DOCXRenderer(renderers.BaseRenderer):
         if type(data) is ReturnDict:
             # Support the single event endpoint just because we can
             data = [data]
+        parsed_events = (event_parser.parse_event(raw_event) for raw_event in data)
 
-        first_location = data[0]['location']
-        for raw_event in data:
-            parsed_events.append(event_parser.parse_event(raw_event))
-
+        first_location = None
+        # The daterange of the entire document is only known after all events are parsed.
+        daterange_paragraphs = []
+        midnight = datetime.time(0, 0)
         # This is here to allow for this to be expanded to include multiple
         # locations in the future.
-        locations = group_by_location(parsed_events)
-
-        for location in locations:
-            locations[location] = group_by_date(locations[location])
-
-        # We need to get the daterange for the entire document, which is
-        # determined by either the query or the actual events.
-        start = query_params.get('start')
-        end = query_params.get('end')
-
-        if start is None:
-            query_start_date = event_parser.earliest_date
-        else:
-            query_start_date = parse_time(start, True)[0]
-
-        if end is None:
-            query_end_date = event_parser.latest_date
-        else:
-            query_end_date = parse_time(end, False)[0]
-
-        total_date_range = DateRange(query_start_date, query_end_date)
-
-        midnight = datetime.time(0, 0)
-        for location, dateranges in locations.items():
+        for location, location_events in itertools.groupby(parsed_events, key=lambda e: e['location']):
+            if first_location is None:
+                first_location = location
             document.add_heading(str(location), 0)
-            document.add_paragraph(str(total_date_range))
+            daterange_paragraphs.append(document.add_paragraph())
 
-            for daterange, events in dateranges.items():
+            for daterange, events in group_sorted_by_date(location_events):
                 document.add_heading(str(daterange), 1)
 
                 for event in events:
@@ -250,6 +231,25 @@ class DOCXRenderer(renderers.BaseRenderer):
                     if event['price']:
                         document.add_paragraph(event['price'])
 
+        # We need to get the daterange for the entire document, which is
+        # determined by either the query or the actual events.
+        start = query_params.get('start')
+        end = query_params.get('end')
+
+        if start is None:
+            query_start_date = event_parser.earliest_date
+        else:
+            query_start_date = parse_time(start, True)[0]
+
+        if end is None:
+            query_end_date = event_parser.latest_date
+        else:
+            query_end_date = parse_time(end, False)[0]
+
+        total_date_range = DateRange(query_start_date, query_end_date)
+        for paragraph in daterange_paragraphs:
+            paragraph.add_run(str(total_date_range))
+
         filename = '%s-%s-%s.docx' % (
             slugify(first_location.name),
             query_start_date.strftime('%Y%m%d'),
@@ -0,0 +1,48 @@
+from django.utils import translation
+from django.utils.html import strip_tags
+from rest_framework import renderers
+
+from events.exporter.city_sdk import generate_icalendar, generate_icalendar_event
+
+
+class ICalendarRenderer(renderers.BaseRenderer):
+    """
+    Renders events as an iCalendar feed.
+
+    Event lists are streamed by the view one VEVENT at a time using stream,
+    so that calendar subscriptions do not need pagination.
+    """
+    media_type = 'text/calendar'
+    format = 'ics'
+    charset = 'utf-8'
+
+    @staticmethod
+    def render_event(event, language):
+        icalendar_event = generate_icalendar_event(event, language)
+        icalendar_event.add('uid', event.id)
+        icalendar_event.add('dtstamp', event.last_modified_time or event.created_time)
+        if 'summary' not in icalendar_event and event.name:
+            icalendar_event.add('summary', event.name)
+        description = event.short_description or event.description
+        if description:
+            icalendar_event.add('description', strip_tags(description))
+        if event.location_id and event.location.name:
+            icalendar_event.add('location', ', '.join(
+                value for value in (event.location.name, event.location.street_address) if value))
+        if event.info_url:
+            icalendar_event.add('url', event.info_url)
+        return icalendar_event.to_ical()
+
+    def stream(self, events, language=None):
+        language = language or translation.get_language() or 'fi'
+        # the calendar properties are generated once and the events are written in between
+        header, footer = generate_icalendar().to_ical().split(b'END:VCALENDAR')
+        yield header
+        for event in events:
+            yield self.render_event(event, language)
+        yield b'END:VCALENDAR' + footer
+
+    def render(self, data, media_type=None, renderer_context=None):
+        if not data:
+            return b''
+        return b''.join(self.stream(data))
@@ -1,12 +1,26 @@
+import orjson
 from rest_framework import renderers
+from rest_framework.utils.encoders import JSONEncoder
+
+# Datetimes are encoded natively by orjson in the same format as in DRF. Decimals, lazy
+# translations and other Python objects fall back to the DRF encoder.
+ORJSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+encode_default = JSONEncoder().default
 
 
 class JSONRenderer(renderers.JSONRenderer):
     charset = 'utf-8'
 
     def render(self, data, media_type=None, renderer_context=None):
-        return super(JSONRenderer, self).render(data, media_type,
-                                                renderer_context)
+        if data is None:
+            return b''
+        # orjson only supports two space indentation, so e.g. the browsable API is rendered by DRF
+        if self.get_indent(media_type, renderer_context or {}):
+            return super(JSONRenderer, self).render(data, media_type,
+                                                    renderer_context)
+        ret = orjson.dumps(data, default=encode_default, option=ORJSON_OPTIONS)
+        # Line and paragraph separators are escaped like in DRF, as they are not valid in javascript
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
 
 
 class JSONLDRenderer(JSONRenderer):
@@ -0,0 +1,28 @@
+import json
+
+from rest_framework import renderers
+from rest_framework.utils import encoders
+
+
+class NDJSONRenderer(renderers.BaseRenderer):
+    """
+    Renders newline delimited JSON, one object per line.
+
+    Event lists are streamed by the view in chunks using render_line, so
+    that full dumps do not have to be paginated or kept in memory.
+    """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    @staticmethod
+    def render_line(data):
+        return json.dumps(data, cls=encoders.JSONEncoder, ensure_ascii=False,
+                          separators=(',', ':')).encode('utf-8') + b'\n'
+
+    def render(self, data, media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if not isinstance(data, (list, tuple)):
+            data = [data]
+        return b''.join(self.render_line(item) for item in data)
@@ -72,3 +72,77 @@ def count_events_for_places(place_ids=(), all=False):
         else:
             return {}
         return dict(cursor.fetchall())
+
+
+PLACE_DIVISION_TYPES = ('district', 'sub_district', 'neighborhood', 'muni')
+
+
+def update_place_divisions(place_ids=(), all=False):
+    """
+    Set the administrative divisions of the given places with a single spatial join,
+    instead of one containment query per place.
+
+    :param place_ids: set of place ids
+    :type place_ids: Iterable[str]
+    :param all: update all places instead
+    :type all: bool
+    :return: number of place divisions set
+    :rtype: int
+    """
+    place_ids = tuple(set(place_ids))
+    if place_ids:
+        delete_filter, insert_filter, params = 'WHERE place_id IN %s', 'AND p.id IN %s', [place_ids]
+    elif all:
+        delete_filter, insert_filter, params = '', '', []
+    else:
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute('''
+        DELETE FROM events_place_divisions
+        {};
+        '''.format(delete_filter), params)
+        cursor.execute('''
+        INSERT INTO events_place_divisions (place_id, administrativedivision_id)
+        SELECT p.id, d.id
+        FROM events_place p
+        JOIN munigeo_administrativedivisiongeometry g ON ST_Contains(g.boundary, p.position)
+        JOIN munigeo_administrativedivision d ON d.id = g.division_id
+        JOIN munigeo_administrativedivisiontype t ON t.id = d.type_id
+        WHERE t.type IN %s {};
+        '''.format(insert_filter), [PLACE_DIVISION_TYPES] + params)
+        return cursor.rowcount
+
+
+KEYWORD_RELATION_TABLES = (
+    ('events_event_keywords', 'event_id'),
+    ('events_event_audience', 'event_id'),
+    ('events_keywordset_keywords', 'keywordset_id'),
+)
+
+
+def replace_keyword_in_relations(keyword_id, replaced_by_id):
+    """
+    Move the events, event audiences and keyword sets using the given keyword to its replacement
+    with set-based updates. Objects already using the replacement keep their existing rows.
+
+    :param keyword_id: id of the replaced keyword
+    :type keyword_id: str
+    :param replaced_by_id: id of the replacing keyword
+    :type replaced_by_id: str
+    :return: dict of relation table to the ids of the objects remapped
+    :rtype: dict[str, list]
+    """
+    remapped = {}
+    with connection.cursor() as cursor:
+        for table, object_column in KEYWORD_RELATION_TABLES:
+            cursor.execute('''
+            INSERT INTO {table} ({object_column}, keyword_id)
+            SELECT {object_column}, %s FROM {table} WHERE keyword_id = %s
+            ON CONFLICT DO NOTHING;
+            '''.format(table=table, object_column=object_column), [replaced_by_id, keyword_id])
+            cursor.execute('''
+            DELETE FROM {table} WHERE keyword_id = %s
+            RETURNING {object_column};
+            '''.format(table=table, object_column=object_column), [keyword_id])
+            remapped[table] = [row[0] for row in cursor.fetchall()]
+    return remapped
@@ -42,3 +42,12 @@ class TestApiKeyUser(TestCase):
 
         is_regular_user = self.user.is_regular_user(self.org_2)
         self.assertFalse(is_regular_user)
+
+    def test_is_admin_of_descendants(self):
+        org_3 = Organization.objects.create(
+            data_source=self.data_source,
+            origin_id='org-3',
+            parent=self.org_1,
+        )
+        self.assertTrue(self.user.is_admin(org_3))
+        self.assertFalse(self.user.is_admin(None))
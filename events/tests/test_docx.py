@@ -1,4 +1,9 @@
+import datetime
+
 import pytest
+
+from events.renderers.docx import group_by_date, group_sorted_by_date
+
 from .utils import versioned_reverse as reverse
 
 
@@ -15,3 +20,28 @@ def test_docx_renderer(api_client, event, place):
         )
     )
     assert response.status_code == 200
+
+
+def test_group_sorted_by_date_keeps_multiple_day_events_separate():
+    def make_event(start_day, end_day):
+        return {
+            'start_time': datetime.datetime(2020, 1, start_day, 12),
+            'end_time': datetime.datetime(2020, 1, end_day, 13),
+        }
+    events = [make_event(1, 1), make_event(1, 3), make_event(1, 1), make_event(2, 2)]
+
+    groups = list(group_sorted_by_date(events))
+
+    assert [(str(date_range), len(events)) for date_range, events in groups] == [
+        ('1.1.2020 keskiviikko', 2),
+        ('1.1.-3.1.', 1),
+        ('2.1. torstai', 1),
+    ]
+    assert list(group_by_date(reversed(events)).keys()) == [date_range for date_range, _ in groups]
+
+
+@pytest.mark.django_db
+def test_docx_renderer_requires_single_location(api_client, event, event2):
+    response = api_client.get(reverse('event-list') + '?format=docx&location=%s,%s' % (
+        event.location_id, event2.location_id))
+    assert response.status_code == 400
@@ -1,4 +1,6 @@
 # -*- coding: utf-8 -*-
+import csv
+import json
 from datetime import datetime
 
 import dateutil.parser
@@ -9,7 +11,7 @@ from django.contrib.gis.gdal import CoordTransform, SpatialReference
 from django.contrib.gis.geos import Point
 from freezegun import freeze_time
 
-from events.models import Event, Language, PublicationStatus
+from events.models import Event, Language, Place, PublicationStatus
 
 from .utils import assert_fields_exist, get
 from .utils import versioned_reverse as reverse
@@ -979,3 +981,135 @@ def test_keyword_and_text(api_client, event, event2, keyword):
     event.save()
     response = get_list(api_client, query_string='combined_text=lapset,aikuiset')
     assert_events_in_response([event], response)
+
+
+@pytest.mark.django_db
+def test_get_event_list_as_ndjson(api_client, event, event2):
+    response = api_client.get(reverse('event-list') + '?format=ndjson&sort=start_time')
+    assert response.status_code == 200
+    assert response['Content-Type'].startswith('application/x-ndjson')
+
+    lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+    ndjson_ids = [json.loads(line)['id'] for line in lines]
+    json_ids = [e['id'] for e in get_list(api_client, query_string='sort=start_time').data['data']]
+    assert ndjson_ids == json_ids
+
+
+@pytest.mark.django_db
+def test_get_event_list_as_icalendar(api_client, event):
+    response = api_client.get(reverse('event-list') + '?format=ics')
+    assert response.status_code == 200
+    assert response['Content-Type'].startswith('text/calendar')
+    content = b''.join(response.streaming_content).decode('utf-8')
+    assert content.startswith('BEGIN:VCALENDAR')
+    assert 'UID:%s' % event.id in content
+    assert content.rstrip().endswith('END:VCALENDAR')
+
+    etag = response['ETag']
+    response = api_client.get(reverse('event-list') + '?format=ics', HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 304
+
+    # the feed also changes when the location of an event is edited
+    event.location.name_fi = 'Uusi paikka'
+    event.location.save()
+    response = api_client.get(reverse('event-list') + '?format=ics', HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert 'Uusi paikka' in b''.join(response.streaming_content).decode('utf-8')
+
+
+@pytest.mark.django_db
+def test_icalendar_etag_changes_with_the_filtered_events(api_client, event, event2, place, place2):
+    # only the set of events in the feed changes, not their count or modification times
+    modified_time = datetime.now(pytz.utc)
+    Event.objects.filter(id__in=(event.id, event2.id)).update(last_modified_time=modified_time)
+    Place.objects.filter(id__in=(place.id, place2.id)).update(last_modified_time=modified_time)
+    url = reverse('event-list') + '?format=ics&location=%s' % place.id
+    etag = api_client.get(url)['ETag']
+
+    Event.objects.filter(id=event.id).update(location=place2)
+    Event.objects.filter(id=event2.id).update(location=place)
+    response = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert 'UID:%s' % event2.id in b''.join(response.streaming_content).decode('utf-8')
+
+
+@pytest.mark.django_db
+def test_get_event_detail_as_icalendar(api_client, event, event2):
+    response = api_client.get(reverse('event-detail', kwargs={'pk': event.pk}) + '?format=ics')
+    assert response.status_code == 200
+    assert response['Content-Type'].startswith('text/calendar')
+    content = b''.join(response.streaming_content).decode('utf-8')
+    assert content.startswith('BEGIN:VCALENDAR')
+    assert content.count('BEGIN:VEVENT') == 1
+    assert 'UID:%s' % event.id in content
+
+    response = api_client.get(reverse('event-detail', kwargs={'pk': 'test:missing'}) + '?format=ics')
+    assert response.status_code == 404
+    assert response['Content-Type'].startswith('application/json')
+
+
+@pytest.mark.django_db
+def test_get_event_list_as_csv(api_client, event):
+    response = api_client.get(reverse('event-list') + '?format=csv&fields=id,name,event_status&lang=fi,en')
+    assert response.status_code == 200
+    assert response['Content-Type'].startswith('text/csv')
+
+    rows = list(csv.reader(b''.join(response.streaming_content).decode('utf-8').splitlines()))
+    assert rows == [
+        ['id', 'name_fi', 'name_en', 'event_status'],
+        [event.id, event.name_fi, event.name_en or '', 'EventScheduled'],
+    ]
+
+
+@pytest.mark.django_db
+def test_get_event_list_as_csv_invalid_field(api_client, event):
+    response = api_client.get(reverse('event-list') + '?format=csv&fields=id,custom_data')
+    assert response.status_code == 400
+
+
+@pytest.mark.django_db
+def test_get_event_list_as_csv_skips_hidden_fields(api_client, event, user):
+    for field in ('origin_id', 'publication_status'):
+        response = api_client.get(reverse('event-list') + '?format=csv&fields=id,%s' % field)
+        assert response.status_code == 400
+
+    # the publication status is only shown to authenticated users
+    api_client.force_authenticate(user=user)
+    response = api_client.get(reverse('event-list') + '?format=csv&fields=id,publication_status')
+    assert response.status_code == 200
+    rows = list(csv.reader(b''.join(response.streaming_content).decode('utf-8').splitlines()))
+    assert rows == [['id', 'publication_status'], [event.id, 'public']]
+
+
+@pytest.mark.django_db
+def test_get_event_list_as_csv_with_deleted_events(api_client, event):
+    Event.objects.filter(id=event.id).update(deleted=True)
+    event.refresh_from_db()
+
+    response = api_client.get(reverse('event-list') +
+                              '?format=csv&show_deleted=1&fields=id,name,short_description,last_modified_time&lang=fi')
+    assert response.status_code == 200
+    rows = list(csv.reader(b''.join(response.streaming_content).decode('utf-8').splitlines()))
+    assert rows[1][:3] == [event.id, 'POISTETTU', '']
+    assert rows[1][3]
+
+
+@pytest.mark.django_db
+def test_get_event_list_with_fields(api_client, event):
+    response = get_list(api_client, query_string='fields=name,start_time')
+    data = response.data['data'][0]
+    assert set(data) == {'id', '@id', '@type', 'name', 'start_time'}
+    assert data['name']['fi'] == event.name_fi
+
+    response = get_list_no_code_assert(api_client, query_string='fields=name,custom_field')
+    assert response.status_code == 400
+
+
+@pytest.mark.django_db
+def test_get_event_list_with_lang(api_client, event):
+    response = get_list(api_client, query_string='lang=fi')
+    data = response.data['data'][0]
+    assert data['name'] == {'fi': event.name_fi}
+
+    response = get_list_no_code_assert(api_client, query_string='lang=xx')
+    assert response.status_code == 400
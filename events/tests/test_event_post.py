@@ -10,6 +10,8 @@ from django.utils.encoding import force_text
 from events.auth import ApiKeyUser
 from .utils import versioned_reverse as reverse
 from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 
 from events.tests.utils import assert_event_data_is_equal
@@ -617,3 +619,79 @@ def test_create_super_event_with_subevents(api_client, minimal_event_dict, user)
 
     sub_event_names = set([sub_event.name_fi for sub_event in super_event.sub_events.all()])
     assert sub_event_names == {'sub event 1', 'sub event 2'}
+
+
+@pytest.mark.django_db
+def test_multiple_event_creation_with_related_objects(api_client, complex_event_dict, place, user):
+    api_client.force_authenticate(user)
+    complex_event_dict_2 = deepcopy(complex_event_dict)
+    complex_event_dict_2['name']['fi'] = 'testaus_2'
+    complex_event_dict_2['origin_id'] = 'testaus_2'
+
+    response = api_client.post(reverse('event-list'), [complex_event_dict, complex_event_dict_2], format='json')
+    assert response.status_code == 201
+    assert [event['name']['fi'] for event in response.data] == ['testaus', 'testaus_2']
+
+    for event_data, posted_data in zip(response.data, (complex_event_dict, complex_event_dict_2)):
+        resp2 = api_client.get(event_data['@id'])
+        assert resp2.status_code == 200
+        assert_event_data_is_equal(posted_data, resp2.data)
+        assert_event_data_is_equal(event_data, resp2.data)
+
+    # the generated ids and mptt trees must not collide
+    assert len(set(Event.objects.values_list('tree_id', flat=True))) == 2
+    assert Keyword.objects.filter(n_events_changed=True).count() == 6
+    place.refresh_from_db()
+    assert place.n_events_changed
+
+
+@pytest.mark.django_db
+def test_multiple_event_creation_fetches_related_objects_once(api_client, minimal_event_dict, user):
+    api_client.force_authenticate(user)
+    event_dicts = []
+    for index in range(5):
+        event_dict = deepcopy(minimal_event_dict)
+        event_dict['name']['fi'] = 'testaus_%d' % index
+        event_dicts.append(event_dict)
+
+    with CaptureQueriesContext(connection) as context:
+        response = api_client.post(reverse('event-list'), event_dicts, format='json')
+    assert response.status_code == 201
+
+    place_queries = [query for query in context.captured_queries
+                     if query['sql'].startswith('SELECT') and 'FROM "events_place"' in query['sql']]
+    assert len(place_queries) == 1
+
+
+@pytest.mark.django_db
+def test_multiple_event_creation_unknown_keyword_fails(api_client, minimal_event_dict, user):
+    api_client.force_authenticate(user)
+    minimal_event_dict_2 = deepcopy(minimal_event_dict)
+    minimal_event_dict_2['keywords'] = [{'@id': reverse('keyword-detail', kwargs={'pk': 'unknown:keyword'})}]
+
+    response = api_client.post(reverse('event-list'), [minimal_event_dict, minimal_event_dict_2], format='json')
+    assert response.status_code == 400
+    assert 'keywords' in response.data[1]
+    assert Event.objects.count() == 0
+
+
+@pytest.mark.django_db
+def test_multiple_event_creation_generates_distinct_ids(api_client, minimal_event_dict, user):
+    api_client.force_authenticate(user)
+    events = [dict(minimal_event_dict, origin_id=str(i)) for i in range(20)]
+
+    response = api_client.post(reverse('event-list'), events, format='json')
+    assert response.status_code == 201
+    assert len(set(event['id'] for event in response.data)) == 20
+
+
+@pytest.mark.django_db
+def test_cannot_create_multiple_events_with_existing_id(api_client, minimal_event_dict, user):
+    api_client.force_authenticate(user=user)
+    minimal_event_dict['id'] = settings.SYSTEM_DATA_SOURCE_ID + ':1'
+    create_with_post(api_client, minimal_event_dict)
+    minimal_event_dict_2 = dict(minimal_event_dict, id=settings.SYSTEM_DATA_SOURCE_ID + ':2')
+
+    response = api_client.post(reverse('event-list'), [minimal_event_dict_2, minimal_event_dict], format='json')
+    assert response.status_code == 400
+    assert not Event.objects.filter(id=minimal_event_dict_2['id']).exists()
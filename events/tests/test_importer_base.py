@@ -0,0 +1,110 @@
+import threading
+from datetime import timedelta
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from events import utils
+from events.importer.base import Importer
+from events.models import Event
+
+
+class DummyImporter(Importer):
+    name = 'dummy'
+    supported_languages = ['fi', 'en']
+
+    def setup(self):
+        self.data_source = self.options['data_source']
+        self.organization = self.options['organization']
+
+
+def make_event_data(importer, origin_id, keywords, **kwargs):
+    start_time = timezone.now() + timedelta(days=1)
+    data = {
+        'data_source': importer.data_source,
+        'origin_id': origin_id,
+        'publisher': importer.organization,
+        'name': {'fi': 'Tapahtuma %s' % origin_id},
+        'start_time': start_time,
+        'end_time': start_time + timedelta(hours=2),
+        'keywords': keywords,
+        'offers': [{'is_free': True}],
+        'external_links': {'fi': {'extlink_facebook': 'https://example.com/%s' % origin_id}},
+    }
+    data.update(kwargs)
+    return data
+
+
+@pytest.mark.django_db
+def test_save_events_creates_and_updates_in_bulk(data_source, organization, keyword, keyword2, place):
+    importer = DummyImporter({'data_source': data_source, 'organization': organization})
+    data = [make_event_data(importer, str(i), [keyword], location={'id': place.id}) for i in range(10)]
+
+    events = importer.save_events(data)
+    assert [event.origin_id for event in events] == [str(i) for i in range(10)]
+    assert all(event._created for event in events)
+    for event in Event.objects.filter(data_source=data_source):
+        assert set(event.keywords.all()) == {keyword}
+        assert event.offers.get().is_free
+        assert event.external_links.get().link == 'https://example.com/%s' % event.origin_id
+        assert event.location == place
+
+    # unchanged events are not saved again
+    events = importer.save_events(data)
+    assert not any(event._changed or event._created for event in events)
+
+    data[0]['name'] = {'fi': 'Uusi nimi'}
+    data[1]['keywords'] = [keyword2]
+    with CaptureQueriesContext(connection) as context:
+        events = importer.save_events(data)
+    # the number of queries does not depend on the number of events
+    assert len(context.captured_queries) < 20
+    assert [event._changed for event in events] == [True, True] + [False] * 8
+    assert Event.objects.get(id=events[0].id).name_fi == 'Uusi nimi'
+    assert set(Event.objects.get(id=events[1].id).keywords.all()) == {keyword2}
+
+
+@pytest.mark.django_db
+def test_save_events_updates_location_and_publisher(data_source, organization, organization2, keyword, place,
+                                                    place2):
+    importer = DummyImporter({'data_source': data_source, 'organization': organization})
+    data = [make_event_data(importer, str(i), [keyword], location={'id': place.id}) for i in range(2)]
+    importer.save_events(data)
+
+    data[0]['location'] = {'id': place2.id}
+    data[0]['publisher'] = organization2
+    events = importer.save_events(data)
+    assert [event._changed for event in events] == [True, False]
+
+    event = Event.objects.get(id=events[0].id)
+    assert event.location_id == place2.id
+    assert event.publisher_id == organization2.id
+    assert Event.objects.get(id=events[1].id).location_id == place.id
+    place2.refresh_from_db()
+    assert place2.n_events_changed
+
+
+@pytest.mark.django_db
+def test_bulk_create_tree_roots(data_source, organization, event):
+    events = [Event(id='%s:root-%s' % (data_source.id, i), data_source=data_source, publisher=organization,
+                    name='Tapahtuma %s' % i) for i in range(3)]
+    utils.bulk_create_tree_roots(Event, events)
+
+    assert [e.tree_id for e in events] == list(range(event.tree_id + 1, event.tree_id + 4))
+    for e in Event.objects.filter(id__in=[e.id for e in events]):
+        assert (e.lft, e.rght, e.level, e.super_event_id) == (1, 2, 0, None)
+
+
+@pytest.mark.django_db
+def test_map_languages(data_source, organization):
+    importer = DummyImporter({'data_source': data_source, 'organization': organization, 'workers': 3})
+    barrier = threading.Barrier(3, timeout=5)
+
+    def fetch(lang):
+        # fails unless all the languages are fetched at the same time
+        barrier.wait()
+        return lang.upper()
+
+    assert importer.map_languages(fetch, ['fi', 'sv', 'en']) == ['FI', 'SV', 'EN']
@@ -0,0 +1,55 @@
+from httmock import HTTMock, all_requests
+
+from events.importer.fetch_cache import FetchCache
+from events.importer.http import HTTPClient
+
+URL = 'https://example.com/feed.xml'
+
+
+@all_requests
+def etag_mock(url, request):
+    if request.headers.get('If-None-Match') == '"1"':
+        return {'status_code': 304, 'content': b''}
+    return {'status_code': 200, 'content': b'<feed/>', 'headers': {'ETag': '"1"'}}
+
+
+@all_requests
+def content_mock(url, request):
+    return {'status_code': 200, 'content': b'<feed/>'}
+
+
+def test_not_modified(tmpdir):
+    cache = FetchCache(HTTPClient(), str(tmpdir))
+    with HTTMock(etag_mock):
+        assert cache.fetch('feed', URL).content == b'<feed/>'
+        # the state is only stored once the import has succeeded
+        assert cache.fetch('feed', URL) is not None
+        cache.save('feed')
+        assert cache.fetch('feed', URL) is None
+
+
+def test_identical_content(tmpdir):
+    cache = FetchCache(HTTPClient(), str(tmpdir))
+    with HTTMock(content_mock):
+        assert cache.fetch('feed', URL) is not None
+        cache.save('feed')
+        assert FetchCache(HTTPClient(), str(tmpdir)).fetch('feed', URL) is None
+        assert cache.fetch('other_feed', URL) is not None
+
+
+def test_changed_records(tmpdir):
+    cache = FetchCache(HTTPClient(), str(tmpdir))
+    records = {'1': {'name': 'a'}, '2': {'name': 'b'}}
+    assert cache.get_changed_records('feed', records) == {'1', '2'}
+    cache.save('feed')
+    records = {'1': {'name': 'a'}, '2': {'name': 'c'}, '3': {'name': 'd'}}
+    assert cache.get_changed_records('feed', records) == {'2', '3'}
+
+
+def test_disabled():
+    cache = FetchCache(HTTPClient())
+    with HTTMock(content_mock):
+        assert cache.fetch('feed', URL) is not None
+        cache.save('feed')
+        assert cache.fetch('feed', URL) is not None
+    assert cache.get_changed_records('feed', {'1': {}}) == {'1'}
@@ -0,0 +1,53 @@
+import pytest
+import requests
+from httmock import HTTMock, all_requests
+
+from events.importer.http import HTTPClient
+
+
+@all_requests
+def pages_mock(url, request):
+    page = int(url.query.split('=')[1]) if url.query else 0
+    next_link = 'https://example.com/events?page=%d' % (page + 1) if page < 2 else None
+    return {'status_code': 200, 'content': {'page': page, 'next': next_link}}
+
+
+def test_fetch_pages():
+    client = HTTPClient()
+    with HTTMock(pages_mock):
+        pages = list(client.fetch_pages('https://example.com/events', lambda doc: doc['next']))
+    assert [page['page'] for page in pages] == [0, 1, 2]
+    client.close()
+
+
+def test_prefetch_keeps_order():
+    client = HTTPClient(max_workers=2)
+    urls = ['https://example.com/events?page=%d' % page for page in range(5)]
+    with HTTMock(pages_mock):
+        pages = [response.json()['page'] for response in client.prefetch(urls)]
+    assert pages == list(range(5))
+    client.close()
+
+
+@all_requests
+def redirect_mock(url, request):
+    if url.scheme == 'http':
+        return {'status_code': 301, 'headers': {'Location': 'https://%s%s?%s' % (url.netloc, url.path, url.query)}}
+    return pages_mock(url, request)
+
+
+def test_record_and_replay(tmpdir):
+    url = 'https://example.com/events?page=1'
+    redirected_url = 'http://example.com/events?page=0'
+    with HTTMock(redirect_mock):
+        client = HTTPClient(record_dir=str(tmpdir))
+        recorded = client.get_json(url)
+        redirected = client.get_json(redirected_url)
+    assert redirected['page'] == 0
+
+    # replaying needs no network
+    client = HTTPClient(replay_dir=str(tmpdir))
+    assert client.get_json(url) == recorded
+    assert client.get_json(redirected_url) == redirected
+    with pytest.raises(requests.ConnectionError):
+        client.get('https://example.com/events?page=2')
@@ -0,0 +1,36 @@
+import os
+
+import pytest
+
+from events.importer import metrics as metrics_module
+from events.importer.metrics import ImportMetrics, phase, record
+from events.models import Keyword
+
+
+@pytest.mark.django_db
+def test_import_metrics(tmpdir, monkeypatch):
+    monkeypatch.setattr(metrics_module, '_active', None)
+    # nothing is recorded without an active importer run
+    record('created')
+
+    metrics = ImportMetrics('dummy', profile_dir=str(tmpdir))
+    metrics.activate()
+    with metrics.phase('events'):
+        record('fetched_bytes', 100)
+        for _ in range(2):
+            with phase('save'):
+                Keyword.objects.count()
+                record('created')
+    result = metrics.finish()
+
+    assert result['importer'] == 'dummy'
+    assert result['peak_rss_mb'] > 0
+    events, save = result['phases']['events'], result['phases']['save']
+    # nested phases count towards the phases around them
+    assert events['created'] == save['created'] == 2
+    assert events['queries'] == save['queries'] == 2
+    assert events['fetched_bytes'] == 100
+    assert 'fetched_bytes' not in save
+    assert save['calls'] == 2
+    assert os.path.exists(os.path.join(str(tmpdir), 'dummy.save.prof'))
+    assert os.path.exists(os.path.join(str(tmpdir), 'dummy.events.prof'))
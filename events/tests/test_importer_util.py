@@ -1,6 +1,8 @@
+import io
+
 import pytest
 
-from events.importer.util import replace_location
+from events.importer.util import iter_elements, replace_location
 from events.models import Event
 
 
@@ -12,3 +14,14 @@ def test_replace_location_by_different_source(place, place2, other_data_source,
     replace_location(replace=place, by_source=other_data_source.id)
     updated_event = Event.objects.get(id=event.id)
     assert updated_event.location == place2
+
+
+def test_iter_elements():
+    items = b''.join(b'<item><id>%d</id><item>nested</item></item>' % i for i in range(3))
+    feed = io.BytesIO(b'<rss><channel><title>Feed</title>%s</channel></rss>' % items)
+    ids = []
+    for item in iter_elements(feed, 'item', 'channel'):
+        ids.append(item.findtext('id'))
+        # earlier elements are removed from the tree, except for the one processed last
+        assert len(item.getparent()) == 2
+    assert ids == ['0', '1', '2']
@@ -0,0 +1,96 @@
+import pytest
+import rdflib
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from events.importer.yso import YsoImporter, YsoSnapshot
+from events.models import Keyword, KeywordLabel
+
+YSO_DUMP = '''
+@prefix skos: <http://www.w3.org/2004/02/skos/core#> .
+@prefix owl: <http://www.w3.org/2002/07/owl#> .
+@prefix dct: <http://purl.org/dc/terms/> .
+@prefix yso: <http://www.yso.fi/onto/yso/> .
+
+yso:p1 a skos:Concept ;
+    skos:prefLabel "musiikki"@fi, "musik"@sv ;
+    skos:altLabel "sävelet"@fi .
+
+yso:p2 a skos:Concept ;
+    skos:prefLabel "vanha"@fi ;
+    owl:deprecated true ;
+    dct:isReplacedBy yso:p1 .
+
+yso:p3 a skos:Concept ;
+    skos:prefLabel "kooste"@fi ;
+    skos:inScheme yso:aggregateconceptscheme .
+'''
+
+
+def test_yso_snapshot(tmpdir):
+    graph = rdflib.Graph()
+    graph.parse(data=YSO_DUMP, format='turtle')
+    snapshot = YsoSnapshot.from_graph(graph)
+    snapshot.save(str(tmpdir), 'abc')
+
+    assert YsoSnapshot.load(str(tmpdir), 'def') is None
+    snapshot = YsoSnapshot.load(str(tmpdir), 'abc')
+    assert sorted(snapshot.concepts['yso:p1']['labels']) == [['fi', 'musiikki'], ['sv', 'musik']]
+    assert snapshot.concepts['yso:p1']['alt_labels'] == [['sävelet', 'fi']]
+    assert not snapshot.concepts['yso:p1']['deprecated']
+    assert snapshot.concepts['yso:p2']['deprecated']
+    assert snapshot.concepts['yso:p3']['aggregate']
+    assert snapshot.get_replacement('yso:p2') == 'http://www.yso.fi/onto/yso/p1'
+
+
+def make_concept(labels, alt_labels=(), deprecated=False):
+    return {'labels': labels, 'alt_labels': list(alt_labels), 'deprecated': deprecated, 'aggregate': False}
+
+
+@pytest.mark.django_db
+def test_save_keywords():
+    importer = YsoImporter({'force': False})
+    snapshot = YsoSnapshot({
+        'yso:p1': make_concept([['fi', 'musiikki']], [['sävelet', 'fi'], ['toner', 'sv']]),
+        'yso:p2': make_concept([['fi', 'teatteri']]),
+    }, {})
+    importer.save_keywords(snapshot)
+    keyword = Keyword.objects.get(id='yso:p1')
+    assert keyword.name_fi == 'musiikki'
+    assert keyword.publisher == importer.organization
+    assert set(keyword.alt_labels.values_list('name', flat=True)) == {'sävelet', 'toner'}
+
+    snapshot.concepts['yso:p1'] = make_concept([['fi', 'musiikki (taide)']], [['sävelet', 'fi']])
+    with CaptureQueriesContext(connection) as context:
+        importer.save_keywords(snapshot)
+    # the number of queries does not depend on the number of keywords
+    assert len(context) < 25
+    keyword = Keyword.objects.get(id='yso:p1')
+    assert keyword.name_fi == 'musiikki (taide)'
+    assert set(keyword.alt_labels.values_list('name', flat=True)) == {'sävelet'}
+    assert not KeywordLabel.objects.filter(name='toner').exists()
+
+    snapshot.concepts['yso:p2']['deprecated'] = True
+    importer.save_keywords(snapshot)
+    assert Keyword.objects.get(id='yso:p2').deprecated
+    assert not Keyword.objects.get(id='yso:p1').deprecated
+
+
+@pytest.mark.django_db
+def test_save_keywords_keeps_alt_labels_of_deprecated_keywords():
+    importer = YsoImporter({'force': False})
+    snapshot = YsoSnapshot({
+        'yso:p1': make_concept([['fi', 'musiikki']], [['sävelet', 'fi']]),
+        'yso:p2': make_concept([['fi', 'teatteri']], [['näytelmät', 'fi']]),
+        'yso:p3': make_concept([['fi', 'tanssi']], [['tanssit', 'fi']]),
+    }, {})
+    importer.save_keywords(snapshot)
+
+    # p2 is deprecated in the dump, p3 is removed from it
+    snapshot.concepts['yso:p2']['deprecated'] = True
+    del snapshot.concepts['yso:p3']
+    importer.save_keywords(snapshot)
+    assert Keyword.objects.get(id='yso:p2').deprecated
+    assert Keyword.objects.get(id='yso:p3').deprecated
+    assert set(Keyword.objects.get(id='yso:p2').alt_labels.values_list('name', flat=True)) == {'näytelmät'}
+    assert set(Keyword.objects.get(id='yso:p3').alt_labels.values_list('name', flat=True)) == {'tanssit'}
@@ -60,3 +60,18 @@ def test_keyword_remap_event_on_replace(keyword, keyword2, event):
     event.refresh_from_db()
     assert set(event.keywords.all()) == set()
     assert set(event.audience.all()) == set([keyword2])
+
+
+@pytest.mark.django_db
+def test_keyword_remap_keeps_existing_replacement_and_counts_events(keyword, keyword2, event):
+    event.keywords.set([keyword, keyword2])
+    event.audience.set([keyword])
+    keyword.replaced_by = keyword2
+    keyword.save()
+
+    assert set(event.keywords.all()) == set([keyword2])
+    assert set(event.audience.all()) == set([keyword2])
+    keyword.refresh_from_db()
+    keyword2.refresh_from_db()
+    assert keyword.n_events == 0
+    assert keyword2.n_events == 1
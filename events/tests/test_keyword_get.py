@@ -131,3 +131,9 @@ def test_get_keyword_free_search(api_client, keyword, keyword2, keyword3):
     response = get_list(api_client, data={'free_text': 'cheeese'})
     ids = [entry['id'] for entry in response.data['data']]
     assert ids == [keyword.id, keyword2.id, keyword3.id]
+
+
+@pytest.mark.django_db
+def test_get_keyword_list_as_csv_does_not_export_origin_id(api_client, keyword):
+    response = api_client.get(reverse('keyword-list') + '?format=csv&fields=id,origin_id')
+    assert response.status_code == 400
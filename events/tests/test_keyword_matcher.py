@@ -0,0 +1,73 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from events.keywords import KeywordMatcher
+from events.models import DataSource, Keyword, KeywordLabel
+
+KEYWORDS = [
+    # id, Finnish name, aggregate, deprecated
+    ('yso:p1', 'musiikki', False, False),
+    ('yso:p2', 'teatteri', False, False),
+    ('yso:p4', 'kuoromusiikki', False, False),
+    ('yso:p5', 'liikunta', True, False),
+    ('yso:p6', 'liikunta (toiminta)', False, False),
+    ('yso:p7', 'kokoukset', False, False),
+    ('yso:p8', 'vanha', False, True),
+]
+
+ALT_LABELS = [
+    ('sävelet', 'yso:p1'),
+    ('kuntoliikunta', 'yso:p5'),
+]
+
+# matches of the original linear scan implementation
+GOLDEN_MATCHES = {
+    'Musiikki': ['yso:p1'],  # exact
+    'Sävelet': ['yso:p1'],  # alt label
+    'klassinen musiikki': ['yso:p1'],  # subword
+    'teat': ['yso:p2'],  # prefix
+    'musiikkit': ['yso:p1'],  # cut two letters
+    'rockmusiikki': ['yso:p1'],  # suffix
+    'kokous': ['yso:p7'],  # synonym
+    'kuntoilu': ['yso:p5'],  # synonym of an alt label
+    'liikunta': ['yso:p5'],  # the aggregate replaces the keywords named like it
+    'vanha': [],  # deprecated
+    'kuoro': None,  # the prefix match is not close enough
+    'xyz': None,
+}
+
+
+@pytest.fixture
+def keyword_matcher(languages):
+    yso = DataSource.objects.create(id='yso', name='YSO')
+    for keyword_id, name, aggregate, deprecated in KEYWORDS:
+        Keyword.objects.create(id=keyword_id, data_source=yso, name_fi=name, aggregate=aggregate,
+                               deprecated=deprecated)
+    for name, keyword_id in ALT_LABELS:
+        label = KeywordLabel.objects.create(name=name, language=languages[0])
+        Keyword.objects.get(id=keyword_id).alt_labels.add(label)
+    return KeywordMatcher()
+
+
+def get_ids(keywords):
+    return None if keywords is None else [keyword.id for keyword in keywords]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('text, expected', GOLDEN_MATCHES.items())
+def test_match(keyword_matcher, text, expected):
+    assert get_ids(keyword_matcher.match(text)) == expected
+
+
+@pytest.mark.django_db
+def test_match_many(keyword_matcher):
+    with CaptureQueriesContext(connection) as context:
+        matches = keyword_matcher.match_many(list(GOLDEN_MATCHES))
+    assert len(context) == 1
+    assert {text: get_ids(keywords) for text, keywords in matches.items()} == GOLDEN_MATCHES
+
+    # keywords are cached
+    with CaptureQueriesContext(connection) as context:
+        keyword_matcher.match('musiikki')
+    assert len(context) == 0
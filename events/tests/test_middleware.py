@@ -0,0 +1,61 @@
+from datetime import datetime
+from decimal import Decimal
+
+import brotli
+import pytest
+import pytz
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory
+from django.utils.translation import gettext_lazy
+
+from events.middleware import CompressionMiddleware, get_accepted_encoding
+from events.renderers import JSONRenderer
+from rest_framework import renderers
+
+
+@pytest.mark.parametrize('accept_encoding, expected', [
+    ('', None),
+    ('gzip, deflate', 'gzip'),
+    ('gzip, deflate, br', 'br'),
+    ('br;q=0.5, gzip', 'gzip'),
+    ('br;q=0, gzip;q=0', None),
+    ('*', 'br'),
+])
+def test_get_accepted_encoding(accept_encoding, expected):
+    assert get_accepted_encoding(accept_encoding) == expected
+
+
+def test_compression_middleware():
+    content = b'{"data": "%s"}' % (b'x' * 2000)
+    middleware = CompressionMiddleware()
+
+    request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip, br')
+    response = HttpResponse(content, content_type='application/json')
+    response['ETag'] = '"abc"'
+    response = middleware.process_response(request, response)
+    assert response['Content-Encoding'] == 'br'
+    assert response['ETag'] == 'W/"abc"'
+    assert response['Vary'] == 'Accept-Encoding'
+    assert brotli.decompress(response.content) == content
+
+    # short and already compressed responses are not compressed
+    response = middleware.process_response(request, HttpResponse(b'{}', content_type='application/json'))
+    assert not response.has_header('Content-Encoding')
+    response = middleware.process_response(request, HttpResponse(content, content_type='image/jpeg'))
+    assert not response.has_header('Content-Encoding')
+
+    response = StreamingHttpResponse(iter([content, content]), content_type='application/x-ndjson')
+    response = middleware.process_response(request, response)
+    assert brotli.decompress(b''.join(response.streaming_content)) == content * 2
+
+
+def test_json_renderer_output_matches_drf():
+    data = {
+        'time': datetime(2020, 1, 2, 3, 4, 5, 6, tzinfo=pytz.utc),
+        'local_time': pytz.timezone('Europe/Helsinki').localize(datetime(2020, 6, 1, 12)),
+        'price': Decimal('1.50'),
+        'name': gettext_lazy('Event'),
+        'text': 'line\u2028separator',
+        'list': [1, None, True],
+    }
+    assert JSONRenderer().render(data) == renderers.JSONRenderer().render(data)
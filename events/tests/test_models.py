@@ -1,5 +1,9 @@
+from unittest.mock import patch
+
 from django.contrib.auth import get_user_model
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django_orghierarchy.models import Organization
 
 from ..models import DataSource, Event, Image, PublicationStatus
@@ -119,3 +123,34 @@ class TestEvent(TestCase):
 
         can_be_edited = self.event_2.can_be_edited_by(self.user)
         self.assertTrue(can_be_edited)
+
+    def test_tracked_fields_are_loaded_with_the_instance(self):
+        event = Event.objects.get(id=self.event_1.id)
+        self.assertEqual(event.get_loaded_values()['publication_status'], PublicationStatus.DRAFT)
+
+        event.publication_status = PublicationStatus.PUBLIC
+        event.save()
+        self.assertEqual(event.get_loaded_values()['publication_status'], PublicationStatus.PUBLIC)
+
+    def test_save_does_not_reload_the_instance(self):
+        event = Event.objects.get(id=self.event_2.id)
+        event.name = 'event-2 renamed'
+
+        with CaptureQueriesContext(connection) as context:
+            event.save(update_fields=['name'])
+        self.assertFalse([query for query in context.captured_queries if query['sql'].startswith('SELECT')])
+
+    def test_saving_an_existing_event_built_in_memory_does_not_create_it(self):
+        event = Event(id=self.event_1.id, name='event-1 rebuilt', data_source=self.data_source, publisher=self.org,
+                      publication_status=PublicationStatus.DRAFT)
+
+        with patch.object(Event, 'send_draft_posted_notification') as send_draft_posted_notification:
+            event.save()
+        send_draft_posted_notification.assert_not_called()
+        self.assertEqual(Event.objects.get(id=self.event_1.id).name, 'event-1 rebuilt')
+
+        new_event = Event(id='ds:event-3', name='event-3', data_source=self.data_source, publisher=self.org,
+                          publication_status=PublicationStatus.DRAFT)
+        with patch.object(Event, 'send_draft_posted_notification') as send_draft_posted_notification:
+            new_event.save()
+        send_draft_posted_notification.assert_called_once_with()
@@ -0,0 +1,33 @@
+import io
+import json
+
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from events.parsers import CamelCaseJSONParser, rename_fields
+
+
+def parse(data, path='/v1/event/'):
+    parser_context = {'request': Request(APIRequestFactory().post(path))}
+    return CamelCaseJSONParser().parse(io.BytesIO(json.dumps(data).encode('utf-8')), parser_context=parser_context)
+
+
+def test_camelcase_parser_renames_keys():
+    data = [{
+        '@id': 'x',
+        'startTime': '2021-01-01',
+        'short_description': {'fi': 'kuvaus'},
+        'offers': [{'isFree': True, 'infoUrl': None}],
+        'customData': {'ticketType': 'free'},
+        'Name': 'tapahtuma',
+    }]
+    parsed = parse(data)
+    assert parsed == rename_fields(data)
+    assert parsed[0]['start_time'] == '2021-01-01'
+    assert parsed[0]['offers'][0]['is_free'] is True
+    assert parsed[0]['custom_data'] == {'ticket_type': 'free'}
+
+
+def test_camelcase_parser_disabled():
+    data = {'startTime': '2021-01-01'}
+    assert parse(data, path='/v1/event/?disable_camelcase') == data
@@ -133,3 +133,39 @@ class TestUserModelPermissions(TestCase):
         self.instance.organization_memberships.remove(self.org)
         qs = self.instance.get_editable_events(total_qs)
         self.assertQuerysetEqual(qs, [])
+
+    def test_permission_context_is_memoized_until_organizations_change(self):
+        self.instance.admin_organizations.add(self.org)
+        self.assertTrue(self.instance.is_admin(self.org2))
+
+        with self.assertNumQueries(0):
+            self.assertTrue(self.instance.is_admin(self.org))
+            self.assertFalse(self.instance.is_regular_user(self.org))
+            self.assertEqual(self.instance.get_admin_tree_ids(), {self.org.tree_id})
+
+        self.instance.admin_organizations.remove(self.org)
+        self.assertFalse(self.instance.is_admin(self.org2))
+
+    def test_get_editable_events_inlines_organization_ids(self):
+        # a large admin org tree should still result in a single predicate without subqueries
+        parent = self.org2
+        for i in range(20):
+            parent = Organization.objects.create(
+                name='suborg-%s' % i,
+                origin_id='suborg-%s' % i,
+                data_source=self.data_source,
+                parent=parent,
+            )
+        self.instance.admin_organizations.add(self.org)
+        self.instance.organization_memberships.add(self.org2)
+
+        qs = self.instance.get_editable_events(Event.objects.all())
+        sql = str(qs.query)
+        self.assertEqual(sql.count('SELECT'), 1)
+        self.assertIn(parent.id, sql)
+        plan = qs.explain()
+        self.assertNotIn('SubPlan', plan)
+        self.assertNotIn('InitPlan', plan)
+
+        with self.assertNumQueries(1):
+            list(qs)
@@ -1,6 +1,9 @@
 # -*- coding: utf-8 -*-
 import pytest
 from django.contrib.gis.geos import Point
+from django.core.management import call_command
+
+from events.sql import update_place_divisions
 
 
 @pytest.mark.parametrize('position, is_division_expected', [
@@ -31,7 +34,7 @@ def test_place_divisions_by_position(place, position, is_division_expected, admi
 def test_place_divisions_by_division_type(place, division_type, is_division_expected, administrative_division):
     administrative_division.type.type = division_type
     administrative_division.type.save()
-    place.save()
+    update_place_divisions([place.id])
 
     if is_division_expected:
         assert place.divisions.count() == 1
@@ -40,6 +43,31 @@ def test_place_divisions_by_division_type(place, division_type, is_division_expe
         assert place.divisions.count() == 0
 
 
+@pytest.mark.django_db
+def test_place_divisions_not_updated_if_position_unchanged(place, administrative_division):
+    administrative_division.type.type = 'some_other_type'
+    administrative_division.type.save()
+
+    place.soft_delete()
+    place.name_fi = 'Paikka 2'
+    place.save()
+
+    assert place.divisions.count() == 1
+
+
+@pytest.mark.django_db
+def test_update_place_divisions_command(place, place2, administrative_division):
+    place.divisions.clear()
+    place2.position = Point(150, 150)
+    place2.save(update_divisions=False)
+    assert place2.divisions.count() == 0
+
+    call_command('update_place_divisions')
+
+    assert place.divisions.first() == administrative_division
+    assert place2.divisions.first() == administrative_division
+
+
 @pytest.mark.django_db
 def test_place_cannot_replace_itself(place):
     place.replaced_by = place
@@ -165,3 +165,13 @@ def test_get_place_with_upcoming_events(api_client, place, place2, event, past_e
     ids = [entry['id'] for entry in response.data['data']]
     assert place.id in ids
     assert place2.id in ids
+
+
+@pytest.mark.django_db
+def test_get_place_list_as_csv_does_not_export_origin_id(api_client, place):
+    response = api_client.get(reverse('place-list') + '?format=csv&fields=id,origin_id')
+    assert response.status_code == 400
+
+    response = api_client.get(reverse('place-list') + '?format=csv')
+    assert response.status_code == 200
+    assert 'origin_id' not in b''.join(response.streaming_content).decode('utf-8')
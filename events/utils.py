@@ -1,9 +1,12 @@
 from datetime import datetime, timedelta
 import re
 import collections
+import zlib
 
 import pytz
-from django.db import transaction
+from django.db import connection, transaction
+from django.db.models import Max
+from django.db.models.signals import post_save
 from django.conf import settings
 from dateutil.parser import parse as dateutil_parse
 from rest_framework.exceptions import ParseError
@@ -12,6 +15,52 @@ from events.models import Keyword, Place
 from events.sql import count_events_for_keywords, count_events_for_places
 
 
+def bulk_create_with_signals(model, objs):
+    """
+    bulk_create the objects and send post_save for each of them, so that revisions
+    and the search index are kept up to date just like with save().
+    """
+    objs = model.objects.bulk_create(objs)
+    for obj in objs:
+        post_save.send(sender=model, instance=obj, created=True, update_fields=None, raw=False,
+                       using=obj._state.db)
+    return objs
+
+
+def bulk_create_tree_roots(model, objs):
+    """
+    bulk_create_with_signals the mptt objects as the roots of new trees.
+
+    The tree ids are reserved while holding a transaction level advisory lock on the table,
+    so that concurrent bulk creations cannot give the same tree id to different trees.
+    """
+    if not objs:
+        return []
+    mptt_opts = model._mptt_meta
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(%s)', [zlib.crc32(model._meta.db_table.encode('utf-8'))])
+        max_tree_id = model._base_manager.aggregate(max_tree_id=Max(mptt_opts.tree_id_attr))['max_tree_id']
+        for tree_id, obj in enumerate(objs, start=(max_tree_id or 0) + 1):
+            setattr(obj, mptt_opts.tree_id_attr, tree_id)
+            setattr(obj, mptt_opts.left_attr, 1)
+            setattr(obj, mptt_opts.right_attr, 2)
+            setattr(obj, mptt_opts.level_attr, 0)
+        return bulk_create_with_signals(model, objs)
+
+
+def bulk_update_with_signals(model, objs, fields):
+    """
+    bulk_update the given fields of the objects and send post_save for each of them,
+    like bulk_create_with_signals.
+    """
+    model.objects.bulk_update(objs, fields)
+    for obj in objs:
+        post_save.send(sender=model, instance=obj, created=False, update_fields=frozenset(fields), raw=False,
+                       using=obj._state.db)
+    return objs
+
+
 def convert_to_camelcase(s):
     return ''.join(word.title() if i else word for i, word in enumerate(
         s.split('_')))
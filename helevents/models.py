@@ -22,7 +22,7 @@ class User(AbstractUser, UserModelPermissionMixin):
         return admin_org or regular_org
 
     def is_admin(self, publisher):
-        return publisher in self.get_admin_organizations_and_descendants()
+        return getattr(publisher, 'id', None) in self.get_permission_context().admin_org_ids
 
     def is_regular_user(self, publisher):
-        return self.organization_memberships.filter(id=publisher.id).exists()
+        return getattr(publisher, 'id', None) in self.get_permission_context().member_org_ids
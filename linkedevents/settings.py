@@ -66,7 +66,8 @@ env = environ.Env(
     MAIL_MAILGUN_KEY=(str, ''),
     MAIL_MAILGUN_DOMAIN=(str, ''),
     MAIL_MAILGUN_API=(str, ''),
-    LIPPUPISTE_EVENT_API_URL=(str, None)
+    LIPPUPISTE_EVENT_API_URL=(str, None),
+    IMPORTER_FETCH_CACHE_DIR=(str, None),
 )
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
@@ -181,6 +182,8 @@ MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     # WhiteNoiseMiddleware should be placed as high as possible
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    # CompressionMiddleware should be above anything that reads or modifies the response body
+    'events.middleware.CompressionMiddleware',
 
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -191,6 +194,9 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Responses smaller than this are not compressed
+RESPONSE_COMPRESSION_MIN_SIZE = 1024
+
 # django-extensions is a set of developer friendly tools
 if DEBUG:
     INSTALLED_APPS.extend(['django_extensions', 'debug_toolbar', 'extension_course'])
@@ -352,6 +358,9 @@ CITYSDK_API_SETTINGS = {
 # Used in Lippupiste importer
 LIPPUPISTE_EVENT_API_URL = env('LIPPUPISTE_EVENT_API_URL')
 
+# Importers skip sources that have not changed since the last import, if this is set
+IMPORTER_FETCH_CACHE_DIR = env('IMPORTER_FETCH_CACHE_DIR')
+
 
 def haystack_connection_for_lang(language_code):
     if language_code == "fi":